@@ -1,11 +1,17 @@
 from datetime import timedelta, datetime
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import logging
 import re
+from typing import Optional
 
 from app.core.config import settings
+from app.core.query_stats import query_budget
+from app.core.tracing import traced
 from app.core.security import (
     verify_password,
     get_password_hash,
@@ -18,7 +24,7 @@ from app.core.background_tasks import (
     send_welcome_email_task,
     send_password_reset_email_task,
 )
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.db.models import User, OTPType
 from app.services.otp_service import OTPService
 from app.schemas.user import (
@@ -75,6 +81,13 @@ def get_user_by_email(db: Session, email: str):
     return db.query(User).filter(User.email == email).first()
 
 
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """Get user by email without blocking the event loop."""
+    result = await db.execute(select(User).where(User.email == email).limit(1))
+    return result.scalars().first()
+
+
+@traced()
 def create_user(db: Session, user: UserCreate, background_tasks: BackgroundTasks):
     """Create a new user with OTP verification."""
     # Check if user already exists
@@ -114,6 +127,7 @@ def create_user(db: Session, user: UserCreate, background_tasks: BackgroundTasks
     return db_user
 
 
+@traced()
 def authenticate_user(db: Session, email: str, password: str):
     """Authenticate user with email and password."""
     user = get_user_by_email(db, email)
@@ -126,12 +140,7 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-):
-    """Get current authenticated user."""
-    email = verify_token(token)
-    user = get_user_by_email(db, email)
+def _verified_user(user: Optional[User]) -> User:
     if user is None or not user.is_verified:  # type: ignore
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -141,6 +150,37 @@ async def get_current_user(
     return user
 
 
+def get_current_user(
+    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+):
+    """Get current authenticated user, for sync handlers.
+
+    The user is loaded through the request's Session, the one the handler
+    gets from get_db, so the request uses a single pooled connection and
+    never touches the async engine.
+    """
+    email = verify_token(token)
+    return _verified_user(get_user_by_email(db, email))
+
+
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
+):
+    """Get current authenticated user, for async handlers.
+
+    The user is loaded through the request's AsyncSession; handlers that
+    modify it should depend on get_async_db to get the same session.
+    The lookup's transaction ends straight away, so the async connection
+    goes back to the pool before the handler runs and is checked out again
+    only when the handler queries.
+    """
+    email = verify_token(token)
+    user = await get_user_by_email_async(db, email)
+    # expire_on_commit=False: the user stays loaded and attached
+    await db.commit()
+    return _verified_user(user)
+
+
 @router.post("/register", response_model=RegistrationResponse)
 def register(
     user: UserCreate, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
@@ -264,6 +304,7 @@ def login_json(user_login: UserLogin, db: Session = Depends(get_db)):
 
 
 @router.get("/me", response_model=UserResponse)
+@query_budget(1)
 async def get_me(current_user: User = Depends(get_current_user)):
     """Get current user profile."""
     return current_user
@@ -528,16 +569,16 @@ def resend_password_reset_otp(
 @router.put("/update-profile", response_model=UserResponse)
 async def update_profile(
     profile_data: UserProfileUpdate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Update user profile information."""
     try:
         # Update user information
         current_user.full_name = profile_data.full_name  # type: ignore
 
-        db.commit()
-        db.refresh(current_user)
+        await db.commit()
+        await db.refresh(current_user)
 
         logger.info(f"Profile updated successfully for user: {current_user.email}")
         return current_user
@@ -546,7 +587,7 @@ async def update_profile(
         raise
     except Exception as e:
         logger.error(f"Error updating profile: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while updating profile",
@@ -556,28 +597,29 @@ async def update_profile(
 @router.post("/change-password")
 async def change_password(
     password_data: PasswordChange,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """Change user password."""
     try:
         # Verify current password
-        if not verify_password(password_data.current_password, str(current_user.hashed_password)):  # type: ignore
+        # bcrypt is deliberately slow; keep it off the event loop
+        if not await run_in_threadpool(verify_password, password_data.current_password, str(current_user.hashed_password)):  # type: ignore
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Current password is incorrect",
             )
 
         # Check if new password is different from current
-        if verify_password(password_data.new_password, str(current_user.hashed_password)):  # type: ignore
+        if await run_in_threadpool(verify_password, password_data.new_password, str(current_user.hashed_password)):  # type: ignore
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="New password must be different from current password",
             )
 
         # Update password
-        current_user.hashed_password = get_password_hash(password_data.new_password)  # type: ignore
-        db.commit()
+        current_user.hashed_password = await run_in_threadpool(get_password_hash, password_data.new_password)  # type: ignore
+        await db.commit()
 
         logger.info(f"Password changed successfully for user: {current_user.email}")
         return {"message": "Password changed successfully"}
@@ -586,7 +628,7 @@ async def change_password(
         raise
     except Exception as e:
         logger.error(f"Error changing password: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An error occurred while changing password",
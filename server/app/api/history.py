@@ -1,25 +1,140 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    status,
+    Query,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Union
+from datetime import datetime
+import hashlib
 import math
+import os
 
+from app.db.replica import read_session, record_user_write, replica_enabled
 from app.db.session import get_db
 from app.db.models import User
 from app.api.auth import get_current_user
-from app.services.prediction_service import PatientService, PredictionService
+from app.core.query_stats import query_budget
+from app.services.analytics_service import ProbabilityAnalyticsService
+from app.services.archive_service import ARCHIVE_STATUSES
+from app.services.import_service import IMPORT_FORMATS, PatientImportService
+from app.services.export_service import (
+    EXPORT_FORMATS,
+    ExportUnavailable,
+    PredictionExportService,
+)
+from app.services.prediction_service import (
+    PatientService,
+    PredictionService,
+    patient_lookup_cache,
+    statistics_cache,
+)
+from app.utils.pagination import decode_cursor, encode_cursor
 from app.schemas.prediction import (
     PatientCreate,
     PatientUpdate,
     PatientResponse,
+    PatientImportReport,
+    PatientLookupResult,
+    PatientOverviewResponse,
     PredictionResultResponse,
     PredictionResultUpdate,
     PredictionHistoryResponse,
     PredictionStatisticsResponse,
+    PredictionSummaryPage,
+    ProbabilityMatchPage,
+    ProbabilitySummaryResponse,
 )
 
 router = APIRouter()
 
 
+def _parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+
+
+def _next_cursor(results: list, per_page: int) -> Optional[str]:
+    """Cursor after the last row, if the query found more than a page"""
+    if len(results) <= per_page:
+        return None
+    last = results[per_page - 1]
+    if isinstance(last, dict):
+        return encode_cursor(last["created_at"], last["id"])
+    return encode_cursor(last.created_at, last.id)
+
+
+async def get_read_db(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Session for read-only endpoints: the replica's when it is safe to use.
+
+    Falls back to the request's primary session when no replica is
+    configured, the replica is lagging, or this user just wrote something.
+    Without a replica this hands back ``db`` directly, skipping the thread
+    pool hops a sync dependency costs on every read.
+    """
+    if not replica_enabled():
+        yield db
+        return
+    read_db = await run_in_threadpool(read_session, db, getattr(current_user, "id"))
+    try:
+        yield read_db
+    finally:
+        if read_db is not db:
+            await run_in_threadpool(read_db.close)
+
+
+def export_response(
+    db: Session, export_format: str, scope: str, **filters
+) -> StreamingResponse:
+    """Stream the predictions matching ``filters`` as an ``export_format`` file.
+
+    Rows are read through a session of its own, which lives until the
+    last chunk is sent.
+    """
+    try:
+        PredictionExportService.check_format(export_format)
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=str(e))
+
+    export_db = Session(bind=db.get_bind())
+    try:
+        body = PredictionExportService.stream(export_db, export_format, **filters)
+    except Exception:
+        export_db.close()
+        raise
+
+    def chunks():
+        try:
+            yield from body
+        finally:
+            export_db.close()
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"predictions-{scope}-{datetime.utcnow():%Y%m%d-%H%M%S}.{extension}"
+    return StreamingResponse(
+        chunks(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 # Patient Management Endpoints
 @router.post("/patients", response_model=PatientResponse)
 def create_patient(
@@ -28,15 +143,53 @@ def create_patient(
     current_user: User = Depends(get_current_user),
 ):
     """Create a new patient record"""
-    return PatientService.create_patient(db, patient_data)
+    patient = PatientService.create_patient(db, patient_data)
+    record_user_write(getattr(current_user, "id"))
+    return patient
+
+
+@router.post("/patients/import", response_model=PatientImportReport)
+def import_patients(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    skip_duplicates: bool = Query(True),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Create many patients from a CSV or NDJSON file.
+
+    Columns (or keys) are the PatientCreate fields; ``format`` defaults to
+    the file extension. Rows matching an existing patient's name and
+    date of birth, or an earlier row, are reported as duplicates and
+    skipped unless ``skip_duplicates=false``. Returns a report entry per
+    row.
+    """
+    import_format = format
+    if import_format is None:
+        extension = os.path.splitext(file.filename or "")[1].lower().lstrip(".")
+        import_format = {"jsonl": "ndjson"}.get(extension, extension)
+    if import_format not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Unknown file format; pass format=csv or format=ndjson",
+        )
+
+    report = PatientImportService.import_patients(
+        db, file.file, import_format, skip_duplicates
+    )
+    if report["created"]:
+        patient_lookup_cache.clear()
+        record_user_write(getattr(current_user, "id"))
+    return report
 
 
 @router.get("/patients", response_model=List[PatientResponse])
+@query_budget(2)
 def get_patients(
     skip: int = Query(0, ge=0),
     limit: int = Query(5, ge=1, le=100),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
     """Get all patients with optional search"""
@@ -45,7 +198,32 @@ def get_patients(
     return PatientService.get_patients(db, skip, limit)
 
 
+@router.get("/patients/lookup", response_model=List[PatientLookupResult])
+@query_budget(2)
+def lookup_patients(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Patient picker typeahead: best name matches for what has been typed.
+
+    Results are cached per user for a few seconds, so repeated keystrokes
+    (typing, deleting, retyping) don't go back to the database.
+    """
+    key = (getattr(current_user, "id"), q.casefold().strip(), limit)
+    results = patient_lookup_cache.get(key)
+    if results is None:
+        results = [
+            PatientLookupResult.model_validate(row)
+            for row in PatientService.lookup_patients(db, q, limit)
+        ]
+        patient_lookup_cache.set(key, results)
+    return results
+
+
 @router.get("/patients/{patient_id}", response_model=PatientResponse)
+@query_budget(2)
 def get_patient(
     patient_id: int,
     db: Session = Depends(get_db),
@@ -69,6 +247,7 @@ def update_patient(
 ):
     """Update patient information"""
     patient = PatientService.update_patient(db, patient_id, patient_data)
+    record_user_write(getattr(current_user, "id"))
     if not patient:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
@@ -84,6 +263,7 @@ def delete_patient(
 ):
     """Delete a patient record"""
     success = PatientService.delete_patient(db, patient_id)
+    record_user_write(getattr(current_user, "id"))
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
@@ -92,26 +272,86 @@ def delete_patient(
 
 
 # Prediction History Endpoints
-@router.get("/predictions/history", response_model=PredictionHistoryResponse)
+@router.get(
+    "/predictions/history",
+    response_model=Union[PredictionHistoryResponse, PredictionSummaryPage],
+)
+# One more with include_archived, which also reads the archive table
+@query_budget(4)
 def get_prediction_history(
     page: int = Query(1, ge=1),
     per_page: int = Query(5, ge=1, le=100),
     model_type: Optional[str] = Query(None),
     status: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
+    sort: str = Query("recent", pattern="^(recent|relevance)$"),
+    cursor: Optional[str] = Query(None),
+    view: str = Query("full", pattern="^(full|compact)$"),
+    include_archived: bool = Query(False),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Get prediction history for the current user"""
+    """Get prediction history for the current user.
+
+    ``page`` works for jumping to early pages; to walk deep into the
+    history follow ``next_cursor`` instead, which seeks straight to the
+    right place in the index. ``search`` matches word prefixes in the
+    patient name, prediction and notes; ``sort=relevance`` lists the best
+    matches first and pages by ``page`` only.
+
+    ``view=compact`` returns PredictionSummary rows instead: the columns a
+    list shows and the patient's name, birth date and gender, read without
+    building ORM objects and serialized straight to JSON. The full record
+    is at /predictions/{id}.
+
+    Archived and old predictions live in a separate table and are only
+    listed with ``include_archived=true`` (implied by ``status=archived``).
+    Relevance sorting then falls back to newest first.
+    """
+    include_archived = include_archived or status in ARCHIVE_STATUSES
+    by_relevance = sort == "relevance" and bool(search) and not include_archived
     skip = (page - 1) * per_page
     user_id = getattr(current_user, "id")
-    results = PredictionService.get_user_prediction_history(
-        db, user_id, skip, per_page, model_type, status, search
+    fetch_page = (
+        PredictionService.get_user_prediction_summaries
+        if view == "compact"
+        else PredictionService.get_user_prediction_history
     )
+    # One extra row tells whether there is a next page
+    results = fetch_page(
+        db,
+        user_id,
+        skip,
+        per_page + 1,
+        model_type,
+        status,
+        search,
+        cursor=None if by_relevance else _parse_cursor(cursor),
+        by_relevance=by_relevance,
+        include_archived=include_archived,
+    )
+    next_cursor = None if by_relevance else _next_cursor(results, per_page)
+    results = results[:per_page]
 
-    total = PredictionService.count_user_predictions(db, user_id)
+    total = PredictionService.count_user_predictions(
+        db, user_id, model_type, status, search, include_archived
+    )
     total_pages = math.ceil(total / per_page)
 
+    if view == "compact":
+        # The rows are already plain dicts of JSON-ready values; skipping
+        # response_model validation is most of the saving
+        return ORJSONResponse(
+            {
+                "results": results,
+                "total": total,
+                "page": page,
+                "per_page": per_page,
+                "total_pages": total_pages,
+                "next_cursor": next_cursor,
+            }
+        )
+
     # Convert SQLAlchemy models to Pydantic models
     result_responses = [
         PredictionResultResponse.model_validate(result) for result in results
@@ -123,19 +363,138 @@ def get_prediction_history(
         page=page,
         per_page=per_page,
         total_pages=total_pages,
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/predictions/export")
+def export_prediction_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    model_type: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Download the current user's whole prediction history in one request.
+
+    Streams NDJSON, CSV or Parquet, oldest first, with one
+    ``probability_<class>`` column per class; ``since``/``until`` bound
+    ``created_at``. Memory use does not grow with the number of rows.
+    """
+    user_id = getattr(current_user, "id")
+    return export_response(
+        db,
+        format,
+        f"user{user_id}",
+        user_id=user_id,
+        model_type=model_type,
+        status=status,
+        since=since,
+        until=until,
     )
 
 
 @router.get("/predictions/statistics", response_model=PredictionStatisticsResponse)
+@query_budget(4)
 def get_prediction_statistics(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    days: int = Query(30, ge=1, le=366),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
 ):
-    """Get prediction statistics for the current user"""
+    """Get prediction statistics for the current user.
+
+    Results are cached per user for a few seconds; the user's own uploads
+    and status changes invalidate them immediately.
+    """
     user_id = getattr(current_user, "id")
-    return PredictionService.get_prediction_statistics(db, user_id)
+    key = (user_id, days)
+    stats = statistics_cache.get(key)
+    if stats is None:
+        stats = PredictionService.get_prediction_statistics(db, user_id, days)
+        statistics_cache.set(key, stats)
+    return stats
+
+
+@router.get(
+    "/predictions/analytics/probabilities", response_model=ProbabilitySummaryResponse
+)
+@query_budget(2)
+def get_probability_summary(
+    model_type: Optional[str] = Query(None),
+    class_name: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    period: Optional[str] = Query(None, pattern="^(day|month)$"),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Probability statistics per class over the current user's predictions.
+
+    For example the mean glioma probability this month:
+    ``?class_name=Glioma Tumor&since=2025-06-01``. ``period`` splits each
+    class into one row per day or month. Computed in SQL from the
+    per-class probability table.
+    """
+    results = ProbabilityAnalyticsService.summarize(
+        db,
+        getattr(current_user, "id"),
+        model_type,
+        class_name,
+        since,
+        until,
+        period,
+    )
+    return {"results": results}
+
+
+@router.get("/predictions/analytics/matches", response_model=ProbabilityMatchPage)
+@query_budget(2)
+def find_predictions_by_probability(
+    class_name: str = Query(...),
+    model_type: Optional[str] = Query(None),
+    min_probability: Optional[float] = Query(None, ge=0, le=1),
+    max_probability: Optional[float] = Query(None, ge=0, le=1),
+    max_margin: Optional[float] = Query(None),
+    top_class_only: bool = Query(False),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """The current user's predictions filtered on one class's probability.
+
+    For example the close pneumonia calls:
+    ``?class_name=Pneumonia&top_class_only=true&max_margin=0.1``. Newest
+    first; follow ``next_cursor`` for more.
+    """
+    results = ProbabilityAnalyticsService.find_predictions(
+        db,
+        getattr(current_user, "id"),
+        class_name,
+        model_type,
+        min_probability,
+        max_probability,
+        max_margin,
+        top_class_only,
+        since,
+        until,
+        limit + 1,
+        _parse_cursor(cursor),
+    )
+    next_cursor = None
+    if len(results) > limit:
+        last = results[limit - 1]
+        next_cursor = encode_cursor(last["created_at"], last["prediction_id"])
+    return {"results": results[:limit], "next_cursor": next_cursor}
 
 
 @router.get("/predictions/{result_id}", response_model=PredictionResultResponse)
+# One more when the prediction has been archived
+@query_budget(3)
 def get_prediction_result(
     result_id: int,
     db: Session = Depends(get_db),
@@ -186,14 +545,25 @@ def update_prediction_result(
 @router.get(
     "/patients/{patient_id}/predictions", response_model=List[PredictionResultResponse]
 )
+# One more with include_archived
+@query_budget(4)
 def get_patient_predictions(
     patient_id: int,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(5, ge=1, le=100),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    include_archived: bool = Query(False),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user),
 ):
-    """Get all predictions for a specific patient"""
+    """Get all predictions for a specific patient.
+
+    When more rows follow, the cursor for the next page is returned in the
+    X-Next-Cursor header. ``include_archived=true`` adds the patient's
+    archived predictions.
+    """
+    keyset = _parse_cursor(cursor)
     # Verify patient exists
     patient = PatientService.get_patient(db, patient_id)
     if not patient:
@@ -201,4 +571,65 @@ def get_patient_predictions(
             status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
         )
 
-    return PredictionService.get_patient_prediction_history(db, patient_id, skip, limit)
+    results = PredictionService.get_patient_prediction_history(
+        db, patient_id, skip, limit + 1, cursor=keyset, include_archived=include_archived
+    )
+    next_cursor = _next_cursor(results, limit)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results[:limit]
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match holds ``etag`` (or is "*"), compared weakly"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+@router.get("/patients/{patient_id}/overview", response_model=PatientOverviewResponse)
+# One more with include_archived
+@query_budget(5)
+def get_patient_overview(
+    patient_id: int,
+    limit: int = Query(5, ge=1, le=100),
+    include_archived: bool = Query(False),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Everything the patient page shows, in one request.
+
+    The patient, their ``limit`` newest predictions, and prediction counts
+    per model type and status with the date of the latest one. Counts
+    always include archived predictions; ``include_archived=true`` lets
+    them into the recent list too.
+
+    The response carries an ETag of its body; a request whose
+    If-None-Match matches it gets an empty 304.
+    """
+    patient = PatientService.get_patient(db, patient_id)
+    if not patient:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Patient not found"
+        )
+
+    recent = PredictionService.get_patient_prediction_history(
+        db, patient_id, limit=limit, include_archived=include_archived
+    )
+    overview = PatientOverviewResponse.model_validate(
+        {
+            "patient": patient,
+            "recent_predictions": recent,
+            **PredictionService.get_patient_prediction_breakdown(db, patient_id),
+        },
+        from_attributes=True,
+    )
+    body = overview.model_dump_json().encode()
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    # Clients may keep it, but must check back before reusing it
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
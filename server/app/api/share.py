@@ -1,14 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 import logging
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.db.models import User
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user_async
 from app.services.email_service import email_service
-from app.services.prediction_service import PredictionService
+from app.services.prediction_service import AsyncPredictionService
 from app.utils.pdfGenerator import generateMedicalPDF
 
 logger = logging.getLogger(__name__)
@@ -30,8 +30,8 @@ class ShareReportResponse(BaseModel):
 @router.post("/share-report", response_model=ShareReportResponse)
 async def share_medical_report(
     request: ShareReportRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     """
     Share a medical analysis report with a doctor via email
@@ -41,7 +41,7 @@ async def share_medical_report(
         logger.info(f"Current user: {current_user.id if current_user else 'None'}")
         
         # Get the prediction result
-        prediction = PredictionService.get_prediction_result(db, request.prediction_id)
+        prediction = await AsyncPredictionService.get_prediction_result(db, request.prediction_id)
         logger.info(f"Prediction found: {prediction.id if prediction else 'None'}")
         if not prediction:
             raise HTTPException(
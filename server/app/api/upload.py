@@ -1,18 +1,21 @@
 import io
 import os
+import time
 import torch
 from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, status, Form
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from PIL import Image
 from datetime import datetime
 
-from app.db.session import get_db
+from app.db.session import get_async_db
 from app.db.models import User
-from app.api.auth import get_current_user
+from app.api.auth import get_current_user_async
+from app.core.metrics import observe_inference_batch, observe_model_load
+from app.core.query_stats import query_budget
+from app.core.timing import timed_stage
 from app.services.prediction_service import (
-    PatientService,
-    PredictionService,
+    AsyncPredictionService,
     save_uploaded_file,
 )
 from app.schemas.prediction import (
@@ -20,6 +23,7 @@ from app.schemas.prediction import (
     PatientCreate,
     PredictionResultCreate,
 )
+from app.utils.inference_config import optimize_for_inference
 from app.utils.model_utils import (
     create_vit_model,
     validate_image_confidence,
@@ -42,6 +46,7 @@ def load_tumor_model():
     global _tumor_model, _tumor_transforms
     if _tumor_model is None:
         print("Loading tumor model...")
+        started = time.perf_counter()
         _tumor_model, _tumor_transforms = create_vit_model(num_classes=4)
         _tumor_model.load_state_dict(
             torch.load(
@@ -50,6 +55,8 @@ def load_tumor_model():
             )
         )
         _tumor_model.eval()
+        _tumor_model = optimize_for_inference(_tumor_model, "tumor")
+        observe_model_load("tumor", _tumor_model, time.perf_counter() - started)
         print("Tumor model loaded successfully!")
     return _tumor_model, _tumor_transforms
 
@@ -59,6 +66,7 @@ def load_chest_model():
     global _chest_model, _chest_transforms
     if _chest_model is None:
         print("Loading chest X-ray model...")
+        started = time.perf_counter()
         _chest_model, _chest_transforms = create_vit_model(
             num_classes=2
         )  # Assuming binary classification for pneumonia
@@ -69,6 +77,8 @@ def load_chest_model():
             )
         )
         _chest_model.eval()
+        _chest_model = optimize_for_inference(_chest_model, "chest_xray")
+        observe_model_load("chest_xray", _chest_model, time.perf_counter() - started)
         print("Chest X-ray model loaded successfully!")
     return _chest_model, _chest_transforms
 
@@ -87,6 +97,7 @@ def parse_date(date_str: Optional[str]):
 
 
 @router.post("/tumor", response_model=PredictionResponse)
+@query_budget(4)
 async def predict_tumor(
     file: UploadFile = File(...),
     patient_id: Optional[int] = Form(None),
@@ -95,8 +106,8 @@ async def predict_tumor(
     patient_gender: Optional[str] = Form(None),
     patient_phone: Optional[str] = Form(None),
     notes: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
 ):
     """Predict tumor type and save result to history"""
     # First, use the Separator model to check if the image is MRI
@@ -112,20 +123,26 @@ async def predict_tumor(
     )
     
     # Load the separator model
-    separator_model, separator_transforms = load_separator_model()
+    with timed_stage("model_load"):
+        separator_model, separator_transforms = load_separator_model()
     
     # Process the uploaded image
-    image_data = await file.read()
-    img = Image.open(io.BytesIO(image_data))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    with timed_stage("read"):
+        image_data = await file.read()
+    with timed_stage("decode"):
+        img = Image.open(io.BytesIO(image_data))
+        img.load()
+        if img.mode != "RGB":
+            img = img.convert("RGB")
     
     # First check with separator model
     if separator_transforms is not None:
-        img_tensor = separator_transforms(img).unsqueeze(0)
-        
-        with torch.inference_mode():
-            separator_raw_probs = torch.softmax(separator_model(img_tensor), dim=1)
+        with timed_stage("separator"):
+            img_tensor = separator_transforms(img).unsqueeze(0)
+            observe_inference_batch("separator", img_tensor.shape[0])
+
+            with torch.inference_mode():
+                separator_raw_probs = torch.softmax(separator_model(img_tensor), dim=1)
         
         # Optionally reorder probs if an index map exists
         separator_index_map = load_index_map("Seperator", num_classes=len(separator_class_names))
@@ -160,7 +177,8 @@ async def predict_tumor(
     ]
 
     # Load the cached model
-    vit, vit_transforms = load_tumor_model()
+    with timed_stage("model_load"):
+        vit, vit_transforms = load_tumor_model()
 
     # Validate that models are loaded
     if vit is None or vit_transforms is None:
@@ -171,37 +189,37 @@ async def predict_tumor(
 
     # Image already processed above for separator validation
     # Transform and predict with tumor model
-    img_tensor = vit_transforms(img).unsqueeze(0)
+    with timed_stage("vit"):
+        img_tensor = vit_transforms(img).unsqueeze(0)
+        observe_inference_batch("tumor", img_tensor.shape[0])
 
-    with torch.inference_mode():
-        # Pass the transformed image through the model and turn the prediction logits into prediction probabilities
-        pred_probs = torch.softmax(vit(img_tensor), dim=1)
+        with torch.inference_mode():
+            # Pass the transformed image through the model and turn the prediction logits into prediction probabilities
+            pred_probs = torch.softmax(vit(img_tensor), dim=1)
 
     # Get prediction result
     prediction_result = validate_image_confidence(
         pred_probs, class_names, image_type="tumor"
     )
 
-    # Handle patient information
-    db_patient_id = patient_id
-    if not db_patient_id and patient_name:
-        # Create new patient
-        patient_data = PatientCreate(
+    # Handle patient information; a new patient is saved with the prediction
+    new_patient = None
+    if not patient_id and patient_name:
+        new_patient = PatientCreate(
             full_name=patient_name,
             date_of_birth=parse_date(patient_dob),
             gender=patient_gender,
             phone=patient_phone,
         )
-        db_patient = PatientService.create_patient(db, patient_data)
-        db_patient_id = getattr(db_patient, "id")
-    elif not db_patient_id:
+    elif not patient_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Either patient_id or patient_name must be provided",
         )
 
     # Save uploaded file
-    file_path = save_uploaded_file(image_data, file.filename or "tumor_image.jpg")
+    with timed_stage("save_file"):
+        file_path = save_uploaded_file(image_data, file.filename or "tumor_image.jpg")
     saved_filename = os.path.basename(
         file_path
     )  # Extract just the filename from the path
@@ -209,7 +227,7 @@ async def predict_tumor(
     # Save prediction result to database
     prediction_data = PredictionResultCreate(
         user_id=getattr(current_user, "id"),
-        patient_id=db_patient_id,
+        patient_id=patient_id,
         image_filename=saved_filename,  # Store the actual saved filename
         image_path=file_path,
         model_type="tumor",
@@ -221,7 +239,9 @@ async def predict_tumor(
         notes=notes,
     )
 
-    db_result = PredictionService.save_prediction_result(db, prediction_data, file_path)
+    [db_result] = await AsyncPredictionService.save_predictions(
+        db, [prediction_data], new_patient
+    )
 
     # Include the database ID in the response
     response_data = prediction_result.copy()
@@ -237,6 +257,7 @@ async def predict_tumor(
 
 
 @router.post("/chest", response_model=PredictionResponse)
+@query_budget(4)
 async def predict_chest(
     file: UploadFile = File(...),
     patient_id: Optional[int] = Form(None),
@@ -245,8 +266,8 @@ async def predict_chest(
     patient_gender: Optional[str] = Form(None),
     patient_phone: Optional[str] = Form(None),
     notes: Optional[str] = Form(None),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async),
 ):
     """Predict chest X-ray condition and save result to history"""
     class_names = [
@@ -255,7 +276,8 @@ async def predict_chest(
     ]
 
     # Load the cached model
-    vit, vit_transforms = load_chest_model()
+    with timed_stage("model_load"):
+        vit, vit_transforms = load_chest_model()
 
     # Validate that models are loaded
     if vit is None or vit_transforms is None:
@@ -265,43 +287,46 @@ async def predict_chest(
         )
 
     # Process the uploaded image
-    image_data = await file.read()
-    img = Image.open(io.BytesIO(image_data))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    with timed_stage("read"):
+        image_data = await file.read()
+    with timed_stage("decode"):
+        img = Image.open(io.BytesIO(image_data))
+        img.load()
+        if img.mode != "RGB":
+            img = img.convert("RGB")
 
     # Transform and predict
-    img_tensor = vit_transforms(img).unsqueeze(0)
+    with timed_stage("vit"):
+        img_tensor = vit_transforms(img).unsqueeze(0)
+        observe_inference_batch("chest_xray", img_tensor.shape[0])
 
-    with torch.inference_mode():
-        # Pass the transformed image through the model and turn the prediction logits into prediction probabilities
-        pred_probs = torch.softmax(vit(img_tensor), dim=1)
+        with torch.inference_mode():
+            # Pass the transformed image through the model and turn the prediction logits into prediction probabilities
+            pred_probs = torch.softmax(vit(img_tensor), dim=1)
 
     # Get prediction result
     prediction_result = validate_image_confidence(
         pred_probs, class_names, image_type="chest_xray"
     )
 
-    # Handle patient information
-    db_patient_id = patient_id
-    if not db_patient_id and patient_name:
-        # Create new patient
-        patient_data = PatientCreate(
+    # Handle patient information; a new patient is saved with the prediction
+    new_patient = None
+    if not patient_id and patient_name:
+        new_patient = PatientCreate(
             full_name=patient_name,
             date_of_birth=parse_date(patient_dob),
             gender=patient_gender,
             phone=patient_phone,
         )
-        db_patient = PatientService.create_patient(db, patient_data)
-        db_patient_id = getattr(db_patient, "id")
-    elif not db_patient_id:
+    elif not patient_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Either patient_id or patient_name must be provided",
         )
 
     # Save uploaded file
-    file_path = save_uploaded_file(image_data, file.filename or "chest_image.jpg")
+    with timed_stage("save_file"):
+        file_path = save_uploaded_file(image_data, file.filename or "chest_image.jpg")
     saved_filename = os.path.basename(
         file_path
     )  # Extract just the filename from the path
@@ -309,7 +334,7 @@ async def predict_chest(
     # Save prediction result to database
     prediction_data = PredictionResultCreate(
         user_id=getattr(current_user, "id"),
-        patient_id=db_patient_id,
+        patient_id=patient_id,
         image_filename=saved_filename,  # Store the actual saved filename
         image_path=file_path,
         model_type="chest_xray",
@@ -321,7 +346,9 @@ async def predict_chest(
         notes=notes,
     )
 
-    db_result = PredictionService.save_prediction_result(db, prediction_data, file_path)
+    [db_result] = await AsyncPredictionService.save_predictions(
+        db, [prediction_data], new_patient
+    )
 
     # Include the database ID in the response
     response_data = prediction_result.copy()
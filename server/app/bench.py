@@ -0,0 +1,511 @@
+"""
+Offline CPU inference micro-benchmark.
+
+Builds the tumor, chest X-ray and separator architectures with random
+weights (nothing is downloaded) and sweeps batch size, torch thread pools,
+precision (fp32 / bf16 / int8) and memory format (contiguous /
+channels_last). Prints latency and throughput tables and writes the fastest
+single-image configuration to models/inference_config.candidate.json.
+Review it, then copy it to models/inference_config.json (or point
+INFERENCE_CONFIG_PATH at it) for the server to apply at startup.
+
+Only fp32 is selected by default, in either memory format. With
+--allow-reduced-precision, a bf16 or int8 setting may be selected too,
+but only after it matches fp32 on the real checkpoints in models/: the
+same top-1 class on at least --min-top1-agreement of the inputs, and no
+class probability off by more than --max-prob-diff.
+
+With --models, the selected models are merged into the existing config
+(the output file, else the server's config) and the other models keep
+their entries.
+
+Usage (from the server directory):
+    python -m app.bench
+    python -m app.bench --models tumor --batch-sizes 1,8 --threads 2,4 --precisions fp32,int8
+    python -m app.bench --allow-reduced-precision --accuracy-images scans/
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.inference_config import (
+    DEFAULT_CONFIG_PATH,
+    MEMORY_FORMATS,
+    PRECISIONS,
+    load_inference_config,
+)
+
+SERVER_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_OUTPUT_PATH = os.path.join(SERVER_ROOT, "models", "inference_config.candidate.json")
+DEFAULT_CHECKPOINT_DIR = os.path.join(SERVER_ROOT, "models")
+
+# name -> (builder, num_classes); matches the models loaded by the API
+MODEL_SPECS = {
+    "tumor": ("vit", 4),
+    "chest_xray": ("vit", 2),
+    "separator": ("effnetb2", 2),
+}
+
+# name -> (checkpoint file, num_classes), as app.main loads them
+CHECKPOINTS = {
+    "tumor": ("Tumor.pth", 4),
+    "chest_xray": ("ChestXray.pth", 4),
+    "separator": ("Seperator.pth", 2),
+}
+
+
+def _build_model(model_name: str):
+    from app.utils.model_utils import create_effnetb2_model, create_vit_model
+
+    builder, num_classes = MODEL_SPECS[model_name]
+    if builder == "vit":
+        model, transforms = create_vit_model(num_classes=num_classes, pretrained=False)
+    else:
+        model, transforms = create_effnetb2_model(num_classes=num_classes, pretrained=False)
+    return model.eval(), transforms.crop_size[0]
+
+
+def _time_forward(model, batch, warmup: int, iterations: int) -> List[float]:
+    import torch
+
+    with torch.inference_mode():
+        for _ in range(warmup):
+            model(batch)
+        latencies = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            model(batch)
+            latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def run_thread_configuration(options: dict) -> List[dict]:
+    """Benchmark every model/precision/format/batch combination for one thread setting.
+
+    Runs in a fresh process because the inter-op pool size can only be set
+    before PyTorch starts any parallel work.
+    """
+    import copy
+
+    import torch
+
+    from app.utils.inference_config import prepare_model
+
+    torch.set_num_threads(options["threads"])
+    torch.set_num_interop_threads(options["interop_threads"])
+
+    rows = []
+    for model_name in options["models"]:
+        base_model, image_size = _build_model(model_name)
+        for precision in options["precisions"]:
+            for memory_format in options["memory_formats"]:
+                try:
+                    model = prepare_model(copy.deepcopy(base_model), precision, memory_format)
+                except Exception as e:
+                    print(f"  skipping {model_name} {precision}/{memory_format}: {e}")
+                    continue
+
+                for batch_size in options["batch_sizes"]:
+                    batch = torch.randn(batch_size, 3, image_size, image_size)
+                    latencies = sorted(
+                        _time_forward(model, batch, options["warmup"], options["iterations"])
+                    )
+                    p50 = latencies[len(latencies) // 2]
+                    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                    mean = sum(latencies) / len(latencies)
+                    rows.append(
+                        {
+                            "model": model_name,
+                            "threads": options["threads"],
+                            "interop_threads": options["interop_threads"],
+                            "precision": precision,
+                            "memory_format": memory_format,
+                            "batch_size": batch_size,
+                            "latency_p50_ms": round(p50, 3),
+                            "latency_p95_ms": round(p95, 3),
+                            "latency_mean_ms": round(mean, 3),
+                            "throughput_ips": round(batch_size * 1000 / mean, 3),
+                        }
+                    )
+    return rows
+
+
+def _load_checkpoint(model_name: str, checkpoint_dir: str):
+    import torch
+
+    from app.utils.model_utils import create_effnetb2_model, create_vit_model
+
+    builder, _ = MODEL_SPECS[model_name]
+    filename, num_classes = CHECKPOINTS[model_name]
+    create = create_vit_model if builder == "vit" else create_effnetb2_model
+    model, transforms = create(num_classes=num_classes, pretrained=False)
+    model.load_state_dict(
+        torch.load(os.path.join(checkpoint_dir, filename), map_location=torch.device("cpu"))
+    )
+    return model.eval(), transforms
+
+
+def _accuracy_inputs(transforms, image_dir: Optional[str], samples: int):
+    """The images in ``image_dir`` through the model's transforms, else seeded noise"""
+    import torch
+
+    if image_dir:
+        from PIL import Image
+
+        names = sorted(
+            name
+            for name in os.listdir(image_dir)
+            if name.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        if not names:
+            raise ValueError(f"no .jpg/.jpeg/.png images in {image_dir}")
+        return torch.stack(
+            [
+                transforms(Image.open(os.path.join(image_dir, name)).convert("RGB"))
+                for name in names
+            ]
+        )
+    size = transforms.crop_size[0]
+    return torch.randn(samples, 3, size, size, generator=torch.Generator().manual_seed(0))
+
+
+def check_accuracy(
+    model_name: str,
+    settings: List[Tuple[str, str]],
+    checkpoint_dir: str,
+    image_dir: Optional[str] = None,
+    samples: int = 32,
+) -> Dict[Tuple[str, str], dict]:
+    """Compare each (precision, memory format) against fp32 on the real weights.
+
+    Returns the share of inputs with the same top-1 class, and the largest
+    absolute difference in any class probability, per setting.
+    """
+    import copy
+
+    import torch
+
+    from app.utils.inference_config import prepare_model
+
+    base_model, transforms = _load_checkpoint(model_name, checkpoint_dir)
+    inputs = _accuracy_inputs(transforms, image_dir, samples)
+
+    def probabilities(model):
+        with torch.inference_mode():
+            return torch.cat(
+                [torch.softmax(model(batch), dim=1) for batch in inputs.split(8)]
+            )
+
+    reference = probabilities(base_model)
+    results = {}
+    for precision, memory_format in settings:
+        model = prepare_model(copy.deepcopy(base_model), precision, memory_format)
+        candidate = probabilities(model)
+        results[(precision, memory_format)] = {
+            "inputs": len(inputs),
+            "top1_agreement": round(
+                (candidate.argmax(dim=1) == reference.argmax(dim=1)).float().mean().item(), 4
+            ),
+            "max_abs_diff": round((candidate - reference).abs().max().item(), 6),
+        }
+    return results
+
+
+def print_table(rows: List[dict]) -> None:
+    header = (
+        f"{'model':<11} {'thr':>3} {'iop':>3} {'precision':<9} {'format':<13} "
+        f"{'batch':>5} {'p50 ms':>9} {'p95 ms':>9} {'img/s':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['model']:<11} {row['threads']:>3} {row['interop_threads']:>3} "
+            f"{row['precision']:<9} {row['memory_format']:<13} {row['batch_size']:>5} "
+            f"{row['latency_p50_ms']:>9.2f} {row['latency_p95_ms']:>9.2f} "
+            f"{row['throughput_ips']:>9.2f}"
+        )
+
+
+def select_best_configuration(
+    rows: List[dict],
+    models: List[str],
+    approved: Optional[Dict[Tuple[str, str, str], dict]] = None,
+    thread_key: Optional[Tuple[int, int]] = None,
+) -> dict:
+    """Pick the serving configuration from the sweep results.
+
+    The API runs one image per forward pass, so choices are made on batch
+    size 1 latency: the thread setting with the lowest summed p50 across
+    models (or ``thread_key``, if it was measured), then the fastest
+    precision/format per model at that setting. Only fp32 rows are
+    candidates, plus the (model, precision, memory format) settings in
+    ``approved``, whose accuracy check is recorded with the choice. The
+    best-throughput batch size is recorded for reference.
+    """
+    approved = approved or {}
+    rows = [
+        row
+        for row in rows
+        if row["precision"] == "fp32"
+        or (row["model"], row["precision"], row["memory_format"]) in approved
+    ]
+    single = [row for row in rows if row["batch_size"] == 1] or rows
+    thread_keys = sorted({(row["threads"], row["interop_threads"]) for row in single})
+
+    def thread_cost(key):
+        total = 0.0
+        for model_name in models:
+            candidates = [
+                row["latency_p50_ms"]
+                for row in single
+                if row["model"] == model_name and (row["threads"], row["interop_threads"]) == key
+            ]
+            total += min(candidates) if candidates else float("inf")
+        return total
+
+    if thread_key in thread_keys:
+        threads, interop_threads = thread_key
+    else:
+        threads, interop_threads = min(thread_keys, key=thread_cost)
+
+    best_models: Dict[str, dict] = {}
+    for model_name in models:
+        candidates = [
+            row
+            for row in single
+            if row["model"] == model_name
+            and (row["threads"], row["interop_threads"]) == (threads, interop_threads)
+        ]
+        if not candidates:
+            continue
+        fastest = min(candidates, key=lambda row: row["latency_p50_ms"])
+        throughput = max(
+            (
+                row
+                for row in rows
+                if row["model"] == model_name
+                and (row["threads"], row["interop_threads"]) == (threads, interop_threads)
+            ),
+            key=lambda row: row["throughput_ips"],
+        )
+        best_models[model_name] = {
+            "precision": fastest["precision"],
+            "memory_format": fastest["memory_format"],
+            "latency_p50_ms": fastest["latency_p50_ms"],
+            "best_throughput_batch_size": throughput["batch_size"],
+            "best_throughput_ips": throughput["throughput_ips"],
+        }
+        accuracy = approved.get((model_name, fastest["precision"], fastest["memory_format"]))
+        if fastest["precision"] != "fp32" and accuracy:
+            best_models[model_name]["accuracy"] = accuracy
+
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "host": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "torch_num_threads": threads,
+        "torch_num_interop_threads": interop_threads,
+        "models": best_models,
+    }
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def _choice_list(choices):
+    def parse(value: str) -> List[str]:
+        items = [v for v in value.split(",") if v]
+        unknown = set(items) - set(choices)
+        if unknown:
+            raise argparse.ArgumentTypeError(
+                f"unknown value(s) {', '.join(sorted(unknown))}; choose from {', '.join(choices)}"
+            )
+        return items
+
+    return parse
+
+
+def default_thread_counts() -> List[int]:
+    cpu_count = os.cpu_count() or 1
+    return sorted({c for c in (1, 2, 4, cpu_count // 2, cpu_count) if 1 <= c <= cpu_count})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--models", type=_choice_list(tuple(MODEL_SPECS)), default=list(MODEL_SPECS))
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 4, 8])
+    parser.add_argument("--threads", type=_int_list, default=default_thread_counts())
+    parser.add_argument("--interop-threads", type=_int_list, default=[1])
+    parser.add_argument("--precisions", type=_choice_list(PRECISIONS), default=list(PRECISIONS))
+    parser.add_argument(
+        "--memory-formats", type=_choice_list(MEMORY_FORMATS), default=list(MEMORY_FORMATS)
+    )
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured passes per combination")
+    parser.add_argument("--iterations", type=int, default=10, help="measured passes per combination")
+    parser.add_argument(
+        "--output",
+        default=DEFAULT_OUTPUT_PATH,
+        help="where to write the selected configuration; the server reads "
+        "models/inference_config.json (or INFERENCE_CONFIG_PATH)",
+    )
+    parser.add_argument(
+        "--allow-reduced-precision",
+        action="store_true",
+        help="let bf16/int8 be selected once they match fp32 on the real checkpoints",
+    )
+    parser.add_argument("--checkpoint-dir", default=DEFAULT_CHECKPOINT_DIR)
+    parser.add_argument(
+        "--accuracy-images",
+        help="directory of sample scans for the accuracy check (default: seeded noise)",
+    )
+    parser.add_argument(
+        "--accuracy-samples", type=int, default=32, help="noise inputs without --accuracy-images"
+    )
+    parser.add_argument("--min-top1-agreement", type=float, default=0.99)
+    parser.add_argument("--max-prob-diff", type=float, default=0.05)
+    parser.add_argument("--results", help="optionally write every measurement as JSON")
+    return parser.parse_args(argv)
+
+
+def approve_reduced_precision(args, rows: List[dict]) -> Dict[Tuple[str, str, str], dict]:
+    """Run the accuracy check for every measured bf16/int8 setting.
+
+    Returns the (model, precision, memory format) settings within the
+    thresholds, with their results. A model whose checkpoint can't be
+    loaded keeps to fp32.
+    """
+    print()
+    print("Accuracy against fp32 on the real checkpoints:")
+    approved = {}
+    for model_name in args.models:
+        settings = sorted(
+            {
+                (row["precision"], row["memory_format"])
+                for row in rows
+                if row["model"] == model_name and row["precision"] != "fp32"
+            }
+        )
+        if not settings:
+            continue
+        try:
+            results = check_accuracy(
+                model_name,
+                settings,
+                args.checkpoint_dir,
+                args.accuracy_images,
+                args.accuracy_samples,
+            )
+        except Exception as e:
+            print(f"  {model_name}: accuracy check failed, keeping fp32: {e}")
+            continue
+        for (precision, memory_format), result in results.items():
+            passed = (
+                result["top1_agreement"] >= args.min_top1_agreement
+                and result["max_abs_diff"] <= args.max_prob_diff
+            )
+            print(
+                f"  {model_name:<11} {precision:<5} {memory_format:<13} "
+                f"top-1 agreement {result['top1_agreement']:.2%}, "
+                f"max prob diff {result['max_abs_diff']:.4f}: "
+                f"{'approved' if passed else 'rejected'}"
+            )
+            if passed:
+                approved[(model_name, precision, memory_format)] = result
+    return approved
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    context = multiprocessing.get_context("spawn")
+
+    rows: List[dict] = []
+    for threads in args.threads:
+        for interop_threads in args.interop_threads:
+            print(f"Benchmarking with {threads} intra-op / {interop_threads} inter-op threads...")
+            options = {
+                "threads": threads,
+                "interop_threads": interop_threads,
+                "models": args.models,
+                "batch_sizes": args.batch_sizes,
+                "precisions": args.precisions,
+                "memory_formats": args.memory_formats,
+                "warmup": args.warmup,
+                "iterations": args.iterations,
+            }
+            with context.Pool(processes=1) as pool:
+                rows.extend(pool.apply(run_thread_configuration, (options,)))
+
+    print()
+    print_table(rows)
+
+    approved = approve_reduced_precision(args, rows) if args.allow_reduced_precision else {}
+
+    # A partial run only replaces its own models' entries, and keeps the
+    # existing thread setting when it was part of the sweep
+    existing: dict = {}
+    if set(args.models) != set(MODEL_SPECS):
+        for path in (args.output, os.getenv("INFERENCE_CONFIG_PATH", DEFAULT_CONFIG_PATH)):
+            if os.path.exists(path):
+                existing = load_inference_config(path)
+                print(f"Merging into the configuration from {path}")
+                break
+    thread_key = None
+    if existing.get("torch_num_threads"):
+        thread_key = (
+            existing["torch_num_threads"],
+            existing.get("torch_num_interop_threads") or 1,
+        )
+
+    best = select_best_configuration(rows, args.models, approved, thread_key)
+    if existing:
+        best = {
+            **existing,
+            **best,
+            "models": {**existing.get("models", {}), **best["models"]},
+        }
+    print()
+    print(
+        f"Selected {best['torch_num_threads']} intra-op / "
+        f"{best['torch_num_interop_threads']} inter-op threads"
+    )
+    for model_name in args.models:
+        settings = best["models"].get(model_name)
+        if settings is None:
+            continue
+        print(
+            f"  {model_name:<11} {settings['precision']:<5} {settings['memory_format']:<13} "
+            f"p50 {settings['latency_p50_ms']:.2f} ms at batch 1"
+        )
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(best, f, indent=2)
+    print(f"Configuration written to {args.output}")
+    if os.path.abspath(args.output) != os.path.abspath(DEFAULT_CONFIG_PATH):
+        print(f"Copy it to {DEFAULT_CONFIG_PATH} (or set INFERENCE_CONFIG_PATH) to use it")
+
+    if args.results:
+        with open(args.results, "w", encoding="utf-8") as f:
+            json.dump(
+                {"benchmark": "inference", "created_at": best["created_at"], "results": rows},
+                f,
+                indent=2,
+            )
+        print(f"All measurements written to {args.results}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Background mover for the prediction archive (see app.services.archive_service)
+"""
+
+import asyncio
+from datetime import datetime
+import logging
+import os
+import time
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.metrics import ARCHIVE_MOVED, ARCHIVE_RUN_DURATION
+from app.db.session import SessionLocal
+from app.services.archive_service import ArchiveService
+
+logger = logging.getLogger(__name__)
+
+# 0 disables the scheduled runs; POST /admin/archive/run still works
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+
+
+class ArchiveScheduler:
+    """Periodically moves due predictions to the archive table"""
+
+    def __init__(self, interval_seconds: float = ARCHIVE_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.is_running = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start_scheduler(self):
+        """Start the archive scheduler, unless it is disabled"""
+        if self.is_running or self.interval_seconds <= 0:
+            return
+
+        self.is_running = True
+        self._task = asyncio.create_task(self._archive_loop())
+        logger.info(f"Archive scheduler started (interval: {self.interval_seconds}s)")
+
+    async def stop_scheduler(self):
+        """Stop the archive scheduler"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+        logger.info("Archive scheduler stopped")
+
+    async def _archive_loop(self):
+        while self.is_running:
+            try:
+                await self.run("scheduled")
+                await asyncio.sleep(self.interval_seconds)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in archive loop: {e}")
+                await asyncio.sleep(min(self.interval_seconds, 300))
+
+    async def run(self, trigger: str = "manual", bind=None) -> dict:
+        """Move due predictions now, in a worker thread; returns the counts.
+
+        ``bind`` overrides the application's engine.
+        """
+        started = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(self._archive_due, bind)
+        finally:
+            ARCHIVE_RUN_DURATION.labels(trigger).observe(time.perf_counter() - started)
+        ARCHIVE_MOVED.labels(trigger).inc(result["moved"])
+        result["timestamp"] = datetime.utcnow().isoformat()
+        if result["moved"]:
+            logger.info(f"Archived {result['moved']} predictions ({trigger})")
+        return result
+
+    @staticmethod
+    def _archive_due(bind=None) -> dict:
+        db = Session(bind=bind) if bind is not None else SessionLocal()
+        try:
+            return ArchiveService.archive_due(db)
+        finally:
+            db.close()
+
+
+# Global instance
+archive_scheduler = ArchiveScheduler()
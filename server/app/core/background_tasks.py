@@ -9,10 +9,12 @@ from app.core.email import (
     send_otp_email as _send_otp_email,
     send_password_reset_email as _send_password_reset_email,
 )
+from app.core.tracing import traced
 
 logger = logging.getLogger(__name__)
 
 
+@traced()
 def send_otp_email_task(email: str, full_name: str, otp_code: str) -> None:
     """
     Background task for sending OTP emails.
@@ -35,6 +37,7 @@ def send_otp_email_task(email: str, full_name: str, otp_code: str) -> None:
         logger.error(f"Error in background task sending OTP email to {email}: {str(e)}")
 
 
+@traced()
 def send_welcome_email_task(email: str, full_name: str) -> None:
     """
     Background task for sending welcome emails after successful verification.
@@ -60,6 +63,7 @@ def send_welcome_email_task(email: str, full_name: str) -> None:
         )
 
 
+@traced()
 def send_password_reset_email_task(email: str, full_name: str, otp_code: str) -> None:
     """
     Background task for sending password reset emails.
@@ -0,0 +1,81 @@
+"""
+Small in-process caches with a time-to-live.
+
+Used for per-user read results that are expensive to compute and fine to
+serve a few seconds stale, so a burst of identical requests (a page
+refresh, a dashboard polling) reaches the database once. Every worker
+process has its own copies; writers evict the entries they affect.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+_caches: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire ``ttl_seconds`` after being set.
+
+    When full, the least recently used entry is dropped. A TTL of zero
+    disables the cache.
+    """
+
+    def __init__(self, name: str, ttl_seconds: float, max_entries: int = 1024):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        _caches[name] = self
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, match: Callable[[Hashable], bool]) -> None:
+        """Drop every entry whose key satisfies ``match``"""
+        with self._lock:
+            for key in [key for key in self._entries if match(key)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def cache_statistics() -> Dict[str, dict]:
+    """Size and hit counts of every TTL cache in this process"""
+    return {
+        name: {
+            "entries": len(cache),
+            "ttl_seconds": cache.ttl_seconds,
+            "hits": cache.hits,
+            "misses": cache.misses,
+        }
+        for name, cache in sorted(_caches.items())
+    }
@@ -15,5 +15,8 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str
     SMTP_USE_TLS: bool
 
+    # Admin settings; admin-only features stay off while this is empty
+    ADMIN_API_KEY: str = ""
+
 
 settings = Settings()
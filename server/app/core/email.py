@@ -7,6 +7,7 @@ from email.mime.multipart import MIMEMultipart
 from typing import Optional
 
 from app.core.config import settings
+from app.core.metrics import record_email_failure, track_email_send
 
 
 def generate_otp() -> str:
@@ -226,11 +227,12 @@ def send_password_reset_email(email: str, full_name: str, otp_code: str) -> bool
         msg.attach(html_part)
 
         # Send email
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            if settings.SMTP_USE_TLS:
-                server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
+        with track_email_send("password_reset"):
+            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+                if settings.SMTP_USE_TLS:
+                    server.starttls()
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+                server.send_message(msg)
 
         print(f"Password reset email sent successfully to {email}")
         return True
@@ -241,6 +243,7 @@ def send_password_reset_email(email: str, full_name: str, otp_code: str) -> bool
 
         logger = logging.getLogger(__name__)
         logger.error(f"Failed to send password reset email to {email}: {e}")
+        record_email_failure("password_reset")
 
         # Fallback to console output for development
         print(f"Failed to send password reset email (using console fallback): {e}")
@@ -301,11 +304,12 @@ def send_otp_email(email: str, full_name: str, otp_code: str) -> bool:
         msg.attach(html_part)
 
         # Send email
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            if settings.SMTP_USE_TLS:
-                server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
+        with track_email_send("otp"):
+            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+                if settings.SMTP_USE_TLS:
+                    server.starttls()
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+                server.send_message(msg)
 
         print(f"OTP email sent successfully to {email}")
         return True
@@ -316,6 +320,7 @@ def send_otp_email(email: str, full_name: str, otp_code: str) -> bool:
 
         logger = logging.getLogger(__name__)
         logger.error(f"Failed to send email to {email}: {e}")
+        record_email_failure("otp")
 
         # Fallback to console output for development
         print(f"Failed to send email (using console fallback): {e}")
@@ -439,11 +444,12 @@ def send_welcome_email(email: str, fullname: str):
         msg.attach(html_part)
 
         # Send email
-        with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
-            if settings.SMTP_USE_TLS:
-                server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
+        with track_email_send("welcome"):
+            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+                if settings.SMTP_USE_TLS:
+                    server.starttls()
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+                server.send_message(msg)
 
         print(f"Welcome email sent successfully to {email}")
         return True
@@ -454,6 +460,7 @@ def send_welcome_email(email: str, fullname: str):
 
         logger = logging.getLogger(__name__)
         logger.error(f"Failed to send welcome email to {email}: {e}")
+        record_email_failure("welcome")
 
         # Fallback to console output for development
         print(f"Failed to send welcome email (using console fallback): {e}")
@@ -0,0 +1,367 @@
+"""
+Memory accounting for a worker process.
+
+Builds the /admin/memory report (process RSS/USS, bytes held by every cached
+model, cache sizes, PIL and SQLAlchemy state, tracemalloc top allocators) and
+attributes resident-set growth to the endpoints that were running when it
+happened. A background sampler logs that growth periodically so slow leaks
+show up in the logs with the routes responsible.
+"""
+
+import asyncio
+import gc
+import logging
+import os
+import resource
+import sys
+import threading
+import tracemalloc
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Module-level model caches: module name -> global variable names
+MODEL_CACHES = {
+    "app.main": ("_tumor_model", "_chest_model", "_separator_model"),
+    "app.api.upload": ("_tumor_model", "_chest_model"),
+}
+
+# Growth between two samples above this is logged as a warning
+GROWTH_WARNING_BYTES = 64 * 1024 * 1024
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _read_proc_kb(path: str, fields: tuple) -> Dict[str, int]:
+    values = {}
+    try:
+        with open(path, "r", encoding="ascii") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in fields:
+                    values[name] = int(rest.split()[0])
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process; cheap enough to call per request"""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # No procfs (macOS/Windows): fall back to the peak, which only grows
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == "darwin" else usage * 1024
+
+
+def process_memory() -> dict:
+    """RSS, USS (pages private to this worker), peak RSS and swap"""
+    status = _read_proc_kb("/proc/self/status", ("VmRSS", "VmHWM", "VmSwap"))
+    rollup = _read_proc_kb(
+        "/proc/self/smaps_rollup", ("Private_Clean", "Private_Dirty", "Pss")
+    )
+    info = {"pid": os.getpid(), "rss_bytes": current_rss_bytes()}
+    if "VmHWM" in status:
+        info["peak_rss_bytes"] = status["VmHWM"] * 1024
+    if "VmSwap" in status:
+        info["swap_bytes"] = status["VmSwap"] * 1024
+    if rollup:
+        # USS is what the worker would give back if it exited; with forked
+        # workers sharing model pages it is much smaller than RSS
+        info["uss_bytes"] = (
+            rollup.get("Private_Clean", 0) + rollup.get("Private_Dirty", 0)
+        ) * 1024
+        info["pss_bytes"] = rollup.get("Pss", 0) * 1024
+    return info
+
+
+def _tensor_bytes(tensors) -> int:
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def model_memory() -> List[dict]:
+    """Parameter and buffer bytes of every cached model.
+
+    The API modules keep separate caches, so the same weights can be loaded
+    more than once. Entries that share storage with an earlier entry are
+    marked ``shared_with`` and left out of the unique total.
+    """
+    entries = []
+    seen: Dict[int, str] = {}
+    for module_name, attributes in MODEL_CACHES.items():
+        module = sys.modules.get(module_name)
+        for attribute in attributes:
+            model = getattr(module, attribute, None) if module is not None else None
+            slot = f"{module_name}.{attribute}"
+            if model is None:
+                entries.append({"cache": slot, "loaded": False})
+                continue
+
+            parameters = list(model.parameters())
+            buffers = list(model.buffers())
+            first = parameters[0] if parameters else (buffers[0] if buffers else None)
+            storage = first.untyped_storage().data_ptr() if first is not None else id(model)
+            entries.append(
+                {
+                    "cache": slot,
+                    "loaded": True,
+                    "type": type(model).__name__,
+                    "parameter_bytes": _tensor_bytes(parameters),
+                    "buffer_bytes": _tensor_bytes(buffers),
+                    "parameter_count": sum(p.numel() for p in parameters),
+                    "shared_with": seen.get(storage),
+                }
+            )
+            seen.setdefault(storage, slot)
+    return entries
+
+
+def cache_sizes() -> dict:
+    """Sizes of the in-process caches that live for the whole worker"""
+    from app.core import timing
+    from app.core.cache import cache_statistics
+    from app.utils import inference_config
+
+    caches = {
+        "inference_config_loaded": inference_config._config_cache is not None,
+        "stage_histograms": len(timing._stage_histograms),
+        "endpoint_memory_routes": len(_route_growth),
+        "ttl_caches": cache_statistics(),
+    }
+
+    try:
+        from PIL import Image
+
+        # Pillow's block allocator keeps freed image buffers for reuse
+        caches["pil_arena"] = Image.core.get_stats()
+    except Exception:
+        pass
+
+    try:
+        from sqlalchemy.orm.session import _sessions
+
+        sessions = list(_sessions.values())
+        caches["sqlalchemy_open_sessions"] = len(sessions)
+        caches["sqlalchemy_identity_map_objects"] = sum(
+            len(session.identity_map) for session in sessions
+        )
+    except Exception:
+        pass
+
+    try:
+        from app.db.session import engine
+
+        caches["sqlalchemy_pool"] = engine.pool.status()
+    except Exception:
+        pass
+
+    caches["gc_objects"] = len(gc.get_objects())
+    caches["gc_counts"] = gc.get_count()
+    return caches
+
+
+# tracemalloc, switched on through the admin endpoints
+
+_tracemalloc_baseline: Optional[tracemalloc.Snapshot] = None
+
+
+def _take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        )
+    )
+
+
+def start_tracemalloc(frames: int = 1) -> None:
+    """Start tracing allocations; the first snapshot is the growth baseline"""
+    global _tracemalloc_baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _tracemalloc_baseline = _take_snapshot()
+
+
+def stop_tracemalloc() -> None:
+    global _tracemalloc_baseline
+    _tracemalloc_baseline = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _format_stat(stat) -> dict:
+    frame = stat.traceback[0]
+    entry = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    return entry
+
+
+def tracemalloc_report(top: int = 20) -> dict:
+    """Largest allocation sites now, and the ones that grew most since start"""
+    if not tracemalloc.is_tracing():
+        return {"tracing": False}
+
+    snapshot = _take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    report = {
+        "tracing": True,
+        "traced_bytes": current,
+        "traced_peak_bytes": peak,
+        "top_allocators": [_format_stat(s) for s in snapshot.statistics("lineno")[:top]],
+    }
+    if _tracemalloc_baseline is not None:
+        growth = snapshot.compare_to(_tracemalloc_baseline, "lineno")
+        report["top_growth"] = [_format_stat(s) for s in growth[:top] if s.size_diff > 0]
+    return report
+
+
+def memory_report(top: int = 20) -> dict:
+    models = model_memory()
+    return {
+        "process": process_memory(),
+        "models": models,
+        "model_unique_bytes": sum(
+            entry["parameter_bytes"] + entry["buffer_bytes"]
+            for entry in models
+            if entry["loaded"] and entry["shared_with"] is None
+        ),
+        "caches": cache_sizes(),
+        "endpoints": endpoint_growth(),
+        "tracemalloc": tracemalloc_report(top),
+    }
+
+
+# Per-endpoint growth
+
+_route_growth: Dict[str, dict] = {}
+_growth_lock = threading.Lock()
+
+
+def _record_growth(route: str, delta: int) -> None:
+    with _growth_lock:
+        entry = _route_growth.get(route)
+        if entry is None:
+            entry = _route_growth[route] = {
+                "requests": 0,
+                "growth_bytes": 0,
+                "max_growth_bytes": 0,
+                "interval_growth_bytes": 0,
+            }
+        entry["requests"] += 1
+        entry["growth_bytes"] += delta
+        entry["interval_growth_bytes"] += delta
+        if delta > entry["max_growth_bytes"]:
+            entry["max_growth_bytes"] = delta
+
+
+def endpoint_growth() -> Dict[str, dict]:
+    """RSS growth observed while each route was running, largest first.
+
+    With concurrent requests growth is charged to every request in flight,
+    so treat the numbers as a pointer to suspects rather than an exact split.
+    """
+    with _growth_lock:
+        entries = {route: dict(entry) for route, entry in _route_growth.items()}
+    for entry in entries.values():
+        entry.pop("interval_growth_bytes")
+    return dict(sorted(entries.items(), key=lambda item: item[1]["growth_bytes"], reverse=True))
+
+
+class MemoryTrackingMiddleware:
+    """ASGI middleware charging RSS growth during a request to its route"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rss_before = current_rss_bytes()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            _record_growth(f"{scope['method']} {route}", current_rss_bytes() - rss_before)
+
+
+class MemorySampler:
+    """Logs RSS and the routes that grew it, at a fixed interval"""
+
+    def __init__(self, interval_seconds: float = 300):
+        self.interval_seconds = interval_seconds
+        self.is_running = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_rss = 0
+
+    async def start(self):
+        if self.is_running or self.interval_seconds <= 0:
+            return
+        self.is_running = True
+        self._last_rss = current_rss_bytes()
+        self._task = asyncio.create_task(self._sample_loop())
+        logger.info(f"Memory sampler started (interval: {self.interval_seconds}s)")
+
+    async def stop(self):
+        if not self.is_running:
+            return
+        self.is_running = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _sample_loop(self):
+        while self.is_running:
+            try:
+                await asyncio.sleep(self.interval_seconds)
+                self.sample()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Error in memory sampler: {e}")
+
+    def sample(self) -> dict:
+        """Log growth since the previous sample and reset the interval counters"""
+        rss = current_rss_bytes()
+        growth = rss - self._last_rss
+        self._last_rss = rss
+
+        with _growth_lock:
+            interval = {
+                route: entry["interval_growth_bytes"]
+                for route, entry in _route_growth.items()
+                if entry["interval_growth_bytes"]
+            }
+            for entry in _route_growth.values():
+                entry["interval_growth_bytes"] = 0
+
+        top_routes = sorted(interval.items(), key=lambda item: item[1], reverse=True)[:5]
+        summary = ", ".join(f"{route} {delta / 1048576:+.1f} MiB" for route, delta in top_routes)
+        message = (
+            f"Memory: RSS {rss / 1048576:.1f} MiB ({growth / 1048576:+.1f} MiB since last sample)"
+        )
+        if summary:
+            message += f"; by endpoint: {summary}"
+        if growth > GROWTH_WARNING_BYTES:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        return {"rss_bytes": rss, "growth_bytes": growth, "by_endpoint": dict(top_routes)}
+
+
+memory_sampler = MemorySampler(
+    interval_seconds=float(os.getenv("MEMORY_SAMPLE_INTERVAL_SECONDS", "300"))
+)
@@ -0,0 +1,232 @@
+"""
+Prometheus metrics for the API, models, database and background work.
+
+Metrics are defined once here and updated from the code paths they
+describe. When the server runs with several workers, set
+PROMETHEUS_MULTIPROC_DIR to an empty directory shared by all of them
+(before the app is imported) and /metrics will aggregate every worker.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+
+MULTIPROCESS_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# HTTP
+HTTP_REQUESTS = Counter(
+    "secondopinion_http_requests_total",
+    "HTTP requests handled, by route template and status code",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "secondopinion_http_request_duration_seconds",
+    "HTTP request latency, by route template",
+    ["method", "route"],
+)
+
+# Pipeline stages (see app/core/timing.py)
+STAGE_DURATION = Histogram(
+    "secondopinion_stage_duration_seconds",
+    "Time spent in each prediction pipeline stage",
+    ["stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Models
+MODEL_LOAD_DURATION = Histogram(
+    "secondopinion_model_load_seconds",
+    "Time taken to build a model and load its weights",
+    ["model"],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+MODEL_RESIDENT_BYTES = Gauge(
+    "secondopinion_model_resident_bytes",
+    "Parameter and buffer bytes held by a loaded model",
+    ["model"],
+    multiprocess_mode="liveall",
+)
+INFERENCE_BATCH_SIZE = Histogram(
+    "secondopinion_inference_batch_size",
+    "Number of images per model forward pass",
+    ["model"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+# Database
+DB_POOL_CHECKOUTS = Counter(
+    "secondopinion_db_pool_checkouts_total",
+    "Connections checked out of the SQLAlchemy pool",
+)
+DB_QUERIES = Counter(
+    "secondopinion_db_queries_total",
+    "SQL statements executed, by statement type",
+    ["operation"],
+)
+
+DB_REQUEST_QUERIES = Histogram(
+    "secondopinion_db_queries_per_request",
+    "SQL statements executed per request, by route template",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+DB_REQUEST_TIME = Histogram(
+    "secondopinion_db_time_per_request_seconds",
+    "Time spent executing SQL per request, by route template",
+    ["method", "route"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+DB_READS = Counter(
+    "secondopinion_db_routed_reads_total",
+    "Read-only queries routed to the replica or the primary, with the reason for the primary",
+    ["target", "reason"],
+)
+
+# Background work
+OTP_CLEANUP_DURATION = Histogram(
+    "secondopinion_otp_cleanup_duration_seconds",
+    "Duration of OTP cleanup runs",
+    ["trigger"],
+)
+OTP_CLEANUP_REMOVED = Counter(
+    "secondopinion_otp_cleanup_removed_total",
+    "OTP codes removed by cleanup runs",
+    ["trigger"],
+)
+ARCHIVE_RUN_DURATION = Histogram(
+    "secondopinion_archive_run_duration_seconds",
+    "Duration of runs moving predictions to the archive table",
+    ["trigger"],
+)
+ARCHIVE_MOVED = Counter(
+    "secondopinion_archive_moved_total",
+    "Predictions moved from prediction_results to the archive table",
+    ["trigger"],
+)
+EMAIL_SEND_DURATION = Histogram(
+    "secondopinion_email_send_duration_seconds",
+    "Time spent talking to the SMTP server, by email kind",
+    ["kind"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+EMAIL_SEND_FAILURES = Counter(
+    "secondopinion_email_send_failures_total",
+    "Emails that could not be sent, by email kind",
+    ["kind"],
+)
+
+_SQL_OPERATIONS = {"select", "insert", "update", "delete", "begin", "commit", "rollback"}
+
+
+def render_metrics() -> bytes:
+    """Render all metrics in the Prometheus text exposition format"""
+    if MULTIPROCESS_DIR:
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_worker_dead() -> None:
+    """Drop this worker's live gauges when it shuts down (multi-worker mode)"""
+    if MULTIPROCESS_DIR:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def model_resident_bytes(model) -> int:
+    """Bytes held by a model's parameters and buffers"""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def observe_model_load(model_name: str, model, seconds: float) -> None:
+    MODEL_LOAD_DURATION.labels(model_name).observe(seconds)
+    MODEL_RESIDENT_BYTES.labels(model_name).set(model_resident_bytes(model))
+
+
+def observe_inference_batch(model_name: str, batch_size: int) -> None:
+    INFERENCE_BATCH_SIZE.labels(model_name).observe(batch_size)
+
+
+@contextmanager
+def track_email_send(kind: str):
+    """Time an SMTP exchange; failures are counted by the caller's except block"""
+    from app.core.tracing import span
+
+    started = time.perf_counter()
+    try:
+        with span("smtp.send", **{"email.kind": kind}):
+            yield
+    finally:
+        EMAIL_SEND_DURATION.labels(kind).observe(time.perf_counter() - started)
+
+
+def record_email_failure(kind: str) -> None:
+    EMAIL_SEND_FAILURES.labels(kind).inc()
+
+
+def instrument_engine(engine) -> None:
+    """Count pool checkouts and executed statements on a SQLAlchemy engine"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.inc()
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].lower() if statement else ""
+        DB_QUERIES.labels(operation if operation in _SQL_OPERATIONS else "other").inc()
+
+
+class PrometheusMiddleware:
+    """ASGI middleware recording request counts and latency per route.
+
+    Requests are labelled with the route template (``/history/patients/{patient_id}``)
+    rather than the raw path so that label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None)
+            if route_path is None:
+                route_path = "/uploads" if scope["path"].startswith("/uploads/") else "<unmatched>"
+            method = scope["method"]
+            HTTP_REQUESTS.labels(method, route_path, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(
+                time.perf_counter() - started
+            )
+
@@ -5,9 +5,11 @@ Scheduled OTP cleanup service with automatic background execution
 import asyncio
 from datetime import datetime, timedelta
 import logging
+import time
 from typing import Optional
 
 from sqlalchemy.orm import Session
+from app.core.metrics import OTP_CLEANUP_DURATION, OTP_CLEANUP_REMOVED
 from app.db.session import SessionLocal
 from app.services.otp_service import OTPService
 
@@ -69,6 +71,7 @@ class OTPCleanupScheduler:
 
     async def _perform_cleanup(self):
         """Perform the actual cleanup operation"""
+        started = time.perf_counter()
         db: Session = SessionLocal()
         try:
             otp_service = OTPService(db)
@@ -80,6 +83,7 @@ class OTPCleanupScheduler:
             old_otps_count = self._cleanup_old_used_otps(db)
 
             total_cleaned = expired_count + old_otps_count
+            OTP_CLEANUP_REMOVED.labels("scheduled").inc(total_cleaned)
 
             if total_cleaned > 0:
                 logger.info(
@@ -92,6 +96,9 @@ class OTPCleanupScheduler:
             logger.error(f"Error during OTP cleanup: {e}")
         finally:
             db.close()
+            OTP_CLEANUP_DURATION.labels("scheduled").observe(
+                time.perf_counter() - started
+            )
 
     def _cleanup_old_used_otps(self, db: Session) -> int:
         """Clean up old OTP codes (older than 7 days)"""
@@ -111,6 +118,7 @@ class OTPCleanupScheduler:
 
     async def manual_cleanup(self) -> dict:
         """Manually trigger cleanup and return results"""
+        started = time.perf_counter()
         db: Session = SessionLocal()
         try:
             otp_service = OTPService(db)
@@ -124,6 +132,7 @@ class OTPCleanupScheduler:
                 "total_cleaned": expired_count + old_otps_count,
                 "timestamp": datetime.utcnow().isoformat(),
             }
+            OTP_CLEANUP_REMOVED.labels("manual").inc(result["total_cleaned"])
 
             logger.info(f"Manual cleanup completed: {result}")
             return result
@@ -133,6 +142,7 @@ class OTPCleanupScheduler:
             raise
         finally:
             db.close()
+            OTP_CLEANUP_DURATION.labels("manual").observe(time.perf_counter() - started)
 
 
 # Global instance
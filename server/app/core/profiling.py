@@ -0,0 +1,246 @@
+"""
+Opt-in profiling of individual requests.
+
+A request is profiled when it carries ``X-Profile-Request: 1`` together with
+a valid ``X-Admin-Key``, or when it is picked by 1-in-N sampling
+(PROFILE_SAMPLE_RATE). Two profiles are captured for the whole request,
+including the handler, model forward passes, database work and PDF/email
+generation:
+
+- a wall-clock stack sampler over every thread, written as collapsed stacks
+  (``.collapsed``) that flamegraph.pl, inferno or speedscope read directly.
+  Sync handlers and dependencies run in the threadpool, so this is the view
+  that covers them;
+- cProfile on the event-loop thread (``.pstats``), with exact call counts for
+  async handlers such as the upload endpoints.
+
+Only one request per worker is profiled at a time; concurrent requests still
+appear in the samples, so reproduce under low load where possible. Files go
+to PROFILE_DIR (default ``profiles``) and the oldest are removed past
+PROFILE_MAX_FILES profiles.
+"""
+
+import asyncio
+import cProfile
+import itertools
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional
+from uuid import uuid4
+
+from app.core.security import is_admin_key
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = int(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILE_HEADER = b"x-profile-request"
+ADMIN_KEY_HEADER = b"x-admin-key"
+PROFILE_KINDS = {"pstats": ".pstats", "collapsed": ".collapsed"}
+
+# Leaf frames of threads that are parked rather than working
+_IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+_PROFILE_ID = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+class StackSampler:
+    """Samples the Python stacks of all threads on a background thread"""
+
+    def __init__(self, interval_ms: float = PROFILE_SAMPLE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = self._collapse(frame)
+                if stack is not None:
+                    self.stacks[f"{names.get(thread_id, thread_id)};{stack}"] += 1
+            self.samples += 1
+
+    @staticmethod
+    def _collapse(frame) -> Optional[str]:
+        leaf = frame.f_code
+        if (os.path.basename(leaf.co_filename), leaf.co_name) in _IDLE_FRAMES:
+            return None
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfile:
+    """Both profilers for one request"""
+
+    def __init__(self, trigger: str):
+        self.profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}_{uuid4().hex[:8]}"
+        self.trigger = trigger
+        self.sampler = StackSampler()
+        self.profiler = cProfile.Profile()
+        self.started = 0.0
+        self.duration_ms = 0.0
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self) -> None:
+        self.profiler.disable()
+        self.sampler.stop()
+        self.duration_ms = (time.perf_counter() - self.started) * 1000
+
+    def save(self, directory: str, metadata: dict) -> dict:
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, self.profile_id)
+        self.profiler.dump_stats(base + PROFILE_KINDS["pstats"])
+        with open(base + PROFILE_KINDS["collapsed"], "w", encoding="utf-8") as f:
+            f.write(self.sampler.collapsed())
+
+        metadata = {
+            "id": self.profile_id,
+            "trigger": self.trigger,
+            "duration_ms": round(self.duration_ms, 3),
+            "samples": self.sampler.samples,
+            "created_at": datetime.utcnow().isoformat(),
+            **metadata,
+        }
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        _prune(directory)
+        return metadata
+
+
+def _prune(directory: str) -> None:
+    """Keep only the newest PROFILE_MAX_FILES profiles"""
+    profile_ids = sorted(
+        name[: -len(".json")] for name in os.listdir(directory) if name.endswith(".json")
+    )
+    for profile_id in profile_ids[: max(0, len(profile_ids) - PROFILE_MAX_FILES)]:
+        for suffix in (".json", *PROFILE_KINDS.values()):
+            try:
+                os.remove(os.path.join(directory, profile_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles(directory: str = PROFILE_DIR) -> List[dict]:
+    """Metadata of stored profiles, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id: str, kind: str, directory: str = PROFILE_DIR) -> Optional[str]:
+    """File for a stored profile, or None if the id or kind is unknown"""
+    if kind not in PROFILE_KINDS or not _PROFILE_ID.match(profile_id):
+        return None
+    path = os.path.join(directory, profile_id + PROFILE_KINDS[kind])
+    return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests asked for by an admin or sampled 1-in-N"""
+
+    def __init__(self, app, sample_rate: int = PROFILE_SAMPLE_RATE, directory: str = PROFILE_DIR):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self._counter = itertools.count(1)
+        # cProfile allows one active profiler per thread
+        self._busy = threading.Lock()
+
+    def _trigger(self, scope) -> Optional[str]:
+        headers = dict(scope.get("headers") or [])
+        if headers.get(PROFILE_HEADER) in (b"1", b"true"):
+            admin_key = headers.get(ADMIN_KEY_HEADER, b"").decode("latin-1")
+            if is_admin_key(admin_key):
+                return "header"
+            logger.warning("Ignoring profiling request without a valid admin key")
+        if self.sample_rate > 0 and next(self._counter) % self.sample_rate == 0:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trigger = self._trigger(scope)
+        if trigger is None or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(trigger)
+        status_code = 500
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            profile.start()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profile.stop()
+        finally:
+            self._busy.release()
+
+        route = getattr(scope.get("route"), "path", None) or scope["path"]
+        metadata = {"method": scope["method"], "path": scope["path"], "route": route, "status": status_code}
+        try:
+            await asyncio.to_thread(profile.save, self.directory, metadata)
+        except Exception as e:
+            logger.error(f"Failed to save request profile {profile.profile_id}: {e}")
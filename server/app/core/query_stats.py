@@ -0,0 +1,238 @@
+"""
+Per-request database accounting.
+
+SQLAlchemy cursor events count every statement a request executes and how
+long it spent in the database. Statements slower than SLOW_QUERY_MS are
+logged, and the same SQL text executed REPEATED_STATEMENT_THRESHOLD or more
+times in one request is flagged as a possible N+1 pattern.
+
+Endpoints declare how many statements they are expected to need with
+``@query_budget(n)``. With QUERY_BUDGET_MODE=raise (for tests) a request
+over budget raises QueryBudgetExceeded; the default ``warn`` only logs it and
+``off`` skips the check. Per-route aggregates are served by /admin/queries.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.metrics import DB_REQUEST_QUERIES, DB_REQUEST_TIME
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+REPEATED_STATEMENT_THRESHOLD = int(os.getenv("REPEATED_STATEMENT_THRESHOLD", "3"))
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "warn").lower()
+
+_STATEMENT_PREVIEW = 300
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request executed more statements than its endpoint's declared budget"""
+
+
+class QueryStats:
+    """Statements executed within one request (or one ``track_queries`` block)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements: Counter = Counter()
+        self.slow: list = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration_ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += duration_ms
+            self.statements[statement] += 1
+            if duration_ms >= SLOW_QUERY_MS:
+                self.slow.append((round(duration_ms, 3), statement[:_STATEMENT_PREVIEW]))
+
+    def repeated(self, threshold: int = REPEATED_STATEMENT_THRESHOLD) -> Dict[str, int]:
+        """Identical statements run ``threshold`` or more times"""
+        with self._lock:
+            return {
+                statement: count
+                for statement, count in self.statements.items()
+                if count >= threshold
+            }
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar(
+    "current_query_stats", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    started_stack = conn.info.get("query_started")
+    if not started_stack:
+        return
+    duration_ms = (time.perf_counter() - started_stack.pop()) * 1000
+    stats.record(statement, duration_ms)
+    if duration_ms >= SLOW_QUERY_MS:
+        logger.warning(f"Slow query ({duration_ms:.1f} ms): {statement[:_STATEMENT_PREVIEW]}")
+
+
+@contextmanager
+def track_queries():
+    """Count the statements executed inside the block (for tests and scripts)"""
+    stats = QueryStats()
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+
+@contextmanager
+def untracked_queries():
+    """Leave the statements inside the block out of the request's count.
+
+    For periodic housekeeping that happens to run inside some request,
+    such as the replica health check.
+    """
+    token = _current_stats.set(None)
+    try:
+        yield
+    finally:
+        _current_stats.reset(token)
+
+
+def query_budget(max_queries: int):
+    """Declare the most statements an endpoint should execute per request.
+
+    Place it below the router decorator so the budget is set before the
+    route is registered::
+
+        @router.get("/predictions/history")
+        @query_budget(3)
+        def get_prediction_history(...):
+    """
+
+    def decorate(func):
+        func.query_budget = max_queries
+        return func
+
+    return decorate
+
+
+# Per-route aggregates for /admin/queries
+
+_route_stats: Dict[str, dict] = {}
+_route_lock = threading.Lock()
+
+
+def _record_route(route: str, stats: QueryStats, repeated: Dict[str, int], over_budget: bool) -> None:
+    with _route_lock:
+        entry = _route_stats.get(route)
+        if entry is None:
+            entry = _route_stats[route] = {
+                "requests": 0,
+                "queries": 0,
+                "max_queries": 0,
+                "db_ms": 0.0,
+                "n_plus_one_requests": 0,
+                "over_budget_requests": 0,
+                "slow_statements": deque(maxlen=10),
+                "repeated_statements": deque(maxlen=10),
+            }
+        entry["requests"] += 1
+        entry["queries"] += stats.count
+        entry["max_queries"] = max(entry["max_queries"], stats.count)
+        entry["db_ms"] += stats.total_ms
+        if repeated:
+            entry["n_plus_one_requests"] += 1
+            for statement, count in repeated.items():
+                entry["repeated_statements"].append(
+                    {"count": count, "statement": statement[:_STATEMENT_PREVIEW]}
+                )
+        if over_budget:
+            entry["over_budget_requests"] += 1
+        for duration_ms, statement in stats.slow:
+            entry["slow_statements"].append({"ms": duration_ms, "statement": statement})
+
+
+def get_query_statistics() -> Dict[str, dict]:
+    """Per-route query counts and DB time recorded in this process"""
+    with _route_lock:
+        snapshot = {}
+        for route, entry in sorted(_route_stats.items()):
+            requests = entry["requests"]
+            snapshot[route] = {
+                "requests": requests,
+                "mean_queries": round(entry["queries"] / requests, 2) if requests else 0.0,
+                "max_queries": entry["max_queries"],
+                "mean_db_ms": round(entry["db_ms"] / requests, 3) if requests else 0.0,
+                "n_plus_one_requests": entry["n_plus_one_requests"],
+                "over_budget_requests": entry["over_budget_requests"],
+                "slow_statements": list(entry["slow_statements"]),
+                "repeated_statements": list(entry["repeated_statements"]),
+            }
+    return snapshot
+
+
+def reset_query_statistics() -> None:
+    with _route_lock:
+        _route_stats.clear()
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware collecting each request's statements and checking its budget"""
+
+    def __init__(self, app, budget_mode: str = QUERY_BUDGET_MODE):
+        self.app = app
+        self.budget_mode = budget_mode
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_stats.reset(token)
+
+        route = scope.get("route")
+        route_path = getattr(route, "path", None) or "<unmatched>"
+        label = f"{scope['method']} {route_path}"
+        DB_REQUEST_QUERIES.labels(scope["method"], route_path).observe(stats.count)
+        DB_REQUEST_TIME.labels(scope["method"], route_path).observe(stats.total_ms / 1000)
+
+        repeated = stats.repeated()
+        for statement, count in repeated.items():
+            logger.warning(
+                f"Possible N+1 in {label}: same statement ran {count} times: "
+                f"{statement[:_STATEMENT_PREVIEW]}"
+            )
+
+        budget = getattr(getattr(route, "endpoint", None), "query_budget", None)
+        over_budget = budget is not None and stats.count > budget
+        _record_route(label, stats, repeated, over_budget)
+
+        if over_budget and self.budget_mode != "off":
+            message = f"{label} executed {stats.count} statements, budget is {budget}"
+            if self.budget_mode == "raise":
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
@@ -1,9 +1,10 @@
+import hmac
 from datetime import datetime, timedelta
 from typing import Optional
 
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import HTTPException, status
+from fastapi import Header, HTTPException, status
 
 from app.core.config import settings
 
@@ -55,3 +56,19 @@ def verify_token(token: str):
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+def is_admin_key(key: Optional[str]) -> bool:
+    """Check an admin API key; always False when no key is configured."""
+    if not settings.ADMIN_API_KEY or not key:
+        return False
+    return hmac.compare_digest(key.encode(), settings.ADMIN_API_KEY.encode())
+
+
+def require_admin(x_admin_key: Optional[str] = Header(None)):
+    """Dependency for admin endpoints that expose request internals."""
+    if not is_admin_key(x_admin_key):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin key required",
+        )
@@ -0,0 +1,189 @@
+"""
+Lightweight per-stage timing for the prediction pipeline.
+
+Handlers wrap each step in ``timed_stage("name")``. Every duration is added
+to an in-process histogram and recorded as a tracing span, and when the code
+runs inside an HTTP request the stages are also reported to the client in a
+``Server-Timing`` header.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from app.core.metrics import STAGE_DURATION
+from app.core.tracing import tracer
+
+# Upper bounds in milliseconds; anything slower lands in the overflow bucket
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Fixed-bucket histogram that is cheap to update from any thread"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.bucket_counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by interpolating inside the matching bucket"""
+        with self._lock:
+            counts = list(self.bucket_counts)
+            count = self.count
+            maximum = self.max
+        if count == 0:
+            return 0.0
+
+        target = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= target:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                fraction = (target - cumulative) / bucket_count
+                return min(lower + (upper - lower) * fraction, maximum)
+            cumulative += bucket_count
+        return maximum
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.bucket_counts)
+            count = self.count
+            total = self.total
+            maximum = self.max
+
+        cumulative = 0
+        buckets = {}
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+
+        return {
+            "count": count,
+            "sum_ms": round(total, 3),
+            "mean_ms": round(total / count, 3) if count else 0.0,
+            "max_ms": round(maximum, 3),
+            "p50_ms": round(self.quantile(0.50), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "p99_ms": round(self.quantile(0.99), 3),
+            "buckets": buckets,
+        }
+
+
+class RequestTimings:
+    """Stage durations collected while serving a single request"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, duration_ms: float) -> None:
+        # Repeated stages (e.g. two commits) are summed under one entry
+        self.stages[name] = self.stages.get(name, 0.0) + duration_ms
+
+    def header_value(self) -> str:
+        return ", ".join(
+            f"{name};dur={duration:.2f}" for name, duration in self.stages.items()
+        )
+
+
+_stage_histograms: Dict[str, Histogram] = {}
+_registry_lock = threading.Lock()
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "current_timings", default=None
+)
+
+
+def _get_histogram(name: str) -> Histogram:
+    histogram = _stage_histograms.get(name)
+    if histogram is None:
+        with _registry_lock:
+            histogram = _stage_histograms.setdefault(name, Histogram())
+    return histogram
+
+
+def record_stage(name: str, duration_ms: float) -> None:
+    """Record a stage duration measured elsewhere"""
+    _get_histogram(name).observe(duration_ms)
+    STAGE_DURATION.labels(name).observe(duration_ms / 1000)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(name, duration_ms)
+
+
+@contextmanager
+def timed_stage(name: str):
+    """Time the enclosed block as pipeline stage ``name``.
+
+    Stage names end up in the Server-Timing header, so they must be plain
+    tokens (letters, digits, ``_`` and ``-``). Each stage is also a tracing
+    span of the same name.
+    """
+    with tracer.start_as_current_span(name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record_stage(name, (time.perf_counter() - started) * 1000)
+
+
+def get_stage_statistics() -> Dict[str, dict]:
+    """Snapshot of every stage histogram recorded in this process"""
+    with _registry_lock:
+        histograms = dict(_stage_histograms)
+    return {name: histogram.snapshot() for name, histogram in sorted(histograms.items())}
+
+
+def reset_stage_statistics() -> None:
+    with _registry_lock:
+        _stage_histograms.clear()
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that reports the request's stages in Server-Timing.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware to keep per-request
+    overhead down to a context variable and one header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        started = time.perf_counter()
+
+        async def send_with_server_timing(message):
+            if message["type"] == "http.response.start":
+                timings.add("total", (time.perf_counter() - started) * 1000)
+                headers = list(message.get("headers", []))
+                headers.append(
+                    (b"server-timing", timings.header_value().encode("latin-1"))
+                )
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_server_timing)
+        finally:
+            _current_timings.reset(token)
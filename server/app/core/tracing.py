@@ -0,0 +1,270 @@
+"""
+OpenTelemetry tracing for requests, the prediction pipeline, PDFs and email.
+
+Tracing is off unless TRACING_EXPORTER is set; until then every span below
+is the API's no-op span. Exporters:
+
+- ``console``: spans printed to stdout as JSON;
+- ``file``: one JSON span per line in TRACING_FILE (default traces/spans.jsonl);
+- ``otlp``: OTLP/HTTP to OTEL_EXPORTER_OTLP_ENDPOINT, when the
+  opentelemetry-exporter-otlp-proto-http package is installed.
+
+Incoming W3C ``traceparent`` headers are honoured. Background tasks run in
+a copy of the request's context, so their spans (and any SQL or SMTP work
+they do) join the request's trace; the request span itself ends when the
+response has been sent.
+"""
+
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+logger = logging.getLogger(__name__)
+
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", os.path.join("traces", "spans.jsonl"))
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "secondopinion-api")
+
+tracer = trace.get_tracer("secondopinion")
+
+_STATEMENT_PREVIEW = 1000
+
+
+def _build_exporter(kind: str):
+    if kind == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        return ConsoleSpanExporter(service_name=SERVICE_NAME)
+    if kind == "file":
+        return FileSpanExporter(TRACING_FILE)
+    if kind == "otlp":
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning(
+                "TRACING_EXPORTER=otlp needs opentelemetry-exporter-otlp-proto-http; "
+                "tracing stays off"
+            )
+            return None
+        return OTLPSpanExporter()
+    logger.warning(f"Unknown TRACING_EXPORTER '{kind}'; tracing stays off")
+    return None
+
+
+def configure_tracing(exporter: Optional[str] = None) -> bool:
+    """Install a tracer provider with the configured exporter; False if tracing is off"""
+    kind = (exporter if exporter is not None else TRACING_EXPORTER).lower()
+    if not kind:
+        return False
+
+    span_exporter = _build_exporter(kind)
+    if span_exporter is None:
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(provider)
+    _instrument_sqlalchemy()
+    logger.info(f"Tracing enabled with the {kind} exporter")
+    return True
+
+
+def shutdown_tracing() -> None:
+    """Flush spans still waiting in the batch processor"""
+    provider = trace.get_tracer_provider()
+    if hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+class FileSpanExporter:
+    """Appends finished spans to a file as JSON lines"""
+
+    def __init__(self, path: str):
+        from opentelemetry.sdk.trace.export import SpanExportResult
+
+        self._success = SpanExportResult.SUCCESS
+        self._failure = SpanExportResult.FAILURE
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans):
+        try:
+            lines = "".join(json.dumps(json.loads(span.to_json())) + "\n" for span in spans)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            return self._success
+        except Exception as e:
+            logger.error(f"Failed to write spans to {self.path}: {e}")
+            return self._failure
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Run the block inside a span; exceptions are recorded on it"""
+    with tracer.start_as_current_span(name, attributes=attributes or None) as current:
+        yield current
+
+
+def traced(name: Optional[str] = None, **attributes):
+    """Decorator wrapping every call of a sync or async function in a span.
+
+    The span is named after the function's qualified name unless ``name``
+    is given. functools.wraps keeps the signature visible to FastAPI.
+    """
+
+    def decorate(func):
+        span_name = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.start_as_current_span(span_name, attributes=attributes or None):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name, attributes=attributes or None):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _instrument_sqlalchemy() -> None:
+    """One client span per SQL statement, child of whatever span is current"""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if getattr(_instrument_sqlalchemy, "installed", False):
+        return
+    _instrument_sqlalchemy.installed = True
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else "SQL"
+        query_span = tracer.start_span(
+            f"db {operation}",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "db.system": conn.engine.dialect.name,
+                "db.statement": statement[:_STATEMENT_PREVIEW],
+            },
+        )
+        conn.info.setdefault("trace_spans", []).append(query_span)
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def _end_query_span(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("trace_spans")
+        if spans:
+            spans.pop().end()
+
+    @event.listens_for(Engine, "handle_error")
+    def _fail_query_span(exception_context):
+        connection = exception_context.connection
+        spans = connection.info.get("trace_spans") if connection is not None else None
+        if spans:
+            failed = spans.pop()
+            failed.record_exception(exception_context.original_exception)
+            failed.set_status(Status(StatusCode.ERROR))
+            failed.end()
+
+
+class TracingMiddleware:
+    """ASGI middleware opening a server span per request.
+
+    The span covers the request until the last body chunk is sent; work
+    the app still does afterwards (background tasks) is traced as its
+    children.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        carrier = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope.get("headers") or []
+        }
+        parent = propagate.extract(carrier)
+        request_span = tracer.start_span(
+            f"{scope['method']} {scope['path']}",
+            context=parent,
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+            },
+        )
+        ended = False
+
+        def finish(status_code: Optional[int] = None):
+            nonlocal ended
+            if ended:
+                return
+            ended = True
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                request_span.update_name(f"{scope['method']} {route}")
+                request_span.set_attribute("http.route", route)
+            if status_code is not None:
+                request_span.set_attribute("http.response.status_code", status_code)
+                if status_code >= 500:
+                    request_span.set_status(Status(StatusCode.ERROR))
+            request_span.end()
+
+        status_code = None
+
+        async def send_and_finish(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if request_span.is_recording():
+                    trace_id = format(request_span.get_span_context().trace_id, "032x")
+                    message = {
+                        **message,
+                        "headers": list(message.get("headers", [])) + [(b"x-trace-id", trace_id.encode())],
+                    }
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish(status_code)
+
+        token = otel_context.attach(trace.set_span_in_context(request_span, parent))
+        try:
+            await self.app(scope, receive, send_and_finish)
+        except Exception as e:
+            if not ended:
+                request_span.record_exception(e)
+                request_span.set_status(Status(StatusCode.ERROR))
+            raise
+        finally:
+            finish(status_code)
+            otel_context.detach(token)
@@ -0,0 +1,186 @@
+"""
+Per-class probability rows for analytic queries.
+
+``prediction_results.probabilities`` is a JSON dict, which SQL can't
+aggregate or filter on without unpacking every row. ``prediction_probabilities``
+holds the same numbers one row per (prediction, class), indexed by user,
+model type, class and date. Like the search index it is kept in sync by
+database triggers, so every write path fills it in the same transaction:
+
+- inserting a prediction, or changing its probabilities, user, model
+  type or date, (re)writes its rows, ranked by probability;
+- moving a prediction to the archive keeps them, and they are only
+  removed once the id is in neither prediction table.
+
+The JSON is unpacked with ``json_each`` on SQLite and ``json_each_text``
+on PostgreSQL; other databases get the table but not the triggers. Only
+JSON objects are unpacked: a prediction saved without probabilities
+(stored as JSON 'null') simply has no rows.
+"""
+
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from app.db.models import ArchivedPredictionResult, PredictionProbability
+
+logger = logging.getLogger(__name__)
+
+PROBABILITY_TABLE = PredictionProbability.__tablename__
+ARCHIVE_TABLE = ArchivedPredictionResult.__tablename__
+_COLUMNS = "prediction_id, class_name, probability, rank, user_id, model_type, created_at"
+_SOURCE_COLUMNS = "probabilities, user_id, model_type, created_at"
+
+_SQLITE_ROWS = f"""
+    INSERT INTO {PROBABILITY_TABLE} ({_COLUMNS})
+    SELECT new.id, j.key, j.value,
+        row_number() OVER (ORDER BY j.value DESC, j.key),
+        new.user_id, new.model_type, new.created_at
+    FROM json_each(new.probabilities) j
+    WHERE json_type(new.probabilities) = 'object';
+"""
+
+_SQLITE_TRIGGERS = [
+    # Dropped first so databases with an older trigger body pick up the new one
+    f"DROP TRIGGER IF EXISTS {PROBABILITY_TABLE}_insert",
+    f"""
+    CREATE TRIGGER {PROBABILITY_TABLE}_insert
+    AFTER INSERT ON prediction_results BEGIN
+        {_SQLITE_ROWS}
+    END
+    """,
+    *(
+        statement
+        for name, table in (("hot", "prediction_results"), ("archive", ARCHIVE_TABLE))
+        for statement in (
+            f"DROP TRIGGER IF EXISTS {PROBABILITY_TABLE}_{name}_update",
+            f"""
+            CREATE TRIGGER {PROBABILITY_TABLE}_{name}_update
+            AFTER UPDATE OF {_SOURCE_COLUMNS} ON {table} BEGIN
+                DELETE FROM {PROBABILITY_TABLE} WHERE prediction_id = old.id;
+                {_SQLITE_ROWS}
+            END
+            """,
+        )
+    ),
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {PROBABILITY_TABLE}_hot_delete
+    AFTER DELETE ON prediction_results
+    WHEN NOT EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} WHERE id = old.id) BEGIN
+        DELETE FROM {PROBABILITY_TABLE} WHERE prediction_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {PROBABILITY_TABLE}_archive_delete
+    AFTER DELETE ON {ARCHIVE_TABLE}
+    WHEN NOT EXISTS (SELECT 1 FROM prediction_results WHERE id = old.id) BEGIN
+        DELETE FROM {PROBABILITY_TABLE} WHERE prediction_id = old.id;
+    END
+    """,
+]
+
+_SQLITE_BACKFILL = [
+    f"""
+    INSERT INTO {PROBABILITY_TABLE} ({_COLUMNS})
+    SELECT r.id, j.key, j.value,
+        row_number() OVER (PARTITION BY r.id ORDER BY j.value DESC, j.key),
+        r.user_id, r.model_type, r.created_at
+    FROM {table} r, json_each(r.probabilities) j
+    WHERE json_type(r.probabilities) = 'object'
+    """
+    for table in ("prediction_results", ARCHIVE_TABLE)
+]
+
+_POSTGRES_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION {PROBABILITY_TABLE}_refresh() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM {PROBABILITY_TABLE} WHERE prediction_id = NEW.id;
+        -- json_each_text raises on anything but an object
+        IF json_typeof(NEW.probabilities) = 'object' THEN
+            INSERT INTO {PROBABILITY_TABLE} ({_COLUMNS})
+            SELECT NEW.id, j.key, j.value::float,
+                row_number() OVER (ORDER BY j.value::float DESC, j.key),
+                NEW.user_id, NEW.model_type, NEW.created_at
+            FROM json_each_text(NEW.probabilities) j;
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION {PROBABILITY_TABLE}_remove() RETURNS trigger AS $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM prediction_results WHERE id = OLD.id)
+            AND NOT EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} WHERE id = OLD.id) THEN
+            DELETE FROM {PROBABILITY_TABLE} WHERE prediction_id = OLD.id;
+        END IF;
+        RETURN OLD;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"DROP TRIGGER IF EXISTS {PROBABILITY_TABLE}_refresh ON prediction_results",
+    f"""
+    CREATE TRIGGER {PROBABILITY_TABLE}_refresh
+    AFTER INSERT OR UPDATE OF {_SOURCE_COLUMNS} ON prediction_results
+    FOR EACH ROW EXECUTE FUNCTION {PROBABILITY_TABLE}_refresh()
+    """,
+    # Moving a row in keeps its rows, so only updates rewrite them
+    f"DROP TRIGGER IF EXISTS {PROBABILITY_TABLE}_refresh ON {ARCHIVE_TABLE}",
+    f"""
+    CREATE TRIGGER {PROBABILITY_TABLE}_refresh
+    AFTER UPDATE OF {_SOURCE_COLUMNS} ON {ARCHIVE_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {PROBABILITY_TABLE}_refresh()
+    """,
+    *(
+        statement
+        for table in ("prediction_results", ARCHIVE_TABLE)
+        for statement in (
+            f"DROP TRIGGER IF EXISTS {PROBABILITY_TABLE}_remove ON {table}",
+            f"""
+            CREATE TRIGGER {PROBABILITY_TABLE}_remove
+            AFTER DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {PROBABILITY_TABLE}_remove()
+            """,
+        )
+    ),
+]
+
+_POSTGRES_BACKFILL = [
+    f"""
+    INSERT INTO {PROBABILITY_TABLE} ({_COLUMNS})
+    SELECT r.id, j.key, j.value::float,
+        row_number() OVER (PARTITION BY r.id ORDER BY j.value::float DESC, j.key),
+        r.user_id, r.model_type, r.created_at
+    FROM {table} r, json_each_text(r.probabilities) j
+    WHERE json_typeof(r.probabilities) = 'object'
+    """
+    for table in ("prediction_results", ARCHIVE_TABLE)
+]
+
+
+def install_probability_triggers(engine: Engine, backfill: bool = False) -> None:
+    """Install the triggers filling prediction_probabilities.
+
+    Runs after ``create_all`` on every start. ``backfill`` fills the table
+    from the rows already in both prediction tables, for databases from
+    before it existed.
+    """
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        triggers, rows = _SQLITE_TRIGGERS, _SQLITE_BACKFILL
+    elif dialect == "postgresql":
+        triggers, rows = _POSTGRES_TRIGGERS, _POSTGRES_BACKFILL
+    else:
+        logger.info(f"No probability triggers for {dialect}; probability analytics stay empty")
+        return
+
+    with engine.begin() as connection:
+        for statement in triggers:
+            connection.execute(text(statement))
+        if backfill:
+            for statement in rows:
+                connection.execute(text(statement))
+    if backfill:
+        logger.info(f"Filled {PROBABILITY_TABLE} from existing predictions")
@@ -0,0 +1,96 @@
+"""
+Cold storage for old and archived predictions.
+
+``archived_prediction_results`` has the same columns and ids as
+``prediction_results``; ArchiveService moves rows across in batches. On
+SQLite (and other databases) it is a plain table created with the ORM
+metadata. On PostgreSQL it is created here instead, before
+``create_all``, as a table partitioned by month of ``created_at``:
+
+- the primary key is ``(id, created_at)``, since a partitioned table's
+  keys have to include the partition column; ids stay unique because
+  they come from ``prediction_results``;
+- ``ensure_archive_partitions`` adds a partition per month before rows
+  of that month are moved in, and a DEFAULT partition catches anything
+  else, so old months can later be detached or dropped as a whole.
+"""
+
+import logging
+from datetime import date, datetime
+from typing import Iterable
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.db.models import ArchivedPredictionResult
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = ArchivedPredictionResult.__tablename__
+
+_POSTGRES_SCHEMA = [
+    f"""
+    CREATE TABLE {ARCHIVE_TABLE} (
+        id integer NOT NULL,
+        user_id integer NOT NULL REFERENCES users (id),
+        patient_id integer NOT NULL REFERENCES patients (id),
+        image_filename varchar NOT NULL,
+        image_path varchar,
+        model_type varchar NOT NULL,
+        prediction varchar NOT NULL,
+        confidence float NOT NULL,
+        entropy float,
+        message text,
+        probabilities json,
+        notes text,
+        status varchar NOT NULL,
+        created_at timestamp NOT NULL,
+        updated_at timestamp NOT NULL,
+        archived_at timestamp NOT NULL,
+        PRIMARY KEY (id, created_at)
+    ) PARTITION BY RANGE (created_at)
+    """,
+    f"CREATE TABLE {ARCHIVE_TABLE}_default PARTITION OF {ARCHIVE_TABLE} DEFAULT",
+]
+
+
+def install_archive(engine: Engine) -> bool:
+    """Create the partitioned archive table on PostgreSQL, if missing.
+
+    Runs before ``create_all``, which then leaves the table alone. Returns
+    True when the table was created by this call.
+    """
+    if engine.dialect.name != "postgresql" or inspect(engine).has_table(ARCHIVE_TABLE):
+        return False
+
+    with engine.begin() as connection:
+        for statement in _POSTGRES_SCHEMA:
+            connection.execute(text(statement))
+    logger.info(f"Created {ARCHIVE_TABLE}, partitioned by month")
+    return True
+
+
+def partition_name(month: date) -> str:
+    return f"{ARCHIVE_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def ensure_archive_partitions(connection: Connection, created_at: Iterable[datetime]) -> None:
+    """Make sure every month in ``created_at`` has its own partition.
+
+    A no-op outside PostgreSQL. Rows already in the DEFAULT partition for
+    a month would block creating that month's partition, so this has to
+    run before the rows are inserted.
+    """
+    if connection.dialect.name != "postgresql":
+        return
+
+    months = {value.date().replace(day=1) for value in created_at}
+    for month in sorted(months):
+        following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        connection.execute(
+            text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                f"PARTITION OF {ARCHIVE_TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()}') TO ('{following.isoformat()}')"
+            )
+        )
@@ -0,0 +1,180 @@
+"""
+Engine settings chosen from the database URL.
+
+SQLite (file databases):
+- WAL journaling, so readers never wait for the writer and commits append
+  to the log instead of rewriting pages;
+- ``synchronous=NORMAL``, which with WAL only fsyncs at checkpoints and
+  is still safe against application crashes;
+- ``busy_timeout``, so a second writer waits for the lock instead of
+  failing at once with "database is locked";
+- ``mmap_size``, so reads come straight from the page cache;
+- a small connection pool: one writer at a time is all SQLite allows.
+
+PostgreSQL:
+- a sized pool with overflow, checkout timeout and recycling;
+- ``pool_pre_ping``, so connections dropped by the server or a proxy are
+  replaced before a request uses them;
+- a server-side ``statement_timeout`` for every connection.
+
+Every value has a DB_* / SQLITE_* environment override.
+``database_report`` reads back what the database actually applied.
+"""
+
+import logging
+import os
+from typing import Any, Dict
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine, make_url
+
+logger = logging.getLogger(__name__)
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+
+
+def _is_memory_sqlite(url) -> bool:
+    database = url.database or ""
+    return database in ("", ":memory:") or "mode=memory" in str(url)
+
+
+def engine_options(url: str, use_async: bool = False) -> Dict[str, Any]:
+    """create_engine / create_async_engine keyword arguments for ``url``"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+
+    if backend == "sqlite":
+        options: Dict[str, Any] = {"connect_args": {"check_same_thread": False}}
+        if not _is_memory_sqlite(parsed):
+            options.update(pool_size=SQLITE_POOL_SIZE, max_overflow=SQLITE_POOL_SIZE)
+        return options
+
+    if backend == "postgresql":
+        if use_async:
+            connect_args = {
+                "server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            }
+        else:
+            connect_args = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+        return {
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+            "connect_args": connect_args,
+        }
+
+    return {"pool_pre_ping": True}
+
+
+def configure_engine(engine: Engine) -> Engine:
+    """Install per-connection settings that can't go in the connect arguments.
+
+    Pass ``async_engine.sync_engine`` for an async engine.
+    """
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    memory = _is_memory_sqlite(engine.url)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if not memory:
+                cursor.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+                cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        finally:
+            cursor.close()
+
+    return engine
+
+
+def _pool_report(engine: Engine) -> Dict[str, Any]:
+    pool = engine.pool
+    report: Dict[str, Any] = {"class": type(pool).__name__}
+    for name in ("size", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if callable(method):
+            report[name] = method()
+    report["pre_ping"] = getattr(pool, "_pre_ping", False)
+    report["recycle_seconds"] = getattr(pool, "_recycle", -1)
+    return report
+
+
+def database_report(engine: Engine) -> Dict[str, Any]:
+    """Effective database settings, read back from a live connection"""
+    url = engine.url
+    report: Dict[str, Any] = {
+        "backend": engine.dialect.name,
+        "driver": engine.dialect.driver,
+        "database": url.render_as_string(hide_password=True),
+        "pool": _pool_report(engine),
+    }
+
+    with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            settings = {}
+            for pragma in ("journal_mode", "synchronous", "busy_timeout", "mmap_size"):
+                settings[pragma] = connection.execute(text(f"PRAGMA {pragma}")).scalar()
+            # PRAGMA synchronous reports a number
+            levels = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+            settings["synchronous"] = levels.get(settings["synchronous"], settings["synchronous"])
+            settings["sqlite_version"] = connection.execute(
+                text("SELECT sqlite_version()")
+            ).scalar()
+            report["settings"] = settings
+        elif engine.dialect.name == "postgresql":
+            report["settings"] = {
+                name: connection.execute(text(f"SHOW {name}")).scalar()
+                for name in ("server_version", "statement_timeout", "max_connections")
+            }
+
+    report["warnings"] = _report_warnings(report)
+    return report
+
+
+def _report_warnings(report: Dict[str, Any]) -> list:
+    warnings = []
+    settings = report.get("settings", {})
+    if report["backend"] == "sqlite" and settings.get("journal_mode") not in ("wal", "memory"):
+        warnings.append(
+            f"journal_mode is {settings.get('journal_mode')}; concurrent writers will "
+            "block readers (set SQLITE_JOURNAL_MODE=WAL)"
+        )
+    if report["backend"] == "sqlite" and not settings.get("busy_timeout"):
+        warnings.append("busy_timeout is 0; concurrent writes fail with 'database is locked'")
+    if report["backend"] == "postgresql" and settings.get("statement_timeout") in ("0", None):
+        warnings.append("statement_timeout is disabled; runaway queries can hold connections")
+    return warnings
+
+
+def log_database_report(engine: Engine) -> Dict[str, Any]:
+    """Startup self-check: log the effective settings and any warnings"""
+    try:
+        report = database_report(engine)
+    except Exception as e:
+        logger.error(f"Database self-check failed: {e}")
+        return {"error": str(e)}
+
+    logger.info(
+        f"Database {report['backend']}+{report['driver']}: "
+        f"pool={report['pool']} settings={report.get('settings', {})}"
+    )
+    for warning in report["warnings"]:
+        logger.warning(f"Database self-check: {warning}")
+    return report
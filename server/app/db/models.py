@@ -0,0 +1,202 @@
+import enum
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, DateTime, Enum, Float, ForeignKey, Index, Integer, JSON, String, Text,
+)
+from sqlalchemy.orm import relationship, validates
+
+from app.db.base import Base
+from app.utils.names import normalize_name
+
+
+class OTPType(enum.Enum):
+    EMAIL_VERIFICATION = "email_verification"
+    PASSWORD_RESET = "password_reset"
+
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key=True, index=True)
+    full_name = Column(String, nullable=False, index=True)
+    email = Column(String, unique=True, index=True, nullable=False)
+    hashed_password = Column(String, nullable=False)
+    is_verified = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    predictions = relationship("PredictionResult", back_populates="user")
+    otp_codes = relationship("OTPCode", back_populates="user", cascade="all, delete-orphan")
+
+
+class Patient(Base):
+    __tablename__ = "patients"
+
+    id = Column(Integer, primary_key=True, index=True)
+    full_name = Column(String, nullable=False, index=True)
+    date_of_birth = Column(DateTime)
+    gender = Column(String)
+    phone = Column(String)
+    address = Column(Text)
+    medical_history = Column(Text)
+    emergency_contact_name = Column(String)
+    emergency_contact_phone = Column(String)
+    # full_name in lookup form (see app.utils.names), kept in step by the validator
+    normalized_name = Column(String, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    predictions = relationship("PredictionResult", back_populates="patient")
+
+    __table_args__ = (
+        # Blocking key for duplicate checks (see app.services.import_service)
+        Index("ix_patients_normalized_name_dob", "normalized_name", "date_of_birth"),
+    )
+
+    @validates("full_name")
+    def _normalize_full_name(self, key, value):
+        self.normalized_name = normalize_name(value)
+        return value
+
+
+class OTPCode(Base):
+    __tablename__ = "otp_codes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    otp_code = Column(String(6), nullable=False, index=True)
+    otp_type = Column(Enum(OTPType), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    user = relationship("User", back_populates="otp_codes")
+
+
+class PredictionResult(Base):
+    __tablename__ = "prediction_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    image_filename = Column(String, nullable=False)
+    image_path = Column(String)
+    model_type = Column(String, nullable=False)
+    prediction = Column(String, nullable=False)
+    confidence = Column(Float, nullable=False)
+    entropy = Column(Float)
+    message = Column(Text)
+    probabilities = Column(JSON)
+    notes = Column(Text)
+    status = Column(String, default="pending", nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    user = relationship("User", back_populates="predictions")
+    patient = relationship("Patient", back_populates="predictions")
+
+    # Keyset pagination walks these newest-first; id breaks created_at ties
+    __table_args__ = (
+        Index("ix_prediction_results_user_created", "user_id", "created_at", "id"),
+        Index("ix_prediction_results_patient_created", "patient_id", "created_at", "id"),
+    )
+
+
+class PredictionCounter(Base):
+    """Number of predictions per user, model type and status.
+
+    Maintained by PredictionService in the same transaction as the
+    prediction rows, so history totals never need a COUNT over
+    prediction_results unless a free-text search is involved. Rows moved to
+    the archive are counted in ArchivedPredictionCounter instead.
+    """
+
+    __tablename__ = "prediction_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    model_type = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class ArchivedPredictionResult(Base):
+    """Cold storage for predictions moved out of prediction_results.
+
+    Same columns and ids as PredictionResult, plus when the row was moved
+    (see app.services.archive_service). On PostgreSQL the table is
+    partitioned by month of created_at (see app.db.archive).
+    """
+
+    __tablename__ = "archived_prediction_results"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
+    image_filename = Column(String, nullable=False)
+    image_path = Column(String)
+    model_type = Column(String, nullable=False)
+    prediction = Column(String, nullable=False)
+    confidence = Column(Float, nullable=False)
+    entropy = Column(Float)
+    message = Column(Text)
+    probabilities = Column(JSON)
+    notes = Column(Text)
+    status = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    user = relationship("User", viewonly=True)
+    patient = relationship("Patient", viewonly=True)
+
+    __table_args__ = (
+        Index("ix_archived_prediction_results_user_created", "user_id", "created_at", "id"),
+        Index("ix_archived_prediction_results_patient_created", "patient_id", "created_at", "id"),
+    )
+
+
+class ArchivedPredictionCounter(Base):
+    """PredictionCounter for archived_prediction_results.
+
+    The archive mover shifts counts from prediction_counters to here in
+    the same transaction as the rows, so the two tables together always
+    count every prediction.
+    """
+
+    __tablename__ = "archived_prediction_counters"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    model_type = Column(String, primary_key=True)
+    status = Column(String, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+
+class PredictionProbability(Base):
+    """One row per class of a prediction's probabilities, for analytics.
+
+    Filled from PredictionResult.probabilities by database triggers (see
+    app.db.analytics) in the same transaction as the prediction, and kept
+    when the prediction moves to the archive. ``rank`` is 1 for the most
+    likely class; user, model type and date are copied from the
+    prediction so that aggregates never join back to it.
+    """
+
+    __tablename__ = "prediction_probabilities"
+
+    prediction_id = Column(Integer, primary_key=True)
+    class_name = Column(String, primary_key=True)
+    probability = Column(Float, nullable=False)
+    rank = Column(Integer, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    model_type = Column(String, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index(
+            "ix_prediction_probabilities_user_class",
+            "user_id",
+            "model_type",
+            "class_name",
+            "created_at",
+        ),
+    )
@@ -0,0 +1,156 @@
+"""
+Routing of read-only history queries to a replica database.
+
+With ``REPLICA_DATABASE_URL`` set, history lists, statistics and patient
+search read from the replica, taking load off the primary that uploads
+write to. A read goes to the primary instead when:
+
+- the same user wrote within the last ``REPLICA_LAG_TOLERANCE_SECONDS``,
+  so they always see their own changes even if the replica is behind;
+- the replica reports more lag than that tolerance (PostgreSQL standbys;
+  checked at most every ``REPLICA_LAG_CHECK_SECONDS``), or can't be
+  reached.
+
+Writes are recorded per worker process, so the tolerance should cover the
+usual replication delay: a user whose next request lands on another
+worker is only protected by the lag check.
+
+For local testing any second SQLite file works as the replica.
+"""
+
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.cache import TTLCache
+from app.core.metrics import DB_READS
+from app.core.query_stats import untracked_queries
+from app.db.engine import configure_engine, engine_options
+
+logger = logging.getLogger(__name__)
+
+REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL", "")
+REPLICA_LAG_TOLERANCE_SECONDS = float(os.getenv("REPLICA_LAG_TOLERANCE_SECONDS", "2"))
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+
+# Users who wrote recently; an entry expires once the replica should have
+# caught up with their write
+recent_writers = TTLCache(
+    "replica_recent_writers", REPLICA_LAG_TOLERANCE_SECONDS, max_entries=100_000
+)
+_replica_lag = TTLCache("replica_lag", REPLICA_LAG_CHECK_SECONDS, max_entries=1)
+
+replica_engine = None
+ReplicaSessionLocal: Optional[sessionmaker] = None
+
+
+def configure_replica(url: Optional[str]):
+    """Point read routing at ``url``; an empty URL sends every read to the primary"""
+    global replica_engine, ReplicaSessionLocal
+    if replica_engine is not None:
+        replica_engine.dispose()
+    _replica_lag.clear()
+    recent_writers.clear()
+
+    if not url:
+        replica_engine, ReplicaSessionLocal = None, None
+        return None
+
+    replica_engine = configure_engine(create_engine(url, **engine_options(url)))
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine
+    )
+    return replica_engine
+
+
+def record_user_write(user_id: Optional[int]) -> None:
+    """Send ``user_id``'s reads to the primary until the replica catches up"""
+    if replica_engine is not None and user_id is not None:
+        recent_writers.set(user_id, True)
+
+
+def replica_lag_seconds() -> Optional[float]:
+    """Replication delay of the replica, cached; None when it can't be measured.
+
+    Raises if the replica can't be queried.
+    """
+    cached = _replica_lag.get("lag")
+    if cached is not None:
+        return cached[0]
+
+    lag = None
+    # Runs once per check interval, not per request, so it is not charged
+    # to whichever request's query budget it happens to land in
+    with untracked_queries(), replica_engine.connect() as connection:
+        if replica_engine.dialect.name == "postgresql":
+            lag = float(
+                connection.execute(
+                    text(
+                        "SELECT CASE WHEN pg_is_in_recovery() THEN COALESCE("
+                        "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+                        "ELSE 0 END"
+                    )
+                ).scalar()
+            )
+        else:
+            # No replication to measure; just check the replica answers
+            connection.execute(text("SELECT 1"))
+    # Stored in a tuple so that an unknown lag is cached too
+    _replica_lag.set("lag", (lag,))
+    return lag
+
+
+def use_replica(user_id: Optional[int]) -> bool:
+    if replica_engine is None:
+        return False
+    if user_id is not None and recent_writers.get(user_id):
+        DB_READS.labels("primary", "recent_write").inc()
+        return False
+    try:
+        lag = replica_lag_seconds()
+    except Exception as e:
+        logger.warning(f"Replica unavailable, reading from the primary: {e}")
+        _replica_lag.set("lag", (float("inf"),))
+        DB_READS.labels("primary", "replica_unavailable").inc()
+        return False
+    if lag is not None and lag > REPLICA_LAG_TOLERANCE_SECONDS:
+        DB_READS.labels("primary", "replica_lag").inc()
+        return False
+    DB_READS.labels("replica", "").inc()
+    return True
+
+
+def replica_report() -> Dict[str, Any]:
+    """Replica settings and lag, for GET /admin/database"""
+    from app.db.engine import database_report
+
+    if replica_engine is None:
+        return {"enabled": False}
+    report: Dict[str, Any] = {
+        "enabled": True,
+        "lag_tolerance_seconds": REPLICA_LAG_TOLERANCE_SECONDS,
+        "recent_writers": len(recent_writers),
+    }
+    try:
+        report["lag_seconds"] = replica_lag_seconds()
+        report["database"] = database_report(replica_engine)
+    except Exception as e:
+        report["error"] = str(e)
+    return report
+
+
+def replica_enabled() -> bool:
+    return replica_engine is not None
+
+
+def read_session(primary: Session, user_id: Optional[int]) -> Session:
+    """A session for a read-only query: the replica's, or ``primary``"""
+    if use_replica(user_id):
+        return ReplicaSessionLocal()
+    return primary
+
+
+configure_replica(REPLICA_DATABASE_URL)
@@ -0,0 +1,364 @@
+"""
+Search indexes: full-text over prediction history, and patient name lookup.
+
+Each prediction is indexed with its patient's name, the predicted label
+and the notes. The index lives outside the ORM metadata and is kept in
+sync by database triggers, so every write path (services, bulk loads,
+manual SQL) updates it in the same transaction as the row itself:
+
+- SQLite: an FTS5 table ``prediction_search`` keyed by the prediction id,
+  ranked with bm25;
+- PostgreSQL: a ``prediction_search`` table holding a weighted tsvector
+  per prediction with a GIN index, ranked with ts_rank.
+
+Rows in ``archived_prediction_results`` stay in the index under the same
+id: moving a row to the archive inserts it there before deleting it from
+``prediction_results``, and the delete triggers only drop index entries
+whose id is in neither table.
+
+Other databases fall back to unindexed LIKE matching.
+
+Patient lookups use ``patients.normalized_name``: a B-tree index answers
+prefix ranges everywhere, and on PostgreSQL a trigram GiST index also
+serves substring matches ordered by similarity.
+"""
+
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from sqlalchemy import column, func, inspect, literal_column, or_, table, text
+from sqlalchemy.engine import Engine
+
+from app.db.models import ArchivedPredictionResult, Patient, PredictionResult
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = "prediction_search"
+ARCHIVE_TABLE = ArchivedPredictionResult.__tablename__
+
+_SQLITE_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+        patient_name, prediction, notes, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert
+    AFTER INSERT ON prediction_results BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, patient_name, prediction, notes)
+        VALUES (
+            new.id,
+            (SELECT full_name FROM patients WHERE id = new.patient_id),
+            new.prediction,
+            new.notes
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update
+    AFTER UPDATE OF patient_id, prediction, notes ON prediction_results BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET patient_name = (SELECT full_name FROM patients WHERE id = new.patient_id),
+            prediction = new.prediction,
+            notes = new.notes
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_patient_rename
+    AFTER UPDATE OF full_name ON patients BEGIN
+        UPDATE {SEARCH_TABLE} SET patient_name = new.full_name
+        WHERE rowid IN (SELECT id FROM prediction_results WHERE patient_id = new.id);
+    END
+    """,
+]
+
+# Installed on every start, so databases indexed before the archive
+# existed get them too
+_SQLITE_ARCHIVE_TRIGGERS = [
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_delete
+    AFTER DELETE ON prediction_results
+    WHEN NOT EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} WHERE id = old.id) BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_archive_insert
+    AFTER INSERT ON {ARCHIVE_TABLE}
+    WHEN NOT EXISTS (SELECT 1 FROM {SEARCH_TABLE} WHERE rowid = new.id) BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, patient_name, prediction, notes)
+        VALUES (
+            new.id,
+            (SELECT full_name FROM patients WHERE id = new.patient_id),
+            new.prediction,
+            new.notes
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_archive_update
+    AFTER UPDATE OF patient_id, prediction, notes ON {ARCHIVE_TABLE} BEGIN
+        UPDATE {SEARCH_TABLE}
+        SET patient_name = (SELECT full_name FROM patients WHERE id = new.patient_id),
+            prediction = new.prediction,
+            notes = new.notes
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_archive_delete
+    AFTER DELETE ON {ARCHIVE_TABLE}
+    WHEN NOT EXISTS (SELECT 1 FROM prediction_results WHERE id = old.id) BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_archive_patient_rename
+    AFTER UPDATE OF full_name ON patients BEGIN
+        UPDATE {SEARCH_TABLE} SET patient_name = new.full_name
+        WHERE rowid IN (SELECT id FROM {ARCHIVE_TABLE} WHERE patient_id = new.id);
+    END
+    """,
+]
+
+_SQLITE_BACKFILL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, patient_name, prediction, notes)
+    SELECT r.id, p.full_name, r.prediction, r.notes
+    FROM prediction_results r LEFT JOIN patients p ON p.id = r.patient_id
+    UNION ALL
+    SELECT a.id, p.full_name, a.prediction, a.notes
+    FROM {ARCHIVE_TABLE} a LEFT JOIN patients p ON p.id = a.patient_id
+"""
+
+# Patient names weigh most, then the label, then free-text notes
+_POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('simple', coalesce({name}, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce({prediction}, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce({notes}, '')), 'C')
+"""
+
+_POSTGRES_PATIENT_RENAME = f"""
+    CREATE OR REPLACE FUNCTION {SEARCH_TABLE}_patient_rename() RETURNS trigger AS $$
+    BEGIN
+        UPDATE {SEARCH_TABLE} s
+        SET document = {_POSTGRES_DOCUMENT.format(name="NEW.full_name", prediction="r.prediction", notes="r.notes")}
+        FROM prediction_results r
+        WHERE r.patient_id = NEW.id AND s.prediction_id = r.id;
+        UPDATE {SEARCH_TABLE} s
+        SET document = {_POSTGRES_DOCUMENT.format(name="NEW.full_name", prediction="a.prediction", notes="a.notes")}
+        FROM {ARCHIVE_TABLE} a
+        WHERE a.patient_id = NEW.id AND s.prediction_id = a.id;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# Entries are removed by trigger rather than a foreign key, since an id
+# may be in either prediction table
+_POSTGRES_SCHEMA = [
+    f"""
+    CREATE TABLE {SEARCH_TABLE} (
+        prediction_id integer PRIMARY KEY,
+        document tsvector NOT NULL
+    )
+    """,
+    f"CREATE INDEX ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)",
+    f"""
+    CREATE OR REPLACE FUNCTION {SEARCH_TABLE}_refresh() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} (prediction_id, document)
+        SELECT NEW.id, {_POSTGRES_DOCUMENT.format(name="p.full_name", prediction="NEW.prediction", notes="NEW.notes")}
+        FROM patients p WHERE p.id = NEW.patient_id
+        ON CONFLICT (prediction_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_refresh
+    AFTER INSERT OR UPDATE OF patient_id, prediction, notes ON prediction_results
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_refresh()
+    """,
+    _POSTGRES_PATIENT_RENAME,
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_patient_rename
+    AFTER UPDATE OF full_name ON patients
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_patient_rename()
+    """,
+]
+
+_POSTGRES_ARCHIVE_TRIGGERS = [
+    f"""
+    ALTER TABLE {SEARCH_TABLE}
+    DROP CONSTRAINT IF EXISTS {SEARCH_TABLE}_prediction_id_fkey
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION {SEARCH_TABLE}_remove() RETURNS trigger AS $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM prediction_results WHERE id = OLD.id)
+            AND NOT EXISTS (SELECT 1 FROM {ARCHIVE_TABLE} WHERE id = OLD.id) THEN
+            DELETE FROM {SEARCH_TABLE} WHERE prediction_id = OLD.id;
+        END IF;
+        RETURN OLD;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_remove ON prediction_results",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_remove
+    AFTER DELETE ON prediction_results
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_remove()
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_remove ON {ARCHIVE_TABLE}",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_remove
+    AFTER DELETE ON {ARCHIVE_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_remove()
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_refresh ON {ARCHIVE_TABLE}",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_refresh
+    AFTER INSERT OR UPDATE OF patient_id, prediction, notes ON {ARCHIVE_TABLE}
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_refresh()
+    """,
+    _POSTGRES_PATIENT_RENAME,
+]
+
+_POSTGRES_BACKFILL = f"""
+    INSERT INTO {SEARCH_TABLE} (prediction_id, document)
+    SELECT r.id, {_POSTGRES_DOCUMENT.format(name="p.full_name", prediction="r.prediction", notes="r.notes")}
+    FROM prediction_results r LEFT JOIN patients p ON p.id = r.patient_id
+    UNION ALL
+    SELECT a.id, {_POSTGRES_DOCUMENT.format(name="p.full_name", prediction="a.prediction", notes="a.notes")}
+    FROM {ARCHIVE_TABLE} a LEFT JOIN patients p ON p.id = a.patient_id
+"""
+
+# Set once install_patient_lookup has the PostgreSQL trigram index in place
+trigram_lookup = False
+
+_fts_table = table(
+    SEARCH_TABLE, column("rowid"), column("rank"), column(SEARCH_TABLE)
+)
+_tsvector_table = table(SEARCH_TABLE, column("prediction_id"), column("document"))
+
+
+def install_search_index(engine: Engine) -> bool:
+    """Create and backfill the index if this database does not have it yet.
+
+    The archive triggers are (re)installed either way. Returns True when
+    the index was created by this call.
+    """
+    dialect = engine.dialect.name
+    if dialect == "sqlite":
+        schema, backfill = _SQLITE_SCHEMA, _SQLITE_BACKFILL
+        archive_triggers = _SQLITE_ARCHIVE_TRIGGERS
+    elif dialect == "postgresql":
+        schema, backfill = _POSTGRES_SCHEMA, _POSTGRES_BACKFILL
+        archive_triggers = _POSTGRES_ARCHIVE_TRIGGERS
+    else:
+        logger.info(f"No full-text index for {dialect}; history search uses LIKE")
+        return False
+
+    created = not inspect(engine).has_table(SEARCH_TABLE)
+    with engine.begin() as connection:
+        if created:
+            for statement in schema:
+                connection.execute(text(statement))
+            connection.execute(text(backfill))
+        for statement in archive_triggers:
+            connection.execute(text(statement))
+    if created:
+        logger.info(f"Created full-text index {SEARCH_TABLE} ({dialect})")
+    return created
+
+
+def install_patient_lookup(engine: Engine) -> None:
+    """Add patients.normalized_name to older databases and fill it in.
+
+    Runs before the ORM indexes are created, since one of them is on this
+    column. On PostgreSQL also creates the trigram index, if the pg_trgm
+    extension can be enabled.
+    """
+    from app.utils.names import normalize_name
+
+    columns = {column["name"] for column in inspect(engine).get_columns("patients")}
+    if "normalized_name" not in columns:
+        with engine.begin() as connection:
+            connection.execute(
+                text("ALTER TABLE patients ADD COLUMN normalized_name VARCHAR")
+            )
+            rows = connection.execute(text("SELECT id, full_name FROM patients")).all()
+            if rows:
+                connection.execute(
+                    text("UPDATE patients SET normalized_name = :name WHERE id = :id"),
+                    [{"id": row.id, "name": normalize_name(row.full_name)} for row in rows],
+                )
+        logger.info(f"Added patients.normalized_name for {len(rows)} patients")
+
+    if engine.dialect.name == "postgresql":
+        global trigram_lookup
+        try:
+            with engine.begin() as connection:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                connection.execute(
+                    text(
+                        "CREATE INDEX IF NOT EXISTS ix_patients_normalized_name_trgm "
+                        "ON patients USING gist (normalized_name gist_trgm_ops)"
+                    )
+                )
+            trigram_lookup = True
+        except Exception as e:
+            logger.warning(f"pg_trgm unavailable, patient lookup uses prefixes only: {e}")
+
+
+def search_terms(search: str) -> List[str]:
+    """Words of a free-text query, lower-cased; punctuation is ignored"""
+    return re.findall(r"\w+", search.lower())
+
+
+def apply_prediction_search(
+    query, search: str, dialect: str, model=PredictionResult
+) -> Tuple[object, Optional[object]]:
+    """Narrow a PredictionResult query to rows matching ``search``.
+
+    Every word must match as a prefix of a word in the patient name,
+    prediction or notes. Returns the query and an expression to order by
+    for best matches first (None when the backend cannot rank). Pass
+    ``model=ArchivedPredictionResult`` to search the archive.
+    """
+    terms = search_terms(search)
+    if not terms:
+        return query, None
+
+    if dialect == "sqlite":
+        match = " ".join(f'"{term}"*' for term in terms)
+        query = query.join(_fts_table, _fts_table.c.rowid == model.id).filter(
+            _fts_table.c[SEARCH_TABLE].op("MATCH")(match)
+        )
+        # bm25 rank: more negative is a better match
+        return query, _fts_table.c.rank
+
+    if dialect == "postgresql":
+        tsquery = func.to_tsquery(
+            literal_column("'simple'"), " & ".join(f"{term}:*" for term in terms)
+        )
+        query = query.join(
+            _tsvector_table, _tsvector_table.c.prediction_id == model.id
+        ).filter(_tsvector_table.c.document.op("@@")(tsquery))
+        return query, func.ts_rank(_tsvector_table.c.document, tsquery).desc()
+
+    # No index: substring match, through EXISTS so that callers can still
+    # eager-load the patient without joining it twice
+    for term in terms:
+        pattern = f"%{term}%"
+        query = query.filter(
+            or_(
+                model.patient.has(func.lower(Patient.full_name).like(pattern)),
+                func.lower(model.prediction).like(pattern),
+                func.lower(model.notes).like(pattern),
+            )
+        )
+    return query, None
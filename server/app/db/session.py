@@ -0,0 +1,61 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.engine import configure_engine, engine_options
+
+# Pool and per-connection settings come from the profile for the backend
+# (see app.db.engine)
+engine = configure_engine(
+    create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
+)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# asyncio driver used for each backend when DATABASE_URL names a sync one
+ASYNC_DRIVERS = {"sqlite": "aiosqlite", "postgresql": "asyncpg"}
+
+
+def async_database_url(url: str) -> str:
+    """The same database addressed through its asyncio driver"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver configured for {backend} databases")
+    return parsed.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(
+        hide_password=False
+    )
+
+
+def create_async_engine_for(url: str):
+    async_engine = create_async_engine(url, **engine_options(url, use_async=True))
+    configure_engine(async_engine.sync_engine)
+    return async_engine
+
+
+# Async handlers use this path so queries don't block the event loop.
+# ASYNC_DATABASE_URL overrides the URL derived from DATABASE_URL.
+async_engine = create_async_engine_for(
+    os.getenv("ASYNC_DATABASE_URL") or async_database_url(settings.DATABASE_URL)
+)
+# Objects stay usable after commit without a reload, which async code
+# could not trigger implicitly
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
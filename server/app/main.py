@@ -1,5 +1,8 @@
 import io
 import os
+import time
+from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -7,9 +10,31 @@ load_dotenv()
 
 import torch
 from app.api.auth import router as auth_router
-from app.api.history import router as history_router
+from app.api.history import export_response, router as history_router
 from app.api.upload import router as upload_router
 from app.api.share import router as share_router
+from app.core.memory import (
+    MemoryTrackingMiddleware,
+    memory_report,
+    memory_sampler,
+    start_tracemalloc,
+    stop_tracemalloc,
+)
+from app.core.metrics import (
+    CONTENT_TYPE_LATEST,
+    PrometheusMiddleware,
+    instrument_engine,
+    mark_worker_dead,
+    observe_inference_batch,
+    observe_model_load,
+    render_metrics,
+)
+from app.core.profiling import ProfilingMiddleware, list_profiles, profile_path
+from app.core.query_stats import QueryStatsMiddleware, get_query_statistics
+from app.core.security import require_admin
+from app.core.timing import ServerTimingMiddleware, get_stage_statistics, timed_stage
+from app.core.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+from app.core.archive_scheduler import archive_scheduler
 from app.core.otp_scheduler import (
     start_otp_cleanup_service,
     stop_otp_cleanup_service,
@@ -18,7 +43,19 @@ from app.core.otp_scheduler import (
 
 # import database models and create tables
 from app.db.base import Base
-from app.db.session import engine
+from app.db.models import (
+    ArchivedPredictionCounter,
+    PredictionCounter,
+    PredictionProbability,
+)
+from app.db import replica
+from app.db.analytics import install_probability_triggers
+from app.db.archive import install_archive
+from app.db.engine import database_report, log_database_report
+from app.db.search import install_patient_lookup, install_search_index
+from app.db.session import async_engine, engine, get_db
+from app.services.prediction_service import PredictionService
+from app.utils.inference_config import apply_thread_settings, optimize_for_inference
 from app.utils.model_utils import (
     create_vit_model,
     create_effnetb2_model,
@@ -27,16 +64,23 @@ from app.utils.model_utils import (
     reorder_probs,
     validate_image_confidence,
 )
-from fastapi import FastAPI, File, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from PIL import Image
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Thread pools must be sized before the first model runs
+apply_thread_settings()
+configure_tracing()
+
 # Global variables for model caching
 _tumor_model = None
 _tumor_transforms = None
@@ -46,8 +90,29 @@ _separator_model = None
 _separator_transforms = None
 
 
-def create_db_and_tables():
-    Base.metadata.create_all(bind=engine)
+def create_db_and_tables(bind=engine):
+    counters_missing = not all(
+        inspect(bind).has_table(counter.__tablename__)
+        for counter in (PredictionCounter, ArchivedPredictionCounter)
+    )
+    probabilities_missing = not inspect(bind).has_table(
+        PredictionProbability.__tablename__
+    )
+    # Partitioned on PostgreSQL, so it can't come from create_all there
+    install_archive(bind)
+    Base.metadata.create_all(bind=bind)
+    install_patient_lookup(bind)
+    # create_all skips tables that already exist, so indexes added to an
+    # existing table have to be created on their own
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+    install_search_index(bind)
+    install_probability_triggers(bind, backfill=probabilities_missing)
+    # Databases from before the counter tables need them filled once
+    if counters_missing:
+        with Session(bind) as db:
+            PredictionService.rebuild_prediction_counters(db)
 
 
 def load_tumor_model():
@@ -55,6 +120,7 @@ def load_tumor_model():
     global _tumor_model, _tumor_transforms
     if _tumor_model is None:
         print("Loading tumor model...")
+        started = time.perf_counter()
         _tumor_model, _tumor_transforms = create_vit_model(num_classes=4)
         _tumor_model.load_state_dict(
             torch.load(
@@ -63,6 +129,8 @@ def load_tumor_model():
             )
         )
         _tumor_model.eval()
+        _tumor_model = optimize_for_inference(_tumor_model, "tumor")
+        observe_model_load("tumor", _tumor_model, time.perf_counter() - started)
         print("Tumor model loaded successfully!")
     return _tumor_model, _tumor_transforms
 
@@ -72,6 +140,7 @@ def load_chest_model():
     global _chest_model, _chest_transforms
     if _chest_model is None:
         print("Loading chest X-ray model...")
+        started = time.perf_counter()
         _chest_model, _chest_transforms = create_vit_model(
             num_classes=4
         )
@@ -82,6 +151,8 @@ def load_chest_model():
             )
         )
         _chest_model.eval()
+        _chest_model = optimize_for_inference(_chest_model, "chest_xray")
+        observe_model_load("chest_xray", _chest_model, time.perf_counter() - started)
         print("Chest X-ray model loaded successfully!")
     return _chest_model, _chest_transforms
 
@@ -91,6 +162,7 @@ def load_separator_model():
     global _separator_model, _separator_transforms
     if _separator_model is None:
         print("Loading separator model...")
+        started = time.perf_counter()
         _separator_model, _separator_transforms = create_effnetb2_model(num_classes=2)
         _separator_model.load_state_dict(
             torch.load(
@@ -99,11 +171,18 @@ def load_separator_model():
             )
         )
         _separator_model.eval()
+        _separator_model = optimize_for_inference(_separator_model, "separator")
+        observe_model_load("separator", _separator_model, time.perf_counter() - started)
         print("Separator model loaded successfully!")
     return _separator_model, _separator_transforms
 
 
 create_db_and_tables()
+database_self_check = log_database_report(engine)
+instrument_engine(engine)
+instrument_engine(async_engine.sync_engine)
+if replica.replica_engine is not None:
+    instrument_engine(replica.replica_engine)
 
 app = FastAPI(
     title="Second Opinion API",
@@ -117,7 +196,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MemoryTrackingMiddleware)
+app.add_middleware(PrometheusMiddleware)
+app.add_middleware(TracingMiddleware)
 
 
 # Application lifecycle events
@@ -128,6 +214,8 @@ async def startup_event():
     # Start the OTP cleanup scheduler
     await start_otp_cleanup_service()
     logger.info("OTP cleanup service started")
+    await archive_scheduler.start_scheduler()
+    await memory_sampler.start()
 
 
 @app.on_event("shutdown")
@@ -137,6 +225,13 @@ async def shutdown_event():
     # Stop the OTP cleanup scheduler
     await stop_otp_cleanup_service()
     logger.info("OTP cleanup service stopped")
+    await archive_scheduler.stop_scheduler()
+    await memory_sampler.stop()
+    mark_worker_dead()
+    await async_engine.dispose()
+    if replica.replica_engine is not None:
+        replica.replica_engine.dispose()
+    shutdown_tracing()
 
 
 # Mount static files for uploaded images
@@ -198,6 +293,99 @@ def get_otp_statistics():
         db.close()
 
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=render_metrics(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/admin/timings", dependencies=[Depends(require_admin)])
+def get_stage_timings():
+    """Admin endpoint to get per-stage timing histograms for this worker"""
+    return {"success": True, "stages": get_stage_statistics()}
+
+
+@app.get("/admin/queries", dependencies=[Depends(require_admin)])
+def get_query_stats():
+    """Admin endpoint to get per-route query counts, DB time, slow and repeated statements"""
+    return {"success": True, "routes": get_query_statistics()}
+
+
+@app.get("/admin/database", dependencies=[Depends(require_admin)])
+def get_database_report():
+    """Admin endpoint to get the effective engine, pool and database settings"""
+    return {
+        "success": True,
+        "database": database_report(engine),
+        "replica": replica.replica_report(),
+    }
+
+
+@app.post("/admin/archive/run", dependencies=[Depends(require_admin)])
+async def run_prediction_archive(db: Session = Depends(get_db)):
+    """Admin endpoint to move due predictions to the archive table now"""
+    result = await archive_scheduler.run("manual", db.get_bind())
+    return {"success": True, "details": result}
+
+
+@app.get("/admin/predictions/export", dependencies=[Depends(require_admin)])
+def export_all_predictions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$"),
+    user_id: Optional[int] = Query(None),
+    model_type: Optional[str] = Query(None),
+    status: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    db: Session = Depends(get_db),
+):
+    """Admin endpoint to stream every user's predictions (or one user's)"""
+    return export_response(
+        db,
+        format,
+        f"user{user_id}" if user_id is not None else "all",
+        user_id=user_id,
+        model_type=model_type,
+        status=status,
+        since=since,
+        until=until,
+    )
+
+
+@app.get("/admin/memory", dependencies=[Depends(require_admin)])
+def get_memory_report(top: int = Query(20, ge=1, le=100)):
+    """Admin endpoint to get this worker's memory usage by model, cache and endpoint"""
+    return {"success": True, "memory": memory_report(top=top)}
+
+
+@app.post("/admin/memory/tracemalloc/start", dependencies=[Depends(require_admin)])
+def start_memory_tracing(frames: int = Query(1, ge=1, le=25)):
+    """Admin endpoint to start tracemalloc; /admin/memory then lists top allocators"""
+    start_tracemalloc(frames=frames)
+    return {"success": True, "message": f"tracemalloc started with {frames} frame(s)"}
+
+
+@app.post("/admin/memory/tracemalloc/stop", dependencies=[Depends(require_admin)])
+def stop_memory_tracing():
+    """Admin endpoint to stop tracemalloc and drop its baseline"""
+    stop_tracemalloc()
+    return {"success": True, "message": "tracemalloc stopped"}
+
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def get_request_profiles():
+    """Admin endpoint to list stored request profiles, newest first"""
+    return {"success": True, "profiles": list_profiles()}
+
+
+@app.get("/admin/profiles/{profile_id}/{kind}", dependencies=[Depends(require_admin)])
+def download_request_profile(profile_id: str, kind: str):
+    """Admin endpoint to download a profile as ``pstats`` or ``collapsed`` stacks"""
+    path = profile_path(profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, filename=os.path.basename(path))
+
+
 # Keep the original tumor endpoint for backward compatibility
 @app.post("/tumor")
 async def post_image_tumor(file: UploadFile = File(...)):
@@ -211,20 +399,26 @@ async def post_image_tumor(file: UploadFile = File(...)):
     )
     
     # Load the separator model
-    separator_model, separator_transforms = load_separator_model()
+    with timed_stage("model_load"):
+        separator_model, separator_transforms = load_separator_model()
     
     # Process the uploaded image
-    image_data = await file.read()
-    img = Image.open(io.BytesIO(image_data))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+    with timed_stage("read"):
+        image_data = await file.read()
+    with timed_stage("decode"):
+        img = Image.open(io.BytesIO(image_data))
+        img.load()
+        if img.mode != "RGB":
+            img = img.convert("RGB")
     
     # First check with separator model
     if separator_transforms is not None:
-        img_tensor = separator_transforms(img).unsqueeze(0)
-        
-        with torch.inference_mode():
-            separator_raw_probs = torch.softmax(separator_model(img_tensor), dim=1)
+        with timed_stage("separator"):
+            img_tensor = separator_transforms(img).unsqueeze(0)
+            observe_inference_batch("separator", img_tensor.shape[0])
+
+            with torch.inference_mode():
+                separator_raw_probs = torch.softmax(separator_model(img_tensor), dim=1)
         
         # Optionally reorder probs if an index map exists
         separator_index_map = load_index_map("Seperator", num_classes=len(separator_class_names))
@@ -260,15 +454,18 @@ async def post_image_tumor(file: UploadFile = File(...)):
     )
 
     # Load the cached tumor model
-    vit, vit_transforms = load_tumor_model()
+    with timed_stage("model_load"):
+        vit, vit_transforms = load_tumor_model()
 
     # Transform and predict with tumor model
     if vit_transforms is not None:
-        img_tensor = vit_transforms(img).unsqueeze(0)
+        with timed_stage("vit"):
+            img_tensor = vit_transforms(img).unsqueeze(0)
+            observe_inference_batch("tumor", img_tensor.shape[0])
 
-        with torch.inference_mode():
-            # Pass the transformed image through the model and turn the prediction logits into prediction probabilities
-            raw_probs = torch.softmax(vit(img_tensor), dim=1)
+            with torch.inference_mode():
+                # Pass the transformed image through the model and turn the prediction logits into prediction probabilities
+                raw_probs = torch.softmax(vit(img_tensor), dim=1)
 
         # Optionally reorder probs if an index map exists (to match desired label order)
         index_map = load_index_map("Tumor", num_classes=len(class_names))
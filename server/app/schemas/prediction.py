@@ -38,6 +38,18 @@ class PatientResponse(PatientBase):
         from_attributes = True
 
 
+class PatientLookupResult(BaseModel):
+    """Just enough of a patient to pick one from a typeahead list"""
+
+    id: int
+    full_name: str
+    date_of_birth: Optional[date] = None
+    gender: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
 class PredictionRequest(BaseModel):
     patient_id: Optional[int] = None  # Existing patient
     patient_data: Optional[PatientCreate] = None  # New patient data
@@ -67,7 +79,8 @@ class PredictionResultBase(BaseModel):
 
 class PredictionResultCreate(PredictionResultBase):
     user_id: int
-    patient_id: int
+    # None when the same upload creates the patient
+    patient_id: Optional[int] = None
     image_path: Optional[str] = None
 
 
@@ -95,9 +108,106 @@ class PredictionHistoryResponse(BaseModel):
     page: int
     per_page: int
     total_pages: int
+    # Pass back as ?cursor= to fetch the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+
+class PredictionSummary(BaseModel):
+    """A history list row: no probabilities, message or full patient record"""
+
+    id: int
+    patient_id: int
+    image_filename: str
+    model_type: str
+    prediction: str
+    confidence: float
+    entropy: Optional[float] = None
+    status: str
+    notes: Optional[str] = None
+    created_at: datetime
+    patient: PatientLookupResult
+
+
+class PredictionSummaryPage(BaseModel):
+    results: List[PredictionSummary]
+    total: int
+    page: int
+    per_page: int
+    total_pages: int
+    next_cursor: Optional[str] = None
+
+
+class DailyPredictionCount(BaseModel):
+    date: date
+    count: int
 
 
 class PredictionStatisticsResponse(BaseModel):
     total_predictions: int
     by_model_type: Dict[str, int]
     by_status: Dict[str, int]
+    daily_counts: List[DailyPredictionCount] = []
+    # Edges of the confidence buckets; histograms are model type -> class -> counts
+    confidence_buckets: List[float] = []
+    confidence_histograms: Dict[str, Dict[str, List[int]]] = {}
+
+
+class PatientOverviewResponse(BaseModel):
+    patient: PatientResponse
+    # Newest first
+    recent_predictions: List[PredictionResultResponse]
+    # Counts and date cover archived predictions too
+    total_predictions: int
+    by_model_type: Dict[str, int]
+    by_status: Dict[str, int]
+    last_analysis_at: Optional[datetime] = None
+
+
+class ProbabilitySummary(BaseModel):
+    model_type: str
+    class_name: str
+    period: Optional[str] = None
+    predictions: int
+    # Predictions where this class was the most likely one
+    top_class: int
+    mean_probability: float
+    min_probability: float
+    max_probability: float
+
+
+class ProbabilitySummaryResponse(BaseModel):
+    results: List[ProbabilitySummary]
+
+
+class ProbabilityMatch(BaseModel):
+    prediction_id: int
+    model_type: str
+    class_name: str
+    probability: float
+    rank: int
+    # Probability minus the best other class's; small for close calls
+    margin: float
+    created_at: datetime
+
+
+class ProbabilityMatchPage(BaseModel):
+    results: List[ProbabilityMatch]
+    next_cursor: Optional[str] = None
+
+
+class PatientImportRow(BaseModel):
+    row: int
+    # created, duplicate, invalid or failed
+    status: str
+    patient_id: Optional[int] = None
+    duplicate_of_row: Optional[int] = None
+    errors: Optional[List[str]] = None
+
+
+class PatientImportReport(BaseModel):
+    total: int
+    created: int
+    duplicate: int
+    invalid: int
+    failed: int
+    rows: List[PatientImportRow]
@@ -0,0 +1,153 @@
+"""
+SQL analytics over per-class prediction probabilities.
+
+Everything here reads prediction_probabilities (see app.db.analytics), so
+aggregates and filters run in the database over indexed rows instead of
+loading and parsing every prediction's probabilities JSON. Archived
+predictions are included.
+"""
+
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session, aliased
+
+from app.core.tracing import traced
+from app.db.models import PredictionProbability
+from app.utils.pagination import before_cursor
+
+PROBABILITY_PERIODS = ("day", "month")
+
+
+def _period_label(column, period: str, dialect: str):
+    """``created_at`` truncated to ``period``, as ISO text"""
+    if dialect == "postgresql":
+        return func.to_char(column, "YYYY-MM-DD" if period == "day" else "YYYY-MM")
+    return func.strftime("%Y-%m-%d" if period == "day" else "%Y-%m", column)
+
+
+class ProbabilityAnalyticsService:
+    @staticmethod
+    def _filtered(
+        statement,
+        user_id: int,
+        model_type: Optional[str] = None,
+        class_name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        statement = statement.where(PredictionProbability.user_id == user_id)
+        if model_type:
+            statement = statement.where(PredictionProbability.model_type == model_type)
+        if class_name:
+            statement = statement.where(PredictionProbability.class_name == class_name)
+        if since:
+            statement = statement.where(PredictionProbability.created_at >= since)
+        if until:
+            statement = statement.where(PredictionProbability.created_at < until)
+        return statement
+
+    @staticmethod
+    @traced()
+    def summarize(
+        db: Session,
+        user_id: int,
+        model_type: Optional[str] = None,
+        class_name: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        period: Optional[str] = None,
+    ) -> List[dict]:
+        """Probability statistics per model type and class, in one grouped query.
+
+        For each class: how many predictions scored it, how often it was
+        the most likely class, and the mean, min and max probability. With
+        ``period`` ("day" or "month") there is one row per class and period.
+        """
+        groups = [PredictionProbability.model_type, PredictionProbability.class_name]
+        if period:
+            groups.append(
+                _period_label(
+                    PredictionProbability.created_at, period, db.get_bind().dialect.name
+                ).label("period")
+            )
+        statement = select(
+            *groups,
+            func.count().label("predictions"),
+            func.sum(case((PredictionProbability.rank == 1, 1), else_=0)).label(
+                "top_class"
+            ),
+            func.avg(PredictionProbability.probability).label("mean_probability"),
+            func.min(PredictionProbability.probability).label("min_probability"),
+            func.max(PredictionProbability.probability).label("max_probability"),
+        )
+        statement = ProbabilityAnalyticsService._filtered(
+            statement, user_id, model_type, class_name, since, until
+        )
+        statement = statement.group_by(*groups).order_by(*groups)
+        return [row._asdict() for row in db.execute(statement)]
+
+    @staticmethod
+    @traced()
+    def find_predictions(
+        db: Session,
+        user_id: int,
+        class_name: str,
+        model_type: Optional[str] = None,
+        min_probability: Optional[float] = None,
+        max_probability: Optional[float] = None,
+        max_margin: Optional[float] = None,
+        top_class_only: bool = False,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 50,
+        cursor: Optional[Tuple[datetime, int]] = None,
+    ) -> List[dict]:
+        """Predictions whose ``class_name`` probability matches the filters.
+
+        ``margin`` is the class's probability minus the best other class's:
+        positive when it was the most likely class, and small for close
+        calls. Newest first; ``cursor`` is the created_at and prediction id
+        of the last row already seen.
+        """
+        scored = PredictionProbability
+        # The best other class: the runner-up when this one came first
+        other = aliased(PredictionProbability)
+        margin = (scored.probability - func.coalesce(other.probability, 0.0)).label(
+            "margin"
+        )
+        statement = select(
+            scored.prediction_id,
+            scored.model_type,
+            scored.class_name,
+            scored.probability,
+            scored.rank,
+            margin,
+            scored.created_at,
+        ).outerjoin(
+            other,
+            and_(
+                other.prediction_id == scored.prediction_id,
+                other.rank == case((scored.rank == 1, 2), else_=1),
+            ),
+        )
+        statement = ProbabilityAnalyticsService._filtered(
+            statement, user_id, model_type, class_name, since, until
+        )
+        if min_probability is not None:
+            statement = statement.where(scored.probability >= min_probability)
+        if max_probability is not None:
+            statement = statement.where(scored.probability <= max_probability)
+        if max_margin is not None:
+            statement = statement.where(margin <= max_margin)
+        if top_class_only:
+            statement = statement.where(scored.rank == 1)
+        if cursor:
+            statement = statement.where(
+                before_cursor(scored.created_at, scored.prediction_id, cursor)
+            )
+        statement = statement.order_by(
+            scored.created_at.desc(), scored.prediction_id.desc()
+        ).limit(limit)
+        return [row._asdict() for row in db.execute(statement)]
@@ -0,0 +1,143 @@
+"""
+Moving predictions from prediction_results to archived_prediction_results.
+
+A prediction is moved once its status is one of ARCHIVE_STATUSES or it is
+older than ARCHIVE_AFTER_DAYS, so that the history list, statistics and
+their indexes only cover recent rows. Each batch moves at most
+``batch_size`` rows in one transaction:
+
+- the rows are copied with INSERT ... SELECT, keeping their ids, then
+  deleted from prediction_results;
+- their counts move from prediction_counters to
+  archived_prediction_counters;
+- the search index keeps their entries (see app.db.search).
+
+A failed batch rolls back whole and is retried by the next run.
+
+``restore`` moves a single row back, for a recent prediction whose status
+is changed away from an archive status.
+"""
+
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.core.tracing import traced
+from app.db.archive import ensure_archive_partitions
+from app.db.models import ArchivedPredictionResult, PredictionResult
+from app.services.prediction_service import (
+    _bump_prediction_counter,
+    evict_user_statistics,
+)
+
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+# Batches per run, so one run can't hold the database for long
+ARCHIVE_MAX_BATCHES = int(os.getenv("ARCHIVE_MAX_BATCHES", "20"))
+ARCHIVE_STATUSES = ("archived",)
+
+
+class ArchiveService:
+    @staticmethod
+    @traced()
+    def archive_batch(
+        db: Session,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        now: Optional[datetime] = None,
+    ) -> int:
+        """Move up to ``batch_size`` due predictions; returns how many moved"""
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=ARCHIVE_AFTER_DAYS)
+        hot = PredictionResult.__table__
+
+        # The newest row always stays: SQLite hands out MAX(id) + 1 as the
+        # next id, which must never be an id already in the archive
+        newest_id = select(func.max(hot.c.id)).scalar_subquery()
+        due = (
+            select(hot.c.id, hot.c.user_id, hot.c.model_type, hot.c.status, hot.c.created_at)
+            .where(
+                or_(hot.c.status.in_(ARCHIVE_STATUSES), hot.c.created_at < cutoff),
+                hot.c.id < newest_id,
+            )
+            .order_by(hot.c.id)
+            .limit(batch_size)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            # Status changes can't slip in between reading and moving a row
+            due = due.with_for_update(skip_locked=True)
+
+        rows = db.execute(due).all()
+        if not rows:
+            db.rollback()
+            return 0
+        ids = [row.id for row in rows]
+
+        ensure_archive_partitions(db.connection(), (row.created_at for row in rows))
+        db.execute(
+            insert(ArchivedPredictionResult.__table__).from_select(
+                [column.name for column in hot.columns] + ["archived_at"],
+                select(*hot.columns, literal(now)).where(hot.c.id.in_(ids)),
+            )
+        )
+        db.execute(delete(hot).where(hot.c.id.in_(ids)))
+
+        moved = Counter((row.user_id, row.model_type, row.status) for row in rows)
+        for (user_id, model_type, status), count in moved.items():
+            _bump_prediction_counter(db, user_id, model_type, status, -count)
+            _bump_prediction_counter(db, user_id, model_type, status, count, archived=True)
+        db.commit()
+
+        for user_id in {row.user_id for row in rows}:
+            evict_user_statistics(user_id)
+        return len(rows)
+
+    @staticmethod
+    def is_due(status: str, created_at: datetime, now: Optional[datetime] = None) -> bool:
+        """Whether a prediction with this status and date belongs in the archive"""
+        now = now or datetime.utcnow()
+        return status in ARCHIVE_STATUSES or created_at < now - timedelta(days=ARCHIVE_AFTER_DAYS)
+
+    @staticmethod
+    @traced()
+    def restore(db: Session, row: ArchivedPredictionResult) -> PredictionResult:
+        """Move one archived row back to prediction_results; the caller commits.
+
+        The archive copy is deleted before the live one is inserted, so the
+        search and probability triggers drop its entries and write them
+        again instead of clashing on the id. Its count moves back from
+        archived_prediction_counters.
+        """
+        hot = PredictionResult.__table__
+        values = {column.name: getattr(row, column.name) for column in hot.columns}
+        db.expunge(row)
+        db.execute(
+            delete(ArchivedPredictionResult.__table__).where(
+                ArchivedPredictionResult.__table__.c.id == row.id
+            )
+        )
+        db.execute(insert(hot).values(**values))
+        _bump_prediction_counter(db, row.user_id, row.model_type, row.status, -1, archived=True)
+        _bump_prediction_counter(db, row.user_id, row.model_type, row.status, 1)
+        return db.get(PredictionResult, row.id)
+
+    @staticmethod
+    @traced()
+    def archive_due(
+        db: Session,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        max_batches: int = ARCHIVE_MAX_BATCHES,
+    ) -> dict:
+        """Run batches until nothing is due or ``max_batches`` have run"""
+        moved = batches = 0
+        while batches < max_batches:
+            count = ArchiveService.archive_batch(db, batch_size)
+            if count:
+                batches += 1
+                moved += count
+            if count < batch_size:
+                break
+        return {"moved": moved, "batches": batches}
@@ -8,6 +8,9 @@ from typing import List, Optional
 import logging
 from datetime import datetime
 
+from app.core.metrics import record_email_failure, track_email_send
+from app.core.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 class EmailService:
@@ -18,6 +21,7 @@ class EmailService:
         self.smtp_password = os.getenv("SMTP_PASSWORD")
         self.smtp_use_tls = os.getenv("SMTP_USE_TLS", "True").lower() == "true"
         
+    @traced()
     def send_medical_report_email(
         self,
         doctor_email: str,
@@ -72,19 +76,21 @@ class EmailService:
                 msg.attach(part)
             
             # Send email
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            if self.smtp_use_tls:
-                server.starttls()
-            server.login(self.smtp_user, self.smtp_password)
-            text = msg.as_string()
-            server.sendmail(self.smtp_user, doctor_email, text)
-            server.quit()
+            with track_email_send("medical_report"):
+                server = smtplib.SMTP(self.smtp_host, self.smtp_port)
+                if self.smtp_use_tls:
+                    server.starttls()
+                server.login(self.smtp_user, self.smtp_password)
+                text = msg.as_string()
+                server.sendmail(self.smtp_user, doctor_email, text)
+                server.quit()
             
             logger.info(f"Medical report email sent successfully to {doctor_email}")
             return True
             
         except Exception as e:
             logger.error(f"Failed to send medical report email: {str(e)}")
+            record_email_failure("medical_report")
             return False
     
     def _create_medical_email_template(
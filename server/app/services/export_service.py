@@ -0,0 +1,309 @@
+"""
+Streaming export of prediction history.
+
+Rows are read with ``yield_per`` (a server-side cursor on PostgreSQL) and
+written out one batch at a time, so an export holds one batch in memory
+however many rows it covers. Each row carries the prediction, its
+patient's name and one ``probability_<class>`` column per class seen in
+the exported rows. Archived predictions are merged in, in order, and
+flagged in the ``archived`` column.
+
+Formats: NDJSON, CSV and Parquet (needs pyarrow, the ``export`` extra).
+"""
+
+import csv
+import heapq
+import io
+import itertools
+import os
+import re
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+import orjson
+from sqlalchemy import func, literal, literal_column, select
+from sqlalchemy.orm import Session
+
+from app.db.models import ArchivedPredictionResult, Patient, PredictionResult
+
+# Rows fetched from the database, and written as one Parquet row group, at a time
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+# format: (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+EXPORT_COLUMNS = (
+    "id",
+    "user_id",
+    "patient_id",
+    "patient_name",
+    "model_type",
+    "prediction",
+    "confidence",
+    "entropy",
+    "status",
+    "message",
+    "notes",
+    "image_filename",
+    "created_at",
+    "updated_at",
+    "archived",
+)
+EXPORT_MODELS = (PredictionResult, ArchivedPredictionResult)
+
+
+def export_columns(model) -> list:
+    """EXPORT_COLUMNS selected from ``model``'s table"""
+    columns = []
+    for name in EXPORT_COLUMNS:
+        if name == "patient_name":
+            columns.append(Patient.full_name.label(name))
+        elif name == "archived":
+            columns.append(literal(model is ArchivedPredictionResult).label(name))
+        else:
+            columns.append(getattr(model, name))
+    return columns
+
+
+class ExportUnavailable(Exception):
+    """The requested format needs a package that is not installed"""
+
+
+def probability_column(class_name: str) -> str:
+    """``Glioma Tumor`` -> ``probability_glioma_tumor``"""
+    return "probability_" + re.sub(r"\W+", "_", class_name.lower()).strip("_")
+
+
+def probability_columns(classes: List[str]) -> Dict[str, str]:
+    """Column name per class name.
+
+    Class names that read the same once normalised (``Glioma Tumor`` and
+    ``glioma_tumor``) get ``_2``, ``_3``... suffixes in sorted order, so
+    no class silently overwrites another's column.
+    """
+    columns: Dict[str, str] = {}
+    used = set()
+    for name in sorted(classes):
+        base = column = probability_column(name)
+        suffix = 1
+        while column in used:
+            suffix += 1
+            column = f"{base}_{suffix}"
+        used.add(column)
+        columns[name] = column
+    return columns
+
+
+class PredictionExportService:
+    @staticmethod
+    def _filtered(
+        statement,
+        model=PredictionResult,
+        user_id: Optional[int] = None,
+        model_type: Optional[str] = None,
+        status: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+    ):
+        if user_id is not None:
+            statement = statement.where(model.user_id == user_id)
+        if model_type:
+            statement = statement.where(model.model_type == model_type)
+        if status:
+            statement = statement.where(model.status == status)
+        if since:
+            statement = statement.where(model.created_at >= since)
+        if until:
+            statement = statement.where(model.created_at < until)
+        return statement
+
+    @staticmethod
+    def probability_classes(db: Session, **filters) -> List[str]:
+        """Every class name in the probabilities of the rows to export.
+
+        CSV and Parquet need the full header before the first row, so this
+        runs as a separate pass; SQLite and PostgreSQL answer it with one
+        DISTINCT over the JSON keys per table. Rows whose probabilities
+        are missing or not a JSON object (stored as 'null') are skipped.
+        """
+        dialect = db.get_bind().dialect.name
+        classes = set()
+        for model in EXPORT_MODELS:
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "sqlite":
+                    keys = func.json_each(model.probabilities).table_valued("key")
+                    is_object = func.json_type(model.probabilities) == "object"
+                else:
+                    keys = func.json_object_keys(model.probabilities).table_valued("key")
+                    is_object = func.json_typeof(model.probabilities) == "object"
+                statement = (
+                    select(keys.c.key)
+                    .select_from(model)
+                    .join(keys, literal_column("true"))
+                    .where(is_object)
+                )
+                statement = PredictionExportService._filtered(statement, model, **filters)
+                classes.update(db.scalars(statement.distinct()))
+                continue
+
+            statement = PredictionExportService._filtered(
+                select(model.probabilities), model, **filters
+            )
+            for probabilities in db.scalars(
+                statement.execution_options(yield_per=EXPORT_BATCH_SIZE)
+            ):
+                if isinstance(probabilities, dict):
+                    classes.update(probabilities)
+        return sorted(classes)
+
+    @staticmethod
+    def iter_rows(db: Session, classes: List[str], **filters) -> Iterator[List[dict]]:
+        """Export rows as dicts, a batch at a time, oldest first.
+
+        The live and archive tables are read through a cursor each and
+        merged on the fly.
+        """
+        user_scoped = filters.get("user_id") is not None
+        results = []
+        for model in EXPORT_MODELS:
+            statement = (
+                select(*export_columns(model), model.probabilities)
+                .join(Patient, Patient.id == model.patient_id)
+            )
+            statement = PredictionExportService._filtered(statement, model, **filters)
+            if user_scoped:
+                # Matches the (user_id, created_at, id) indexes
+                statement = statement.order_by(model.created_at, model.id)
+            else:
+                statement = statement.order_by(model.id)
+            results.append(
+                db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+            )
+
+        if user_scoped:
+            rows = heapq.merge(*results, key=lambda row: (row.created_at, row.id))
+        else:
+            rows = heapq.merge(*results, key=lambda row: row.id)
+
+        columns = list(probability_columns(classes).items())
+        while True:
+            batch = []
+            for row in itertools.islice(rows, EXPORT_BATCH_SIZE):
+                record = row._asdict()
+                probabilities = record.pop("probabilities")
+                if not isinstance(probabilities, dict):
+                    probabilities = {}
+                for name, column in columns:
+                    record[column] = probabilities.get(name)
+                batch.append(record)
+            if not batch:
+                return
+            yield batch
+
+    @staticmethod
+    def field_names(classes: List[str]) -> List[str]:
+        return list(EXPORT_COLUMNS) + list(probability_columns(classes).values())
+
+    @staticmethod
+    def stream(db: Session, export_format: str, **filters) -> Iterator[bytes]:
+        """The export file, in chunks of about one batch.
+
+        The class names are read here; the rows only as the returned
+        iterator is consumed, by which time the response has started, so
+        check ``export_format`` with ``check_format`` first.
+        """
+        classes = PredictionExportService.probability_classes(db, **filters)
+        batches = PredictionExportService.iter_rows(db, classes, **filters)
+        fields = PredictionExportService.field_names(classes)
+        if export_format == "ndjson":
+            return _ndjson_chunks(batches)
+        if export_format == "csv":
+            return _csv_chunks(batches, fields)
+        return _parquet_chunks(batches, fields, classes)
+
+    @staticmethod
+    def check_format(export_format: str) -> None:
+        """Raise ExportUnavailable if ``export_format`` can't be produced here"""
+        if export_format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ExportUnavailable(
+                    "Parquet export needs pyarrow; install the server's 'export' extra"
+                )
+
+
+def _ndjson_chunks(batches: Iterator[List[dict]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield b"".join(orjson.dumps(record) + b"\n" for record in batch)
+
+
+def _csv_chunks(batches: Iterator[List[dict]], fields: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields)
+    writer.writeheader()
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _parquet_chunks(
+    batches: Iterator[List[dict]], fields: List[str], classes: List[str]
+) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types: Dict[str, "pa.DataType"] = {
+        "id": pa.int64(),
+        "user_id": pa.int64(),
+        "patient_id": pa.int64(),
+        "confidence": pa.float64(),
+        "entropy": pa.float64(),
+        "created_at": pa.timestamp("us"),
+        "updated_at": pa.timestamp("us"),
+        "archived": pa.bool_(),
+    }
+    for column in probability_columns(classes).values():
+        types[column] = pa.float64()
+    schema = pa.schema([(field, types.get(field, pa.string())) for field in fields])
+
+    sink = _ChunkSink()
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for batch in batches:
+            # One row group per batch
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            yield sink.drain()
+    # Footer
+    yield sink.drain()
@@ -0,0 +1,212 @@
+"""
+Bulk patient import from CSV or NDJSON.
+
+The file is read a row at a time and written ``IMPORT_BATCH_SIZE`` rows
+at a time: each batch is validated, checked for duplicates with one
+query on the (normalized_name, date_of_birth) index, inserted with one
+executemany and committed on its own. A batch that fails to insert is
+rolled back and reported without stopping the rest of the import.
+
+A row is a duplicate when a patient with the same normalized name (see
+app.utils.names) and date of birth already exists, or appeared earlier
+in the file.
+"""
+
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import and_, insert, or_, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.core.tracing import traced
+from app.db.models import Patient
+from app.schemas.prediction import PatientCreate
+from app.utils.names import normalize_name
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_FORMATS = ("csv", "ndjson")
+
+# (normalized name, date of birth)
+DuplicateKey = Tuple[str, Optional[datetime]]
+
+
+def _blocking_key(patient: PatientCreate) -> DuplicateKey:
+    birth = patient.date_of_birth
+    return (
+        normalize_name(patient.full_name) or "",
+        datetime.combine(birth, datetime.min.time()) if birth else None,
+    )
+
+
+def _csv_rows(stream: IO[bytes]) -> Iterator[dict]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    for row in csv.DictReader(text):
+        # Empty cells are missing values, not empty strings
+        yield {key: value for key, value in row.items() if key and value not in ("", None)}
+
+
+def _ndjson_rows(stream: IO[bytes]) -> Iterator[dict]:
+    for line in io.TextIOWrapper(stream, encoding="utf-8-sig"):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {"_error": f"Invalid JSON: {e}"}
+        yield row if isinstance(row, dict) else {"_error": "Expected a JSON object"}
+
+
+class PatientImportService:
+    @staticmethod
+    def parse(stream: IO[bytes], import_format: str) -> Iterator[Tuple[int, dict]]:
+        """(row number, raw fields) for each record; row 1 is the first record.
+
+        A record that can't be decoded comes back as {"_error": ...}. A file
+        that can't be read any further (bad CSV quoting, not UTF-8) ends
+        with one such record.
+        """
+        rows = _csv_rows(stream) if import_format == "csv" else _ndjson_rows(stream)
+        number = 0
+        try:
+            for number, row in enumerate(rows, start=1):
+                yield number, row
+        except (ValueError, csv.Error) as e:
+            yield number + 1, {"_error": f"Unreadable file: {e}"}
+
+    @staticmethod
+    def _existing(db: Session, keys: List[DuplicateKey]) -> Dict[DuplicateKey, int]:
+        """Ids of patients already stored under any of ``keys``"""
+        dated = [key for key in keys if key[1] is not None]
+        undated = [name for name, birth in keys if birth is None]
+        conditions = []
+        if dated:
+            conditions.append(
+                tuple_(Patient.normalized_name, Patient.date_of_birth).in_(dated)
+            )
+        if undated:
+            conditions.append(
+                and_(Patient.normalized_name.in_(undated), Patient.date_of_birth.is_(None))
+            )
+        if not conditions:
+            return {}
+        statement = select(
+            Patient.id, Patient.normalized_name, Patient.date_of_birth
+        ).where(or_(*conditions))
+        existing: Dict[DuplicateKey, int] = {}
+        for patient_id, name, birth in db.execute(statement):
+            existing.setdefault((name, birth), patient_id)
+        return existing
+
+    @staticmethod
+    def _write_batch(
+        db: Session,
+        batch: List[Tuple[int, PatientCreate]],
+        seen: Dict[DuplicateKey, dict],
+        skip_duplicates: bool,
+    ) -> List[dict]:
+        """Insert one batch in its own transaction; returns its report rows"""
+        keys = [_blocking_key(patient) for _, patient in batch]
+        existing = PatientImportService._existing(db, keys) if skip_duplicates else {}
+
+        report: List[dict] = []
+        to_insert: List[Tuple[dict, dict]] = []
+        # Rows of this batch; only added to ``seen`` once they are committed
+        pending: Dict[DuplicateKey, dict] = {}
+        repeats: List[dict] = []
+        now = datetime.utcnow()
+        for (number, patient), key in zip(batch, keys):
+            entry: dict = {"row": number}
+            report.append(entry)
+            if skip_duplicates and key in existing:
+                entry.update(status="duplicate", patient_id=existing[key])
+                continue
+            if skip_duplicates and key in seen:
+                entry.update(status="duplicate", duplicate_of_row=seen[key]["row"])
+                continue
+            if skip_duplicates and key in pending:
+                entry.update(status="duplicate", duplicate_of_row=pending[key]["row"])
+                repeats.append(entry)
+                continue
+            pending[key] = entry
+            values = patient.model_dump()
+            values.update(
+                normalized_name=key[0],
+                date_of_birth=key[1],
+                created_at=now,
+                updated_at=now,
+            )
+            to_insert.append((entry, values))
+
+        if not to_insert:
+            db.rollback()
+            return report
+        try:
+            # One executemany; RETURNING rows come back in parameter order
+            ids = db.scalars(
+                insert(Patient).returning(Patient.id, sort_by_parameter_order=True),
+                [values for _, values in to_insert],
+            ).all()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Repeats of a row that was never created fail with it
+            for entry in [entry for entry, _ in to_insert] + repeats:
+                entry.pop("duplicate_of_row", None)
+                entry.update(status="failed", errors=[str(e).splitlines()[0]])
+            return report
+        seen.update(pending)
+        for (entry, _), patient_id in zip(to_insert, ids):
+            entry.update(status="created", patient_id=patient_id)
+        return report
+
+    @staticmethod
+    @traced()
+    def import_patients(
+        db: Session,
+        stream: IO[bytes],
+        import_format: str,
+        skip_duplicates: bool = True,
+        batch_size: int = IMPORT_BATCH_SIZE,
+    ) -> dict:
+        """Create a patient for every valid, new row of ``stream``.
+
+        Returns counts per outcome and a report entry per row: ``created``
+        (with patient_id), ``duplicate`` (with the existing patient_id, or
+        duplicate_of_row for a repeat within the file), ``invalid`` (with
+        errors) or ``failed`` (its batch could not be written, or it repeats
+        a row of that batch).
+        """
+        rows: List[dict] = []
+        batch: List[Tuple[int, PatientCreate]] = []
+        seen: Dict[DuplicateKey, dict] = {}
+
+        for number, fields in PatientImportService.parse(stream, import_format):
+            if "_error" in fields:
+                rows.append({"row": number, "status": "invalid", "errors": [fields["_error"]]})
+                continue
+            try:
+                patient = PatientCreate.model_validate(fields)
+            except ValidationError as e:
+                errors = [
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                    for error in e.errors()
+                ]
+                rows.append({"row": number, "status": "invalid", "errors": errors})
+                continue
+            batch.append((number, patient))
+            if len(batch) >= batch_size:
+                rows.extend(PatientImportService._write_batch(db, batch, seen, skip_duplicates))
+                batch = []
+        if batch:
+            rows.extend(PatientImportService._write_batch(db, batch, seen, skip_duplicates))
+
+        rows.sort(key=lambda entry: entry["row"])
+        counts = {"created": 0, "duplicate": 0, "invalid": 0, "failed": 0}
+        for entry in rows:
+            counts[entry["status"]] += 1
+        return {"total": len(rows), **counts, "rows": rows}
@@ -4,6 +4,7 @@ OTP Service for handling OTP operations separately from user data
 
 from datetime import datetime, timedelta
 from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.db.models import User, OTPCode, OTPType
@@ -152,3 +153,44 @@ class OTPService:
             query = query.filter(OTPCode.otp_type == otp_type)
 
         return query.order_by(OTPCode.created_at.desc()).all()
+
+
+class AsyncOTPService:
+    """OTPService for handlers holding an AsyncSession.
+
+    Each call runs the OTPService method on the session's sync facade
+    through run_sync, so the queries use the async driver.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _run(self, method: str, *args, **kwargs):
+        return await self.db.run_sync(
+            lambda session: getattr(OTPService(session), method)(*args, **kwargs)
+        )
+
+    async def create_otp(
+        self, user: User, otp_type: OTPType, expires_in_minutes: int = 10
+    ) -> str:
+        return await self._run("create_otp", user, otp_type, expires_in_minutes)
+
+    async def verify_otp(self, user: User, otp_code: str, otp_type: OTPType) -> bool:
+        return await self._run("verify_otp", user, otp_code, otp_type)
+
+    async def is_otp_valid(self, user: User, otp_code: str, otp_type: OTPType) -> bool:
+        return await self._run("is_otp_valid", user, otp_code, otp_type)
+
+    async def cleanup_expired_otps(self) -> int:
+        return await self._run("cleanup_expired_otps")
+
+    async def cleanup_old_used_otps(self, days_old: int = 7) -> int:
+        return await self._run("cleanup_old_used_otps", days_old)
+
+    async def get_otp_statistics(self) -> dict:
+        return await self._run("get_otp_statistics")
+
+    async def get_user_active_otps(
+        self, user: User, otp_type: Optional[OTPType] = None
+    ) -> list:
+        return await self._run("get_user_active_otps", user, otp_type)
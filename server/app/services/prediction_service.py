@@ -1,40 +1,135 @@
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import desc, and_, or_, func
-from typing import Optional, List
-from datetime import datetime
+from sqlalchemy import (
+    case,
+    delete,
+    desc,
+    and_,
+    or_,
+    func,
+    insert,
+    literal_column,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from typing import Optional, List, Tuple
+from datetime import datetime, timedelta
+import functools
+import heapq
+import itertools
 import os
 from uuid import uuid4
+from collections import Counter
 
-from app.db.models import Patient, PredictionResult, User
+from app.core.cache import TTLCache
+from app.core.timing import timed_stage
+from app.core.tracing import traced
+from app.db.models import (
+    ArchivedPredictionCounter,
+    ArchivedPredictionResult,
+    Patient,
+    PredictionCounter,
+    PredictionResult,
+    User,
+)
+from app.db import search as search_index
+from app.db.replica import record_user_write
+from app.db.search import apply_prediction_search
 from app.schemas.prediction import (
     PatientCreate,
     PatientUpdate,
     PredictionResultCreate,
     PredictionResultUpdate,
 )
+from app.utils.names import normalize_name, prefix_upper_bound
+from app.utils.pagination import before_cursor
+
+DEFAULT_MODEL_TYPES = ("tumor", "chest_xray")
+DEFAULT_STATUSES = ("pending", "reviewed", "archived")
+CONFIDENCE_BUCKET_EDGES = tuple(i / 10 for i in range(11))
+
+# Per-user statistics are served from here for a few seconds; the user's
+# own writes evict their entries straight away
+statistics_cache = TTLCache(
+    "prediction_statistics", float(os.getenv("STATISTICS_CACHE_SECONDS", "10"))
+)
+
+
+def evict_user_statistics(user_id: int) -> None:
+    statistics_cache.evict(lambda key: key[0] == user_id)
+
+
+# Typeahead results, per user and query; any patient write clears it
+patient_lookup_cache = TTLCache(
+    "patient_lookup", float(os.getenv("PATIENT_LOOKUP_CACHE_SECONDS", "5"))
+)
+# Prefix matches read per result slot, so ranking can reorder a small window
+LOOKUP_CANDIDATES_PER_RESULT = 4
+
+
+def _bump_prediction_counter(
+    db: Session,
+    user_id: int,
+    model_type: str,
+    status: str,
+    delta: int,
+    archived: bool = False,
+) -> None:
+    """Add ``delta`` to a user's counter, inside the caller's transaction.
+
+    ``archived`` picks the counter of archived_prediction_results.
+    """
+    table = (ArchivedPredictionCounter if archived else PredictionCounter).__table__
+    key = {"user_id": user_id, "model_type": model_type, "status": status}
+    dialect = db.get_bind().dialect.name
+
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite_insert if dialect == "sqlite" else postgresql_insert
+        statement = dialect_insert(table).values(**key, count=delta)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(key), set_={"count": table.c.count + delta}
+        )
+        db.execute(statement)
+        return
+
+    updated = db.execute(
+        update(table)
+        .where(*(table.c[name] == value for name, value in key.items()))
+        .values(count=table.c.count + delta)
+    )
+    if updated.rowcount == 0:
+        db.execute(insert(table).values(**key, count=delta))
 
 
 class PatientService:
     @staticmethod
+    @traced()
     def create_patient(db: Session, patient_data: PatientCreate) -> Patient:
         """Create a new patient record"""
         db_patient = Patient(**patient_data.model_dump())
         db.add(db_patient)
         db.commit()
+        patient_lookup_cache.clear()
         db.refresh(db_patient)
         return db_patient
 
     @staticmethod
+    @traced()
     def get_patient(db: Session, patient_id: int) -> Optional[Patient]:
         """Get patient by ID"""
         return db.query(Patient).filter(Patient.id == patient_id).first()
 
     @staticmethod
+    @traced()
     def get_patients(db: Session, skip: int = 0, limit: int = 100) -> List[Patient]:
         """Get all patients with pagination"""
         return db.query(Patient).offset(skip).limit(limit).all()
 
     @staticmethod
+    @traced()
     def update_patient(
         db: Session, patient_id: int, patient_data: PatientUpdate
     ) -> Optional[Patient]:
@@ -45,20 +140,24 @@ class PatientService:
             for field, value in update_data.items():
                 setattr(db_patient, field, value)
             db.commit()
+            patient_lookup_cache.clear()
             db.refresh(db_patient)
         return db_patient
 
     @staticmethod
+    @traced()
     def delete_patient(db: Session, patient_id: int) -> bool:
         """Delete a patient record"""
         db_patient = db.query(Patient).filter(Patient.id == patient_id).first()
         if db_patient:
             db.delete(db_patient)
             db.commit()
+            patient_lookup_cache.clear()
             return True
         return False
 
     @staticmethod
+    @traced()
     def search_patients(
         db: Session, query: str, skip: int = 0, limit: int = 100
     ) -> List[Patient]:
@@ -71,9 +170,139 @@ class PatientService:
             .all()
         )
 
+    @staticmethod
+    @traced()
+    def lookup_patients(db: Session, query: str, limit: int = 8) -> list:
+        """Typeahead: patients whose normalized name starts with ``query``.
+
+        Reads a short window of the normalized-name index in name order and
+        ranks it: exact name, then names where the query is a whole first
+        word, then the rest alphabetically. With the PostgreSQL trigram index
+        and three or more characters, matches anywhere in the name are found
+        and ordered by similarity instead. Returns lightweight rows.
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+
+        columns = (
+            Patient.id,
+            Patient.full_name,
+            Patient.date_of_birth,
+            Patient.gender,
+            Patient.normalized_name,
+        )
+        if (
+            search_index.trigram_lookup
+            and db.get_bind().dialect.name == "postgresql"
+            and len(key) >= 3
+        ):
+            pattern = "%" + key.replace("_", "\\_") + "%"
+            statement = (
+                select(*columns)
+                .where(Patient.normalized_name.like(pattern, escape="\\"))
+                .order_by(Patient.normalized_name.op("<->")(key), Patient.id)
+                .limit(limit)
+            )
+            return db.execute(statement).all()
+
+        statement = (
+            select(*columns)
+            .where(
+                Patient.normalized_name >= key,
+                Patient.normalized_name < prefix_upper_bound(key),
+            )
+            .order_by(Patient.normalized_name, Patient.id)
+            .limit(limit * LOOKUP_CANDIDATES_PER_RESULT)
+        )
+        candidates = db.execute(statement).all()
+        candidates.sort(
+            key=lambda row: (
+                row.normalized_name != key,
+                not row.normalized_name.startswith(key + " "),
+                row.normalized_name,
+            )
+        )
+        return candidates[:limit]
+
+
+# What a history list row shows; the full record is one click away
+HISTORY_SUMMARY_COLUMNS = (
+    PredictionResult.id,
+    PredictionResult.patient_id,
+    PredictionResult.image_filename,
+    PredictionResult.model_type,
+    PredictionResult.prediction,
+    PredictionResult.confidence,
+    PredictionResult.entropy,
+    PredictionResult.status,
+    PredictionResult.notes,
+    PredictionResult.created_at,
+)
+HISTORY_SUMMARY_PATIENT_FIELDS = ("full_name", "date_of_birth", "gender")
+
 
 class PredictionService:
     @staticmethod
+    def _filtered_history_query(
+        db: Session,
+        user_id: int,
+        model_type: Optional[str] = None,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+        model=PredictionResult,
+    ):
+        """A user's predictions narrowed by the history filters.
+
+        Also returns the relevance ordering for the search, if any.
+        ``model=ArchivedPredictionResult`` queries the archive instead.
+        """
+        query = db.query(model).filter(model.user_id == user_id)
+
+        if model_type:
+            query = query.filter(model.model_type == model_type)
+
+        if status:
+            query = query.filter(model.status == status)
+
+        rank = None
+        if search:
+            # Full-text match on patient name, prediction result and notes
+            query, rank = apply_prediction_search(
+                query, search, db.get_bind().dialect.name, model
+            )
+
+        return query, rank
+
+    @staticmethod
+    def _history_models(include_archived: bool) -> tuple:
+        if include_archived:
+            return (PredictionResult, ArchivedPredictionResult)
+        return (PredictionResult,)
+
+    @staticmethod
+    def _merged_history_page(queries, skip, limit, cursor) -> list:
+        """One newest-first page across the hot and archive tables.
+
+        ``queries`` pairs each table's filtered query with its model. Each
+        table is read up to the end of the page through its own
+        (owner, created_at, id) index, and the two runs are merged.
+        """
+        if cursor:
+            skip = 0
+        pages = [
+            PredictionService._history_page(
+                query, None, 0, skip + limit, cursor, False, model
+            ).all()
+            for query, model in queries
+        ]
+        merged = heapq.merge(
+            *pages, key=lambda row: (row.created_at, row.id), reverse=True
+        )
+        return list(itertools.islice(merged, skip, skip + limit))
+
+    @staticmethod
+    @traced()
     def save_prediction_result(
         db: Session,
         prediction_data: PredictionResultCreate,
@@ -83,26 +312,74 @@ class PredictionService:
         # Generate unique filename if not provided
         if image_file_path:
             prediction_data.image_path = image_file_path
+        return PredictionService.save_predictions(db, [prediction_data])[0]
 
-        db_result = PredictionResult(**prediction_data.model_dump())
-        db.add(db_result)
-        db.commit()
-        db.refresh(db_result)
-        return db_result
+    @staticmethod
+    @traced()
+    def save_predictions(
+        db: Session,
+        predictions: List[PredictionResultCreate],
+        new_patient: Optional[PatientCreate] = None,
+    ) -> List[PredictionResult]:
+        """Save an upload's predictions, and the patient it creates, in one transaction.
+
+        With ``new_patient`` the predictions are filed under that new
+        patient, whatever their patient_id. One flush inserts the patient
+        and then every prediction, their ids coming back from RETURNING,
+        and one commit ends it, so a failure leaves neither behind.
+        """
+        db_patient = Patient(**new_patient.model_dump()) if new_patient else None
+        db_results = []
+        for prediction_data in predictions:
+            db_result = PredictionResult(**prediction_data.model_dump())
+            if db_patient is not None:
+                db_result.patient = db_patient
+            db_results.append(db_result)
+        if db_patient is not None:
+            db.add(db_patient)
+        db.add_all(db_results)
+
+        try:
+            with timed_stage("db_flush"):
+                db.flush()
+            counts = Counter(
+                (db_result.user_id, db_result.model_type, db_result.status)
+                for db_result in db_results
+            )
+            for (user_id, model_type, status), count in counts.items():
+                _bump_prediction_counter(db, user_id, model_type, status, count)
+            with timed_stage("db_commit"):
+                db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        if db_patient is not None:
+            patient_lookup_cache.clear()
+        for user_id in {user_id for user_id, _, _ in counts}:
+            evict_user_statistics(user_id)
+            record_user_write(user_id)
+        return db_results
 
     @staticmethod
+    @traced()
     def get_prediction_result(
         db: Session, result_id: int
     ) -> Optional[PredictionResult]:
-        """Get a single prediction result by ID"""
-        return (
-            db.query(PredictionResult)
-            .filter(PredictionResult.id == result_id)
-            .options(joinedload(PredictionResult.patient))
-            .first()
-        )
+        """Get a single prediction result by ID, from the archive if it was moved"""
+        for model in PredictionService._history_models(include_archived=True):
+            result = (
+                db.query(model)
+                .filter(model.id == result_id)
+                .options(joinedload(model.patient))
+                .first()
+            )
+            if result is not None:
+                return result
+        return None
 
     @staticmethod
+    @traced()
     def get_user_prediction_history(
         db: Session,
         user_id: int,
@@ -111,113 +388,462 @@ class PredictionService:
         model_type: Optional[str] = None,
         status: Optional[str] = None,
         search: Optional[str] = None,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        by_relevance: bool = False,
+        include_archived: bool = False,
     ) -> List[PredictionResult]:
-        """Get prediction history for a specific user"""
-        query = (
-            db.query(PredictionResult)
-            .filter(PredictionResult.user_id == user_id)
-            .options(joinedload(PredictionResult.patient))
-        )
+        """Get prediction history for a specific user.
 
-        if model_type:
-            query = query.filter(PredictionResult.model_type == model_type)
+        With a ``cursor`` (the created_at and id of the last row already
+        seen) the page starts right after it and ``skip`` is ignored.
+        ``by_relevance`` puts the best search matches first; cursors only
+        apply to the default newest-first order.
 
-        if status:
-            query = query.filter(PredictionResult.status == status)
+        Only prediction_results is read unless ``include_archived``, which
+        merges in archived_prediction_results (newest first only; the
+        relevance order is not comparable across the two tables).
+        """
+        queries = []
+        for model in PredictionService._history_models(include_archived):
+            query, rank = PredictionService._filtered_history_query(
+                db, user_id, model_type, status, search, model
+            )
+            queries.append((query.options(joinedload(model.patient)), model))
 
-        if search:
-            # Search in patient name, prediction result, or notes
-            search_term = f"%{search.lower()}%"
-            query = query.join(Patient).filter(
-                or_(
-                    func.lower(Patient.full_name).like(search_term),
-                    func.lower(PredictionResult.prediction).like(search_term),
-                    func.lower(PredictionResult.notes).like(search_term),
-                )
+        if include_archived:
+            return PredictionService._merged_history_page(queries, skip, limit, cursor)
+        return PredictionService._history_page(
+            queries[0][0], rank, skip, limit, cursor, by_relevance
+        ).all()
+
+    @staticmethod
+    @traced()
+    def get_user_prediction_summaries(
+        db: Session,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 20,
+        model_type: Optional[str] = None,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        by_relevance: bool = False,
+        include_archived: bool = False,
+    ) -> List[dict]:
+        """get_user_prediction_history for list views, as plain dicts.
+
+        Selects only HISTORY_SUMMARY_COLUMNS and HISTORY_SUMMARY_PATIENT_FIELDS,
+        so no ORM objects are built and the large
+        columns (probabilities, message, patient address and history) are
+        never read.
+        """
+        patient_columns = [
+            getattr(Patient, field).label(f"patient_{field}")
+            for field in HISTORY_SUMMARY_PATIENT_FIELDS
+        ]
+        queries = []
+        for model in PredictionService._history_models(include_archived):
+            query, rank = PredictionService._filtered_history_query(
+                db, user_id, model_type, status, search, model
+            )
+            query = query.join(Patient, Patient.id == model.patient_id).with_entities(
+                *(getattr(model, column.key) for column in HISTORY_SUMMARY_COLUMNS),
+                *patient_columns,
             )
+            queries.append((query, model))
 
-        return (
-            query.order_by(desc(PredictionResult.created_at))
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        if include_archived:
+            rows = PredictionService._merged_history_page(queries, skip, limit, cursor)
+        else:
+            rows = PredictionService._history_page(
+                queries[0][0], rank, skip, limit, cursor, by_relevance
+            ).all()
+
+        summaries = []
+        for row in rows:
+            summary = row._asdict()
+            patient = {"id": summary["patient_id"]}
+            for field in HISTORY_SUMMARY_PATIENT_FIELDS:
+                patient[field] = summary.pop(f"patient_{field}")
+            summary["patient"] = patient
+            summaries.append(summary)
+        return summaries
+
+    @staticmethod
+    def _history_page(
+        query, rank, skip, limit, cursor, by_relevance, model=PredictionResult
+    ):
+        """Order a history query newest first (or by ``rank``) and cut a page"""
+        if by_relevance and rank is not None:
+            cursor = None
+            query = query.order_by(rank)
+        query = query.order_by(desc(model.created_at), desc(model.id))
+        if cursor:
+            query = query.filter(before_cursor(model.created_at, model.id, cursor))
+        else:
+            query = query.offset(skip)
+        return query.limit(limit)
 
     @staticmethod
+    @traced()
     def get_patient_prediction_history(
-        db: Session, patient_id: int, skip: int = 0, limit: int = 20
+        db: Session,
+        patient_id: int,
+        skip: int = 0,
+        limit: int = 20,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        include_archived: bool = False,
     ) -> List[PredictionResult]:
-        """Get prediction history for a specific patient"""
-        return (
-            db.query(PredictionResult)
-            .filter(PredictionResult.patient_id == patient_id)
-            .options(joinedload(PredictionResult.patient))
-            .order_by(desc(PredictionResult.created_at))
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+        """Get prediction history for a specific patient.
+
+        ``include_archived`` merges in archived_prediction_results.
+        """
+        queries = [
+            (
+                db.query(model)
+                .filter(model.patient_id == patient_id)
+                .options(joinedload(model.patient)),
+                model,
+            )
+            for model in PredictionService._history_models(include_archived)
+        ]
+        if include_archived:
+            return PredictionService._merged_history_page(queries, skip, limit, cursor)
+        return PredictionService._history_page(
+            queries[0][0], None, skip, limit, cursor, False
+        ).all()
 
     @staticmethod
+    @traced()
     def update_prediction_result(
         db: Session, result_id: int, update_data: PredictionResultUpdate
     ) -> Optional[PredictionResult]:
-        """Update a prediction result (e.g., add notes, change status)"""
-        db_result = (
-            db.query(PredictionResult).filter(PredictionResult.id == result_id).first()
-        )
+        """Update a prediction result (e.g., add notes, change status).
+
+        Archived rows are updated where they are, except that a recent row
+        given a non-archive status moves back to prediction_results in the
+        same transaction. A row given the "archived" status moves on the
+        next archive run.
+        """
+        from app.services.archive_service import ArchiveService
+
+        db_result = None
+        for model in PredictionService._history_models(include_archived=True):
+            db_result = db.query(model).filter(model.id == result_id).first()
+            if db_result is not None:
+                break
         if db_result:
+            archived = isinstance(db_result, ArchivedPredictionResult)
             update_fields = update_data.model_dump(exclude_unset=True)
+            owner_id = db_result.user_id
+            new_status = update_fields.get("status")
+            if (
+                archived
+                and new_status is not None
+                and not ArchiveService.is_due(new_status, db_result.created_at)
+            ):
+                db_result = ArchiveService.restore(db, db_result)
+                archived = False
+            if new_status is not None and new_status != db_result.status:
+                _bump_prediction_counter(
+                    db,
+                    db_result.user_id,
+                    db_result.model_type,
+                    db_result.status,
+                    -1,
+                    archived,
+                )
+                _bump_prediction_counter(
+                    db, db_result.user_id, db_result.model_type, new_status, 1, archived
+                )
             for field, value in update_fields.items():
                 setattr(db_result, field, value)
             db.commit()
+            evict_user_statistics(owner_id)
+            record_user_write(owner_id)
             db.refresh(db_result)
         return db_result
 
     @staticmethod
-    def get_prediction_statistics(db: Session, user_id: Optional[int] = None) -> dict:
-        """Get prediction statistics"""
-        query = db.query(PredictionResult)
+    @traced()
+    def get_prediction_statistics(
+        db: Session, user_id: Optional[int] = None, days: int = 30
+    ) -> dict:
+        """Get prediction statistics.
+
+        Three grouped queries regardless of how many model types, statuses
+        or classes exist: the model type/status breakdown (from the counter
+        tables when scoped to a user), daily counts over the last ``days``
+        days, and a confidence histogram per predicted class.
+
+        Totals and daily counts include archived predictions; the
+        histograms only cover prediction_results, so the dashboard never
+        scans the archive.
+        """
         if user_id:
-            query = query.filter(PredictionResult.user_id == user_id)
+            breakdown = union_all(
+                *(
+                    select(counter.model_type, counter.status, counter.count).where(
+                        counter.user_id == user_id
+                    )
+                    for counter in (PredictionCounter, ArchivedPredictionCounter)
+                )
+            )
+        else:
+            breakdown = union_all(
+                *(
+                    select(model.model_type, model.status, func.count()).group_by(
+                        model.model_type, model.status
+                    )
+                    for model in (PredictionResult, ArchivedPredictionResult)
+                )
+            )
 
-        total_predictions = query.count()
+        # Always report the built-in types and statuses, even at zero
+        model_stats = {model_type: 0 for model_type in DEFAULT_MODEL_TYPES}
+        status_stats = {status: 0 for status in DEFAULT_STATUSES}
+        for model_type, status, count in db.execute(breakdown):
+            if not count:
+                continue
+            model_stats[model_type] = model_stats.get(model_type, 0) + count
+            status_stats[status] = status_stats.get(status, 0) + count
 
-        # Count by model type
-        model_stats = {}
-        for model_type in ["tumor", "chest_xray"]:
-            count = query.filter(PredictionResult.model_type == model_type).count()
-            model_stats[model_type] = count
+        scope = [PredictionResult.user_id == user_id] if user_id else []
 
-        # Count by status
-        status_stats = {}
-        for status in ["pending", "reviewed", "archived"]:
-            count = query.filter(PredictionResult.status == status).count()
-            status_stats[status] = count
+        today = datetime.utcnow().date()
+        first_day = today - timedelta(days=days - 1)
+        window_start = datetime.combine(first_day, datetime.min.time())
+        in_window = union_all(
+            *(
+                select(model.created_at).where(
+                    *([model.user_id == user_id] if user_id else []),
+                    model.created_at >= window_start,
+                )
+                for model in (PredictionResult, ArchivedPredictionResult)
+            )
+        ).subquery()
+        day = func.date(in_window.c.created_at)
+        daily_rows = db.execute(select(day, func.count()).group_by(day))
+        daily = {str(row_day): count for row_day, count in daily_rows}
+        daily_counts = [
+            {"date": current.isoformat(), "count": daily.get(current.isoformat(), 0)}
+            for current in (first_day + timedelta(days=i) for i in range(days))
+        ]
+
+        # Bucket i covers [i/10, (i+1)/10); a confidence of exactly 1 joins the last
+        # (inlined literals keep the expression identical in SELECT and GROUP BY)
+        bucket = case(
+            *(
+                (
+                    PredictionResult.confidence < literal_column(str(edge)),
+                    literal_column(str(index)),
+                )
+                for index, edge in enumerate(CONFIDENCE_BUCKET_EDGES[1:-1])
+            ),
+            else_=literal_column(str(len(CONFIDENCE_BUCKET_EDGES) - 2)),
+        )
+        histogram_rows = db.execute(
+            select(
+                PredictionResult.model_type,
+                PredictionResult.prediction,
+                bucket,
+                func.count(),
+            )
+            .where(*scope)
+            .group_by(PredictionResult.model_type, PredictionResult.prediction, bucket)
+        )
+        histograms: dict = {}
+        for model_type, prediction, index, count in histogram_rows:
+            per_class = histograms.setdefault(model_type, {})
+            counts = per_class.setdefault(
+                prediction, [0] * (len(CONFIDENCE_BUCKET_EDGES) - 1)
+            )
+            counts[index] += count
 
         return {
-            "total_predictions": total_predictions,
+            "total_predictions": sum(model_stats.values()),
             "by_model_type": model_stats,
             "by_status": status_stats,
+            "daily_counts": daily_counts,
+            "confidence_buckets": list(CONFIDENCE_BUCKET_EDGES),
+            "confidence_histograms": histograms,
         }
 
     @staticmethod
-    def count_user_predictions(db: Session, user_id: int) -> int:
-        """Count total predictions for a user"""
-        return (
-            db.query(PredictionResult)
-            .filter(PredictionResult.user_id == user_id)
-            .count()
-        )
+    @traced()
+    def count_user_predictions(
+        db: Session,
+        user_id: int,
+        model_type: Optional[str] = None,
+        status: Optional[str] = None,
+        search: Optional[str] = None,
+        include_archived: bool = False,
+    ) -> int:
+        """Count a user's predictions matching the history filters.
+
+        Model type and status filters are answered from prediction_counters
+        (and archived_prediction_counters with ``include_archived``); only
+        a free-text search has to count the matching rows. Either way it
+        is one statement.
+        """
+        models = PredictionService._history_models(include_archived)
+        if search:
+            matches = [
+                PredictionService._filtered_history_query(
+                    db, user_id, model_type, status, search, model
+                )[0]
+                .with_entities(model.id)
+                .statement
+                for model in models
+            ]
+            matching = union_all(*matches).subquery()
+            return int(
+                db.execute(select(func.count()).select_from(matching)).scalar_one()
+            )
+
+        counters = (PredictionCounter, ArchivedPredictionCounter)
+        counts = []
+        for counter in counters if include_archived else counters[:1]:
+            count = select(counter.count).where(counter.user_id == user_id)
+            if model_type:
+                count = count.where(counter.model_type == model_type)
+            if status:
+                count = count.where(counter.status == status)
+            counts.append(count)
+        counted = union_all(*counts).subquery()
+        query = select(func.coalesce(func.sum(counted.c.count), 0))
+        return int(db.execute(query).scalar_one())
+
+    @staticmethod
+    @traced()
+    def rebuild_prediction_counters(db: Session, user_id: Optional[int] = None) -> None:
+        """Recompute the counters from prediction_results and its archive.
+
+        Needed once for rows written before the counters existed, or after
+        editing the prediction tables outside PredictionService.
+        """
+        for counter, model in (
+            (PredictionCounter, PredictionResult),
+            (ArchivedPredictionCounter, ArchivedPredictionResult),
+        ):
+            counters = counter.__table__
+            clear = delete(counters)
+            totals = select(
+                model.user_id, model.model_type, model.status, func.count()
+            ).group_by(model.user_id, model.model_type, model.status)
+            if user_id is not None:
+                clear = clear.where(counters.c.user_id == user_id)
+                totals = totals.where(model.user_id == user_id)
+
+            db.execute(clear)
+            db.execute(
+                insert(counters).from_select(
+                    ["user_id", "model_type", "status", "count"], totals
+                )
+            )
+        db.commit()
 
     @staticmethod
+    @traced()
     def count_patient_predictions(db: Session, patient_id: int) -> int:
-        """Count total predictions for a patient"""
-        return (
-            db.query(PredictionResult)
-            .filter(PredictionResult.patient_id == patient_id)
-            .count()
-        )
+        """Count total predictions for a patient, archived ones included"""
+        counts = [
+            select(func.count())
+            .select_from(model)
+            .where(model.patient_id == patient_id)
+            .scalar_subquery()
+            for model in (PredictionResult, ArchivedPredictionResult)
+        ]
+        return int(db.execute(select(counts[0] + counts[1])).scalar_one())
+
+    @staticmethod
+    @traced()
+    def get_patient_prediction_breakdown(db: Session, patient_id: int) -> dict:
+        """A patient's prediction counts and latest date, archived ones included.
+
+        One grouped query over both prediction tables, on their
+        (patient_id, created_at) indexes.
+        """
+        rows = union_all(
+            *(
+                select(model.model_type, model.status, model.created_at).where(
+                    model.patient_id == patient_id
+                )
+                for model in (PredictionResult, ArchivedPredictionResult)
+            )
+        ).subquery()
+        grouped = select(
+            rows.c.model_type,
+            rows.c.status,
+            func.count().label("count"),
+            func.max(rows.c.created_at).label("last_created_at"),
+        ).group_by(rows.c.model_type, rows.c.status)
+
+        by_model_type: dict = {}
+        by_status: dict = {}
+        last_analysis_at = None
+        for model_type, status, count, last_created_at in db.execute(grouped):
+            by_model_type[model_type] = by_model_type.get(model_type, 0) + count
+            by_status[status] = by_status.get(status, 0) + count
+            if last_analysis_at is None or last_created_at > last_analysis_at:
+                last_analysis_at = last_created_at
+        return {
+            "total_predictions": sum(by_model_type.values()),
+            "by_model_type": by_model_type,
+            "by_status": by_status,
+            "last_analysis_at": last_analysis_at,
+        }
+
+
+def on_async_session(method):
+    """Expose a sync service method to AsyncSession callers.
+
+    The method runs through ``AsyncSession.run_sync``: its queries go over
+    the async driver without blocking the event loop, and each query still
+    has a single implementation shared by sync and async handlers.
+    """
+
+    @functools.wraps(method)
+    async def run(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(method, *args, **kwargs)
+
+    return staticmethod(run)
+
+
+class AsyncPatientService:
+    """PatientService for handlers holding an AsyncSession"""
+
+    create_patient = on_async_session(PatientService.create_patient)
+    get_patient = on_async_session(PatientService.get_patient)
+    get_patients = on_async_session(PatientService.get_patients)
+    update_patient = on_async_session(PatientService.update_patient)
+    delete_patient = on_async_session(PatientService.delete_patient)
+    search_patients = on_async_session(PatientService.search_patients)
+    lookup_patients = on_async_session(PatientService.lookup_patients)
+
+
+class AsyncPredictionService:
+    """PredictionService for handlers holding an AsyncSession"""
+
+    save_prediction_result = on_async_session(PredictionService.save_prediction_result)
+    save_predictions = on_async_session(PredictionService.save_predictions)
+    get_prediction_result = on_async_session(PredictionService.get_prediction_result)
+    get_user_prediction_history = on_async_session(
+        PredictionService.get_user_prediction_history
+    )
+    get_patient_prediction_history = on_async_session(
+        PredictionService.get_patient_prediction_history
+    )
+    update_prediction_result = on_async_session(
+        PredictionService.update_prediction_result
+    )
+    get_prediction_statistics = on_async_session(
+        PredictionService.get_prediction_statistics
+    )
+    count_user_predictions = on_async_session(PredictionService.count_user_predictions)
+    count_patient_predictions = on_async_session(
+        PredictionService.count_patient_predictions
+    )
 
 
 def save_uploaded_file(
@@ -0,0 +1,143 @@
+"""
+CPU inference settings chosen by the offline benchmark (``python -m app.bench``).
+
+The server reads models/inference_config.json (override with
+INFERENCE_CONFIG_PATH) at startup to set the torch thread pools and to
+prepare each model with the chosen precision and memory format. The
+benchmark writes a candidate file next to it, to be reviewed and copied
+over. Without the file everything stays at the PyTorch defaults.
+
+A bf16 or int8 entry is only applied if it records the accuracy check
+against fp32 that approved it (see app.bench); otherwise that model runs
+in fp32.
+"""
+
+import json
+import logging
+import os
+from typing import Optional
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+PRECISIONS = ("fp32", "bf16", "int8")
+MEMORY_FORMATS = ("contiguous", "channels_last")
+
+_SERVER_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_CONFIG_PATH = os.path.join(_SERVER_ROOT, "models", "inference_config.json")
+
+_config_cache: Optional[dict] = None
+
+
+class InferenceModel(nn.Module):
+    """Runs a model with a given input memory format and compute precision.
+
+    Wrapping keeps the call sites unchanged: they still pass a float32 NCHW
+    batch and get float32 logits back.
+    """
+
+    def __init__(self, model: nn.Module, precision: str = "fp32", memory_format: str = "contiguous"):
+        super().__init__()
+        self.model = model
+        self.precision = precision
+        self.memory_format = memory_format
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        if self.memory_format == "channels_last":
+            x = x.contiguous(memory_format=torch.channels_last)
+        if self.precision == "bf16":
+            with torch.autocast("cpu", dtype=torch.bfloat16):
+                return self.model(x).float()
+        return self.model(x)
+
+
+def prepare_model(model: nn.Module, precision: str = "fp32", memory_format: str = "contiguous") -> nn.Module:
+    """Return ``model`` converted for the requested precision and memory format.
+
+    Args:
+        model (torch.nn.Module): model with its weights already loaded.
+        precision (str): one of "fp32", "bf16" (autocast) or "int8"
+            (dynamic quantization of the Linear layers).
+        memory_format (str): "contiguous" or "channels_last".
+
+    Returns:
+        torch.nn.Module: the model itself for the defaults, otherwise a wrapper.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision '{precision}', expected one of {PRECISIONS}")
+    if memory_format not in MEMORY_FORMATS:
+        raise ValueError(f"Unknown memory format '{memory_format}', expected one of {MEMORY_FORMATS}")
+
+    model.eval()
+    if precision == "fp32" and memory_format == "contiguous":
+        return model
+
+    if memory_format == "channels_last":
+        model = model.to(memory_format=torch.channels_last)
+    if precision == "int8":
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    return InferenceModel(model, precision, memory_format).eval()
+
+
+def load_inference_config(path: Optional[str] = None) -> dict:
+    """Read the benchmark's config file once; returns {} if there is none"""
+    global _config_cache
+    if path is None and _config_cache is not None:
+        return _config_cache
+
+    config_path = path or os.getenv("INFERENCE_CONFIG_PATH", DEFAULT_CONFIG_PATH)
+    config: dict = {}
+    try:
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            logger.info(f"Loaded inference config from {config_path}")
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable inference config {config_path}: {e}")
+        config = {}
+
+    if path is None:
+        _config_cache = config
+    return config
+
+
+def apply_thread_settings(config: Optional[dict] = None) -> None:
+    """Apply the configured torch intra-op and inter-op thread counts"""
+    config = load_inference_config() if config is None else config
+
+    num_threads = config.get("torch_num_threads")
+    if num_threads:
+        torch.set_num_threads(int(num_threads))
+
+    interop_threads = config.get("torch_num_interop_threads")
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(int(interop_threads))
+        except RuntimeError as e:
+            # Only allowed before any inter-op work has started
+            logger.warning(f"Could not set inter-op threads: {e}")
+
+
+def optimize_for_inference(model: nn.Module, model_name: str, config: Optional[dict] = None) -> nn.Module:
+    """Prepare a loaded model using its entry in the inference config"""
+    config = load_inference_config() if config is None else config
+    settings = config.get("models", {}).get(model_name, {})
+    precision = settings.get("precision", "fp32")
+    if precision != "fp32" and not settings.get("accuracy"):
+        logger.warning(
+            f"Ignoring {precision} for {model_name}: the config does not record "
+            "an accuracy check against fp32"
+        )
+        precision = "fp32"
+    try:
+        return prepare_model(
+            model,
+            precision=precision,
+            memory_format=settings.get("memory_format", "contiguous"),
+        )
+    except Exception as e:
+        logger.warning(f"Falling back to fp32 for {model_name}: {e}")
+        return model
@@ -6,12 +6,15 @@ import torchvision
 from torch import nn
 
 
-def create_vit_model(num_classes: int = 4, seed: int = 43):
+def create_vit_model(num_classes: int = 4, seed: int = 43, pretrained: bool = True):
     """Creates a ViT-B/16 feature extractor model and transforms.
 
     Args:
         num_classes (int, optional): number of target classes.
         seed (int, optional): random seed value for output layer. Defaults to 42.
+        pretrained (bool, optional): load the ImageNet backbone weights. Pass False
+            to get a randomly initialized backbone without downloading anything
+            (benchmarks, tests). Defaults to True.
 
     Returns:
         model (torch.nn.Module): ViT-B/16 feature extractor model.
@@ -20,7 +23,7 @@ def create_vit_model(num_classes: int = 4, seed: int = 43):
     # Create ViT_B_16 pretrained weights, transforms and model
     weights = torchvision.models.ViT_B_16_Weights.DEFAULT
     transforms = weights.transforms()
-    model = torchvision.models.vit_b_16(weights=weights)
+    model = torchvision.models.vit_b_16(weights=weights if pretrained else None)
 
     for param in model.parameters():
         param.requires_grad = False
@@ -36,13 +39,16 @@ def create_vit_model(num_classes: int = 4, seed: int = 43):
     return model, transforms
 
 
-def create_effnetb2_model(num_classes: int = 2, seed: int = 43):
+def create_effnetb2_model(num_classes: int = 2, seed: int = 43, pretrained: bool = True):
     """Creates an EfficientNetB2 feature extractor model and transforms.
 
     Args:
         num_classes (int, optional): number of classes in the classifier head.
             Defaults to 2.
         seed (int, optional): random seed value. Defaults to 43.
+        pretrained (bool, optional): load the ImageNet backbone weights. Pass False
+            to get a randomly initialized backbone without downloading anything.
+            Defaults to True.
 
     Returns:
         model (torch.nn.Module): EffNetB2 feature extractor model.
@@ -51,7 +57,7 @@ def create_effnetb2_model(num_classes: int = 2, seed: int = 43):
     # Create EffNetB2 pretrained weights, transforms and model
     weights = torchvision.models.EfficientNet_B2_Weights.DEFAULT
     transforms = weights.transforms()
-    model = torchvision.models.efficientnet_b2(weights=weights)
+    model = torchvision.models.efficientnet_b2(weights=weights if pretrained else None)
 
     # Freeze all layers in base model
     for param in model.parameters():
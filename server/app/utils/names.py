@@ -0,0 +1,33 @@
+"""
+Name normalization for patient lookups.
+
+Lookups and duplicate checks compare names in one canonical form:
+accents removed, case folded, punctuation dropped and whitespace
+collapsed, so "José  O'Brien" and "jose obrien" are the same key.
+"""
+
+import re
+import unicodedata
+from typing import Optional
+
+_DROPPED = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_name(name: Optional[str]) -> Optional[str]:
+    if name is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", name)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    folded = _DROPPED.sub("", stripped.casefold())
+    return _SPACES.sub(" ", folded).strip()
+
+
+def prefix_upper_bound(prefix: str) -> str:
+    """Smallest string greater than every string starting with ``prefix``.
+
+    ``column >= prefix AND column < prefix_upper_bound(prefix)`` is a
+    prefix match that any B-tree index on the column can answer,
+    independent of how the database treats LIKE.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
@@ -0,0 +1,39 @@
+"""
+Opaque cursors for keyset pagination of newest-first lists.
+
+A cursor records the ``(created_at, id)`` of the last row a client has
+seen. The next page is every row strictly before it in
+``created_at DESC, id DESC`` order, which the composite
+``(owner, created_at, id)`` indexes answer without scanning the rows of
+earlier pages the way OFFSET does.
+"""
+
+import base64
+from datetime import datetime
+from typing import Tuple
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; ValueError for anything it did not produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def before_cursor(created_at_column, id_column, cursor: Tuple[datetime, int]):
+    """Filter for rows that come after ``cursor`` in newest-first order"""
+    created_at, row_id = cursor
+    return or_(
+        created_at_column < created_at,
+        and_(created_at_column == created_at, id_column < row_id),
+    )
@@ -13,7 +13,10 @@ import os
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 
+from app.core.tracing import traced
 
+
+@traced()
 def generateMedicalPDF(result_data: Dict[str, Any], patient_data: Dict[str, Any]) -> bytes:
     """
     Generate a professional medical report PDF
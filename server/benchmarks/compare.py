@@ -0,0 +1,287 @@
+"""
+Compare benchmark results against the committed baseline.
+
+Reads the JSON written by ``python -m app.bench --results``,
+``python -m benchmarks.e2e_latency``, ``python -m benchmarks.db_write_concurrency``
+and ``python -m loadtest.run``, turns each into flat metrics (inference
+latency, endpoint latency and throughput, SQL statements per request,
+concurrent write throughput, load-test step latency and error rate) and
+checks them against benchmarks/baseline.json. Each metric may get worse by
+its tolerance; anything beyond that is a regression and the exit status is 1.
+
+Usage (from the server directory):
+    python -m benchmarks.compare bench-results/e2e_latency.json bench-results/inference.json
+    python -m benchmarks.compare bench-results/*.json --update-baseline
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from fnmatch import fnmatchcase
+from typing import Dict, List, Tuple
+
+SERVER_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_BASELINE = os.path.join(SERVER_ROOT, "benchmarks", "baseline.json")
+
+# Used when the baseline file does not define its own tolerances. The first
+# matching pattern wins; a metric may worsen by max(pct% of baseline, abs).
+DEFAULT_TOLERANCES = [
+    {"pattern": "*/db_queries_*", "pct": 0, "abs": 0},
+    {"pattern": "*/errors", "pct": 0, "abs": 0},
+    {"pattern": "*/error_rate", "pct": 0, "abs": 0.01},
+    {"pattern": "*/throughput_*", "pct": 20, "abs": 0},
+    {"pattern": "*/p99_ms", "pct": 35, "abs": 2.0},
+    {"pattern": "*", "pct": 20, "abs": 2.0},
+]
+
+HIGHER_IS_BETTER = ("throughput_rps", "throughput_ips", "throughput_wps")
+
+
+def _fmt(number) -> str:
+    if number is None:
+        return "-"
+    return f"{number:g}" if isinstance(number, (int, float)) else str(number)
+
+
+def inference_metrics(report: dict) -> Dict[str, float]:
+    metrics = {}
+    for row in report.get("results", []):
+        key = (
+            f"inference/{row['model']}/{row['precision']}/{row['memory_format']}"
+            f"/t{row['threads']}/b{row['batch_size']}"
+        )
+        metrics[f"{key}/p50_ms"] = row["latency_p50_ms"]
+        metrics[f"{key}/p95_ms"] = row["latency_p95_ms"]
+        metrics[f"{key}/throughput_ips"] = row["throughput_ips"]
+    return metrics
+
+
+def e2e_metrics(report: dict) -> Dict[str, float]:
+    metrics = {}
+    for result in report.get("results", []):
+        key = f"e2e/{result['endpoint']}/c{result['concurrency']}"
+        latency = result["latency_ms"]
+        metrics[f"{key}/p50_ms"] = latency["p50"]
+        metrics[f"{key}/p95_ms"] = latency["p95"]
+        metrics[f"{key}/p99_ms"] = latency["p99"]
+        metrics[f"{key}/throughput_rps"] = result["throughput_rps"]
+        metrics[f"{key}/errors"] = result["errors"]
+        if "db_queries" in result:
+            metrics[f"{key}/db_queries_mean"] = result["db_queries"]["mean"]
+            metrics[f"{key}/db_queries_max"] = result["db_queries"]["max"]
+    return metrics
+
+
+def loadtest_metrics(report: dict) -> Dict[str, float]:
+    metrics = {}
+    for step, stats in report.get("report", {}).get("steps", {}).items():
+        key = f"loadtest/{step}"
+        metrics[f"{key}/p50_ms"] = stats["latency_ms"]["p50"]
+        metrics[f"{key}/p95_ms"] = stats["latency_ms"]["p95"]
+        metrics[f"{key}/error_rate"] = stats["error_rate"]
+    return metrics
+
+
+def db_write_metrics(report: dict) -> Dict[str, float]:
+    metrics = {}
+    for result in report.get("results", []):
+        key = f"db_write/{result['profile']}/w{result['writers']}"
+        metrics[f"{key}/write/p50_ms"] = result["write_latency_ms"]["p50"]
+        metrics[f"{key}/write/p99_ms"] = result["write_latency_ms"]["p99"]
+        metrics[f"{key}/read/p99_ms"] = result["read_latency_ms"]["p99"]
+        metrics[f"{key}/throughput_wps"] = result["writes_per_second"]
+        metrics[f"{key}/errors"] = result["errors"]["locked"] + result["errors"]["other"]
+    return metrics
+
+
+EXTRACTORS = {
+    "inference": inference_metrics,
+    "e2e_latency": e2e_metrics,
+    "loadtest": loadtest_metrics,
+    "db_write_concurrency": db_write_metrics,
+}
+
+
+def load_results(paths: List[str]) -> Tuple[Dict[str, float], Dict[str, dict]]:
+    """Flatten result files into metrics, plus each benchmark's config for context"""
+    metrics: Dict[str, float] = {}
+    sources: Dict[str, dict] = {}
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        kind = report.get("benchmark")
+        if kind not in EXTRACTORS:
+            raise ValueError(f"{path}: unknown benchmark type {kind!r}")
+        metrics.update(EXTRACTORS[kind](report))
+        sources[kind] = {
+            "config": report.get("config"),
+            "environment": report.get("environment"),
+            "created_at": report.get("created_at"),
+        }
+    return metrics, sources
+
+
+def tolerance_for(metric: str, tolerances: List[dict]) -> dict:
+    for rule in tolerances:
+        if fnmatchcase(metric, rule["pattern"]):
+            return rule
+    return {"pct": 0, "abs": 0}
+
+
+def compare(
+    baseline: Dict[str, float], current: Dict[str, float], tolerances: List[dict]
+) -> List[dict]:
+    """One row per metric with its status: ok, improved, regression, missing or new"""
+    rows = []
+    for metric in sorted(set(baseline) | set(current)):
+        base = baseline.get(metric)
+        value = current.get(metric)
+        row = {"metric": metric, "baseline": base, "current": value}
+        if base is None:
+            row["status"] = "new"
+        elif value is None:
+            row["status"] = "missing"
+        else:
+            rule = tolerance_for(metric, tolerances)
+            allowed = max(abs(base) * rule.get("pct", 0) / 100, rule.get("abs", 0))
+            higher_is_better = metric.rsplit("/", 1)[-1] in HIGHER_IS_BETTER
+            worse_by = base - value if higher_is_better else value - base
+            row["allowed"] = round(allowed, 6)
+            row["change_pct"] = round((value - base) / base * 100, 2) if base else None
+            if worse_by > allowed:
+                row["status"] = "regression"
+            elif worse_by < 0:
+                row["status"] = "improved"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+    return rows
+
+
+def print_report(rows: List[dict], verbose: bool = False) -> None:
+    shown = [row for row in rows if verbose or row["status"] != "ok"]
+    if shown:
+        width = max(len(row["metric"]) for row in shown)
+        header = (
+            f"{'metric':<{width}} {'baseline':>12} {'current':>12} "
+            f"{'change':>9} {'allowed':>10}  status"
+        )
+        print(header)
+        print("-" * len(header))
+    for row in shown:
+        change = row.get("change_pct")
+        status = row["status"].upper() if row["status"] == "regression" else row["status"]
+        print(
+            f"{row['metric']:<{width}} {_fmt(row['baseline']):>12} {_fmt(row['current']):>12} "
+            f"{f'{change:+.1f}%' if change is not None else '':>9} "
+            f"{_fmt(row.get('allowed', '')):>10}  {status}"
+        )
+
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    print()
+    print(", ".join(f"{count} {status}" for status, count in sorted(counts.items())))
+
+
+def config_warnings(baseline_sources: Dict[str, dict], sources: Dict[str, dict]) -> List[str]:
+    warnings = []
+    for kind, source in sources.items():
+        expected = baseline_sources.get(kind, {}).get("config")
+        if expected is not None and source.get("config") != expected:
+            warnings.append(
+                f"{kind}: run configuration differs from the baseline's "
+                f"({source.get('config')} vs {expected}); numbers may not be comparable"
+            )
+    return warnings
+
+
+def load_baseline(path: str) -> dict:
+    if not os.path.exists(path):
+        return {"tolerances": DEFAULT_TOLERANCES, "sources": {}, "metrics": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    baseline.setdefault("tolerances", DEFAULT_TOLERANCES)
+    baseline.setdefault("sources", {})
+    baseline.setdefault("metrics", {})
+    return baseline
+
+
+def update_baseline(path: str, baseline: dict, metrics: Dict[str, float], sources: Dict[str, dict]) -> None:
+    """Replace the metrics of the benchmarks that were run; keep everything else"""
+    kinds = {metric.split("/", 1)[0] for metric in metrics}
+    kept = {
+        metric: value
+        for metric, value in baseline["metrics"].items()
+        if metric.split("/", 1)[0] not in kinds
+    }
+    baseline["metrics"] = dict(sorted({**kept, **metrics}.items()))
+    baseline["sources"].update(sources)
+    baseline["updated_at"] = datetime.utcnow().isoformat()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("results", nargs="+", help="benchmark JSON files to check")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare against")
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="write these results into the baseline instead of comparing",
+    )
+    parser.add_argument(
+        "--fail-on-missing",
+        action="store_true",
+        help="also fail when a baseline metric is absent from the results",
+    )
+    parser.add_argument("--verbose", action="store_true", help="list metrics within tolerance too")
+    parser.add_argument("--report", help="optionally write the comparison as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    try:
+        metrics, sources = load_results(args.results)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Could not read results: {e}", file=sys.stderr)
+        return 2
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        update_baseline(args.baseline, baseline, metrics, sources)
+        print(f"Baseline {args.baseline} updated with {len(metrics)} metrics")
+        return 0
+
+    # Only compare benchmarks that were actually run
+    kinds = {metric.split("/", 1)[0] for metric in metrics}
+    baseline_metrics: Dict[str, float] = {
+        metric: value
+        for metric, value in baseline["metrics"].items()
+        if metric.split("/", 1)[0] in kinds
+    }
+    for warning in config_warnings(baseline["sources"], sources):
+        print(f"warning: {warning}")
+
+    rows = compare(baseline_metrics, metrics, baseline["tolerances"])
+    print_report(rows, verbose=args.verbose)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"baseline": args.baseline, "rows": rows}, f, indent=2)
+
+    failed_statuses = {"regression", "missing"} if args.fail_on_missing else {"regression"}
+    failed = [row for row in rows if row["status"] in failed_statuses]
+    if failed:
+        print(f"{len(failed)} metric(s) regressed beyond tolerance")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
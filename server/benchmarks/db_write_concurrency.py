@@ -0,0 +1,253 @@
+"""
+Write-concurrency benchmark for the SQLite engine profiles.
+
+Creates a throwaway SQLite file per profile, then runs writer threads
+saving predictions through PredictionService while reader threads page
+through history, and reports write and read latency, throughput and
+"database is locked" failures for:
+
+- default: the engine as it was created before app.db.engine existed
+  (rollback journal, synchronous=FULL, driver defaults);
+- tuned: the profile the server now uses (WAL, synchronous=NORMAL,
+  busy_timeout, mmap_size, sized pool).
+
+Usage (from the server directory):
+    python -m benchmarks.db_write_concurrency --writers 1,4,8 --writes 200
+    python -m benchmarks.db_write_concurrency --profiles tuned --readers 4
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List
+
+SERVER_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SERVER_ROOT not in sys.path:
+    sys.path.insert(0, SERVER_ROOT)
+
+from benchmarks.harness import (  # noqa: E402
+    configure_environment,
+    environment_info,
+    summarize_latencies,
+)
+
+
+PROFILES = ("default", "tuned")
+
+
+def create_profile_engine(profile: str, url: str):
+    from sqlalchemy import create_engine
+
+    from app.db.engine import configure_engine, engine_options
+
+    if profile == "default":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return configure_engine(create_engine(url, **engine_options(url)))
+
+
+def prepare_database(engine) -> Dict[str, int]:
+    """Schema, triggers and one user and patient to write against"""
+    from sqlalchemy.orm import Session
+
+    from app.db.analytics import install_probability_triggers
+    from app.db.base import Base
+    from app.db.models import Patient, User
+    from app.db.search import install_patient_lookup, install_search_index
+
+    Base.metadata.create_all(bind=engine)
+    install_patient_lookup(engine)
+    install_search_index(engine)
+    install_probability_triggers(engine)
+
+    with Session(engine) as db:
+        user = User(
+            email="bench@example.com",
+            full_name="Benchmark User",
+            hashed_password="!",
+            is_verified=True,
+        )
+        patient = Patient(full_name="Benchmark Patient", gender="Other")
+        db.add_all([user, patient])
+        db.commit()
+        return {"user_id": int(user.id), "patient_id": int(patient.id)}  # type: ignore
+
+
+def run_profile(profile: str, writers: int, readers: int, writes: int) -> dict:
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+
+    from app.schemas.prediction import PredictionResultCreate
+    from app.services.prediction_service import PredictionService
+
+    workdir = tempfile.mkdtemp(prefix=f"secondopinion-{profile}-")
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    engine = create_profile_engine(profile, url)
+    ids = prepare_database(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    write_latencies: List[float] = []
+    read_latencies: List[float] = []
+    errors = {"locked": 0, "other": 0}
+    lock = threading.Lock()
+    next_write = iter(range(writes))
+    writing = threading.Event()
+    writing.set()
+
+    def record_error(e: Exception) -> None:
+        with lock:
+            errors["locked" if "locked" in str(e) else "other"] += 1
+
+    def writer():
+        for i in next_write:
+            prediction = PredictionResultCreate(
+                user_id=ids["user_id"],
+                patient_id=ids["patient_id"],
+                image_filename=f"bench_{i}.jpg",
+                model_type="tumor",
+                prediction="Glioma Tumor",
+                confidence=0.9,
+                entropy=0.3,
+                probabilities={"Glioma Tumor": 0.9, "Normal Brain": 0.1},
+                notes=f"concurrent write {i}",
+            )
+            db = SessionLocal()
+            started = time.perf_counter()
+            try:
+                PredictionService.save_prediction_result(db, prediction)
+            except OperationalError as e:
+                db.rollback()
+                record_error(e)
+                continue
+            finally:
+                db.close()
+            with lock:
+                write_latencies.append((time.perf_counter() - started) * 1000)
+
+    def reader():
+        while writing.is_set():
+            db = SessionLocal()
+            started = time.perf_counter()
+            try:
+                PredictionService.get_user_prediction_history(db, ids["user_id"], limit=20)
+            except OperationalError as e:
+                record_error(e)
+                continue
+            finally:
+                db.close()
+            with lock:
+                read_latencies.append((time.perf_counter() - started) * 1000)
+
+    reader_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    writer_threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in reader_threads:
+        thread.start()
+    wall_started = time.perf_counter()
+    for thread in writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - wall_started
+    writing.clear()
+    for thread in reader_threads:
+        thread.join()
+
+    with engine.connect() as connection:
+        journal_mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    engine.dispose()
+
+    return {
+        "profile": profile,
+        "journal_mode": journal_mode,
+        "writers": writers,
+        "readers": readers,
+        "writes": writes,
+        "committed": len(write_latencies),
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "writes_per_second": round(len(write_latencies) / wall_seconds, 3) if wall_seconds else 0.0,
+        "reads": len(read_latencies),
+        "write_latency_ms": summarize_latencies(write_latencies),
+        "read_latency_ms": summarize_latencies(read_latencies),
+    }
+
+
+def print_result(result: dict) -> None:
+    write = result["write_latency_ms"]
+    read = result["read_latency_ms"]
+    print(
+        f"{result['profile']:<8} w={result['writers']:<3} r={result['readers']:<3} "
+        f"{result['writes_per_second']:>8.1f} writes/s "
+        f"write p50={write['p50']:>8.2f}ms p99={write['p99']:>8.2f}ms "
+        f"read p50={read['p50']:>7.2f}ms p99={read['p99']:>8.2f}ms "
+        f"reads={result['reads']:<6} locked={result['errors']['locked']}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--profiles",
+        type=lambda value: value.split(","),
+        default=list(PROFILES),
+        help=f"comma-separated subset of {','.join(PROFILES)}",
+    )
+    parser.add_argument(
+        "--writers",
+        type=lambda value: [int(w) for w in value.split(",")],
+        default=[1, 4, 8],
+        help="comma-separated writer thread counts",
+    )
+    parser.add_argument("--readers", type=int, default=2, help="reader threads during the writes")
+    parser.add_argument("--writes", type=int, default=200, help="predictions saved per run")
+    parser.add_argument(
+        "--output",
+        default="bench-results/db_write_concurrency.json",
+        help="where to write the JSON report",
+    )
+    args = parser.parse_args(argv)
+
+    unknown = set(args.profiles) - set(PROFILES)
+    if unknown:
+        parser.error(f"unknown profiles: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output_path = os.path.abspath(args.output)
+    configure_environment()
+
+    results = []
+    for writers in args.writers:
+        for profile in args.profiles:
+            result = run_profile(profile, writers, args.readers, args.writes)
+            results.append(result)
+            print_result(result)
+
+    report = {
+        "benchmark": "db_write_concurrency",
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": environment_info(),
+        "config": {
+            "profiles": args.profiles,
+            "writers": args.writers,
+            "readers": args.readers,
+            "writes": args.writes,
+        },
+        "results": results,
+    }
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
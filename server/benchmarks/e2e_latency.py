@@ -0,0 +1,234 @@
+"""
+End-to-end latency benchmark for the upload and history endpoints.
+
+Runs the FastAPI app in-process (see benchmarks/harness.py) and drives it
+through httpx at a configurable concurrency with synthetic images, then
+writes p50/p95/p99 latency, throughput and SQL statements per request for
+each endpoint as JSON.
+
+Usage (from the server directory):
+    python -m benchmarks.e2e_latency --requests 50 --concurrency 1,4
+    python -m benchmarks.e2e_latency --endpoints history --output results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List
+
+SERVER_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SERVER_ROOT not in sys.path:
+    sys.path.insert(0, SERVER_ROOT)
+
+from benchmarks.harness import (  # noqa: E402
+    configure_environment,
+    environment_info,
+    summarize_latencies,
+    synthetic_image,
+)
+
+
+ENDPOINTS = ("upload_tumor", "upload_chest", "tumor", "history", "statistics")
+
+
+class EndpointSpec:
+    """How to build one request against an endpoint under test."""
+
+    def __init__(self, name: str, method: str, path: str, build: Callable[[int], dict]):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.build = build
+
+
+def build_endpoint_specs(image: bytes, patient_id: int, history_pages: int) -> Dict[str, EndpointSpec]:
+    def upload(filename: str):
+        def _build(i: int) -> dict:
+            return {
+                "files": {"file": (filename, image, "image/jpeg")},
+                "data": {"patient_id": str(patient_id), "notes": f"benchmark upload {i}"},
+            }
+
+        return _build
+
+    def legacy_tumor(i: int) -> dict:
+        return {"files": {"file": ("scan.jpg", image, "image/jpeg")}}
+
+    def history(i: int) -> dict:
+        return {"params": {"page": (i % history_pages) + 1, "per_page": 20}}
+
+    def no_arguments(i: int) -> dict:
+        return {}
+
+    return {
+        "upload_tumor": EndpointSpec("upload_tumor", "POST", "/upload/tumor", upload("scan.jpg")),
+        "upload_chest": EndpointSpec("upload_chest", "POST", "/upload/chest", upload("xray.jpg")),
+        "tumor": EndpointSpec("tumor", "POST", "/tumor", legacy_tumor),
+        "history": EndpointSpec(
+            "history", "GET", "/history/predictions/history", history
+        ),
+        "statistics": EndpointSpec(
+            "statistics", "GET", "/history/predictions/statistics", no_arguments
+        ),
+    }
+
+
+async def run_endpoint(client, spec: EndpointSpec, total: int, concurrency: int, warmup: int) -> dict:
+    """Send ``total`` requests with at most ``concurrency`` in flight."""
+    from app.core.query_stats import get_query_statistics, reset_query_statistics
+
+    for i in range(warmup):
+        await client.request(spec.method, spec.path, **spec.build(i))
+    reset_query_statistics()
+
+    latencies: List[float] = []
+    status_codes: Counter = Counter()
+    errors = 0
+    next_index = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in next_index:
+            started = time.perf_counter()
+            try:
+                response = await client.request(spec.method, spec.path, **spec.build(i))
+                status_codes[str(response.status_code)] += 1
+                if response.status_code >= 400:
+                    errors += 1
+            except Exception:
+                status_codes["exception"] += 1
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    wall_started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_seconds = time.perf_counter() - wall_started
+    query_stats = get_query_statistics().get(f"{spec.method} {spec.path}", {})
+
+    return {
+        "endpoint": spec.name,
+        "method": spec.method,
+        "path": spec.path,
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "status_codes": dict(status_codes),
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(total / wall_seconds, 3) if wall_seconds else 0.0,
+        "latency_ms": summarize_latencies(latencies),
+        "db_queries": {
+            "mean": query_stats.get("mean_queries", 0.0),
+            "max": query_stats.get("max_queries", 0),
+            "mean_db_ms": query_stats.get("mean_db_ms", 0.0),
+        },
+    }
+
+
+async def run_benchmark(args) -> dict:
+    import httpx
+
+    from benchmarks.harness import BenchApp
+
+    bench = BenchApp()
+    try:
+        bench.seed_predictions(args.seed_predictions)
+        image = synthetic_image(args.image_size, args.image_size)
+        specs = build_endpoint_specs(
+            image, bench.patient_id, max(1, args.seed_predictions // 20)
+        )
+
+        results = []
+        transport = httpx.ASGITransport(app=bench.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench", timeout=None
+        ) as client:
+            for name in args.endpoints:
+                for concurrency in args.concurrency:
+                    result = await run_endpoint(
+                        client, specs[name], args.requests, concurrency, args.warmup
+                    )
+                    results.append(result)
+                    print_result(result)
+    finally:
+        await bench.aclose()
+
+    return {
+        "benchmark": "e2e_latency",
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": environment_info(),
+        "config": {
+            "endpoints": args.endpoints,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "image_size": args.image_size,
+            "seed_predictions": args.seed_predictions,
+        },
+        "results": results,
+    }
+
+
+def print_result(result: dict) -> None:
+    latency = result["latency_ms"]
+    print(
+        f"{result['endpoint']:<14} c={result['concurrency']:<3} "
+        f"n={result['requests']:<5} err={result['errors']:<4} "
+        f"p50={latency['p50']:>9.2f}ms p95={latency['p95']:>9.2f}ms "
+        f"p99={latency['p99']:>9.2f}ms {result['throughput_rps']:>8.2f} req/s "
+        f"queries={result['db_queries']['mean']:.1f}"
+    )
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument(
+        "--endpoints",
+        type=lambda value: value.split(","),
+        default=list(ENDPOINTS),
+        help=f"comma-separated subset of {','.join(ENDPOINTS)}",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(c) for c in value.split(",")],
+        default=[1, 4],
+        help="comma-separated concurrency levels to run each endpoint at",
+    )
+    parser.add_argument("--requests", type=int, default=30, help="measured requests per run")
+    parser.add_argument("--warmup", type=int, default=2, help="unmeasured requests per run")
+    parser.add_argument("--image-size", type=int, default=512, help="synthetic image edge in pixels")
+    parser.add_argument(
+        "--seed-predictions", type=int, default=200, help="history rows to insert before the run"
+    )
+    parser.add_argument(
+        "--output", default="bench-results/e2e_latency.json", help="where to write the JSON report"
+    )
+    args = parser.parse_args(argv)
+
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # Resolve the output path before the harness changes directory
+    output_path = os.path.abspath(args.output)
+    configure_environment()
+
+    report = asyncio.run(run_benchmark(args))
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
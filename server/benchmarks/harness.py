@@ -0,0 +1,337 @@
+"""
+In-process harness shared by the benchmark scripts.
+
+Builds the FastAPI app against a private in-memory SQLite database, with
+authentication stubbed out and randomly initialized (download-free) models,
+so the request path can be measured without credentials, model files or a
+network connection.
+"""
+
+import io
+import os
+import platform
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+# Settings are read when app.core.config is first imported, so the benchmark
+# environment has to be in place before anything under app/ is imported.
+BENCH_ENVIRONMENT = {
+    "SECRET_KEY": "benchmark-secret-key",
+    "ALGORITHM": "HS256",
+    "SMTP_HOST": "",
+    "SMTP_PORT": "0",
+    "SMTP_USER": "",
+    "SMTP_PASSWORD": "",
+    "SMTP_USE_TLS": "false",
+}
+
+
+def configure_environment(workdir: Optional[str] = None) -> str:
+    """Point the app at throwaway resources and return the working directory.
+
+    The uploads directory is resolved relative to the current directory, so the
+    process is moved into a scratch directory to keep benchmark files out of
+    the real uploads folder.
+    """
+    # The import-time create_all() in app.main must never touch a real database
+    os.environ["DATABASE_URL"] = "sqlite://"
+    for key, value in BENCH_ENVIRONMENT.items():
+        os.environ.setdefault(key, value)
+
+    workdir = workdir or tempfile.mkdtemp(prefix="secondopinion-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    return workdir
+
+
+class BenchApp:
+    """The FastAPI app wired to an in-memory database and random models."""
+
+    def __init__(
+        self,
+        stub_auth: bool = True,
+        random_models: bool = True,
+        database_url: Optional[str] = None,
+        replica_url: Optional[str] = None,
+    ):
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.orm import sessionmaker
+
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        from app.main import app, create_db_and_tables
+        from app.db.engine import configure_engine, engine_options
+        from app.db.replica import configure_replica
+        from app.db.session import (
+            async_database_url,
+            create_async_engine_for,
+            get_async_db,
+            get_db,
+        )
+
+        self._keeper = None
+        if database_url:
+            # e.g. a file database for load tests, where writers and readers
+            # contend the way they do in a deployment
+            url = database_url
+        else:
+            # A named shared-cache memory database lets every pooled connection
+            # see the same tables. The keeper connection holds it open for the run.
+            name = f"secondopinion_bench_{uuid4().hex}"
+            self._keeper = sqlite3.connect(
+                f"file:{name}?mode=memory&cache=shared", uri=True
+            )
+            url = f"sqlite:///file:{name}?mode=memory&cache=shared&uri=true"
+
+        # Same engine profile as the server (WAL, busy timeout, pool) for file databases
+        self.engine = configure_engine(create_engine(url, **engine_options(url)))
+        # Async handlers reach the same database through the asyncio driver
+        self.async_engine = create_async_engine_for(async_database_url(url))
+
+        if self._keeper is not None:
+            for bench_engine in (self.engine, self.async_engine.sync_engine):
+
+                @event.listens_for(bench_engine, "connect")
+                def _read_uncommitted(dbapi_connection, connection_record):
+                    # Shared-cache readers otherwise fail with "table is locked"
+                    # while an upload is writing
+                    cursor = dbapi_connection.cursor()
+                    cursor.execute("PRAGMA read_uncommitted = 1")
+                    cursor.close()
+
+        create_db_and_tables(self.engine)
+        # Reads of history, statistics and search go here when set; the
+        # benchmark creates its schema, keeping it in sync is up to the caller
+        self.replica_engine = configure_replica(replica_url)
+        if self.replica_engine is not None:
+            create_db_and_tables(self.replica_engine)
+        self.SessionLocal = sessionmaker(
+            autocommit=False, autoflush=False, bind=self.engine
+        )
+        self.AsyncSessionLocal = async_sessionmaker(
+            self.async_engine, autoflush=False, expire_on_commit=False
+        )
+
+        def _get_bench_db():
+            db = self.SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        async def _get_bench_async_db():
+            async with self.AsyncSessionLocal() as db:
+                yield db
+
+        self.app = app
+        self.app.dependency_overrides[get_db] = _get_bench_db
+        self.app.dependency_overrides[get_async_db] = _get_bench_async_db
+
+        self.user_id = self._create_user()
+        self.patient_id = self._create_patient()
+
+        if stub_auth:
+            self._stub_authentication()
+        if random_models:
+            install_random_models()
+
+    def _create_user(self) -> int:
+        from app.db.models import User
+
+        db = self.SessionLocal()
+        try:
+            user = User(
+                email="bench@example.com",
+                full_name="Benchmark User",
+                # Never used for a real login; authentication is stubbed
+                hashed_password="!",
+                is_verified=True,
+            )
+            db.add(user)
+            db.commit()
+            return int(user.id)  # type: ignore
+        finally:
+            db.close()
+
+    def _create_patient(self) -> int:
+        from app.db.models import Patient
+
+        db = self.SessionLocal()
+        try:
+            patient = Patient(full_name="Benchmark Patient", gender="Other")
+            db.add(patient)
+            db.commit()
+            return int(patient.id)  # type: ignore
+        finally:
+            db.close()
+
+    def _stub_authentication(self):
+        from fastapi import Depends
+        from sqlalchemy.ext.asyncio import AsyncSession
+        from sqlalchemy.orm import Session
+
+        from app.api.auth import get_current_user, get_current_user_async
+        from app.db.models import User
+        from app.db.session import get_async_db, get_db
+
+        user_id = self.user_id
+
+        # Keep the per-request user lookup so the DB cost of authentication is
+        # still measured; only the JWT check is skipped.
+        def _bench_current_user(db: Session = Depends(get_db)):
+            return db.get(User, user_id)
+
+        async def _bench_current_user_async(db: AsyncSession = Depends(get_async_db)):
+            user = await db.get(User, user_id)
+            # Releases the connection, as get_current_user_async does
+            await db.commit()
+            return user
+
+        self.app.dependency_overrides[get_current_user] = _bench_current_user
+        self.app.dependency_overrides[get_current_user_async] = _bench_current_user_async
+
+    def seed_predictions(self, count: int) -> None:
+        """Insert ``count`` prediction rows for the benchmark user."""
+        from app.db.models import PredictionResult
+        from app.services.prediction_service import PredictionService
+
+        db = self.SessionLocal()
+        try:
+            now = datetime.utcnow()
+            classes = ["Glioma Tumor", "Meningioma Tumor", "Normal Brain", "Pituitary Tumor"]
+            for i in range(count):
+                predicted = classes[i % len(classes)]
+                db.add(
+                    PredictionResult(
+                        user_id=self.user_id,
+                        patient_id=self.patient_id,
+                        image_filename=f"seed_{i}.jpg",
+                        image_path=f"uploads/seed_{i}.jpg",
+                        model_type="tumor" if i % 3 else "chest_xray",
+                        prediction=predicted,
+                        confidence=0.9,
+                        entropy=0.3,
+                        message=f"Model Diagnosis: {predicted} with confidence 0.90",
+                        probabilities={name: 0.9 if name == predicted else 0.1 / 3 for name in classes},
+                        notes=f"seeded row {i}",
+                        status="pending",
+                        created_at=now - timedelta(minutes=i),
+                        updated_at=now - timedelta(minutes=i),
+                    )
+                )
+            db.commit()
+            # Rows were added directly, so bring the history totals up to date
+            PredictionService.rebuild_prediction_counters(db, self.user_id)
+        finally:
+            db.close()
+
+    async def aclose(self) -> None:
+        """close(), after closing the async connections on the running loop"""
+        await self.async_engine.dispose()
+        self.close()
+
+    def close(self) -> None:
+        from app.db.replica import configure_replica
+
+        self.app.dependency_overrides.clear()
+        self.engine.dispose()
+        configure_replica(None)
+        if self._keeper is not None:
+            self._keeper.close()
+
+
+def install_random_models() -> None:
+    """Fill the model caches with randomly initialized networks.
+
+    The architectures and transforms match production, so forward-pass cost is
+    representative. The separator head is biased towards "MRI" so that tumor
+    requests run the whole pipeline instead of being rejected early.
+    """
+    import torch
+
+    import app.api.upload as upload_module
+    import app.main as main_module
+    from app.utils.inference_config import optimize_for_inference
+    from app.utils.model_utils import create_effnetb2_model, create_vit_model
+
+    tumor_model, tumor_transforms = create_vit_model(num_classes=4, pretrained=False)
+    chest_model, chest_transforms = create_vit_model(num_classes=2, pretrained=False)
+    separator_model, separator_transforms = create_effnetb2_model(
+        num_classes=2, pretrained=False
+    )
+
+    with torch.no_grad():
+        head = separator_model.classifier[-1]
+        head.weight.zero_()
+        head.bias.copy_(torch.tensor([5.0, -5.0]))
+
+    # Apply the same models/inference_config.json settings the loaders use
+    tumor_model = optimize_for_inference(tumor_model.eval(), "tumor")
+    chest_model = optimize_for_inference(chest_model.eval(), "chest_xray")
+    separator_model = optimize_for_inference(separator_model.eval(), "separator")
+
+    main_module._tumor_model, main_module._tumor_transforms = tumor_model, tumor_transforms
+    main_module._separator_model, main_module._separator_transforms = (
+        separator_model,
+        separator_transforms,
+    )
+    upload_module._tumor_model, upload_module._tumor_transforms = tumor_model, tumor_transforms
+    upload_module._chest_model, upload_module._chest_transforms = chest_model, chest_transforms
+
+
+def synthetic_image(width: int = 512, height: int = 512, image_format: str = "JPEG") -> bytes:
+    """Encode a grayscale noise image, roughly the shape of a scan upload."""
+    from PIL import Image
+
+    img = Image.effect_noise((width, height), 64)
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = rank - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    """Summary statistics (milliseconds) used in every benchmark report."""
+    values = sorted(latencies_ms)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "mean": 0.0, "min": 0.0, "max": 0.0}
+    return {
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "mean": round(sum(values) / len(values), 3),
+        "min": round(values[0], 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def environment_info() -> Dict[str, object]:
+    """Host and library details recorded alongside every result file."""
+    info: Dict[str, object] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+    try:
+        import torch
+
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
@@ -0,0 +1,243 @@
+"""
+Scripted load test: a mix of user journeys against the API and a local SMTP sink.
+
+Virtual users register, verify their OTP (read back from the SMTP sink), log
+in, upload scans, browse history and share reports, in a weighted mix. The
+report gives per-step latency, error rate and throughput so worker counts,
+thread pools and database pool sizes can be sized from measurements.
+
+By default the app runs in-process against a temporary SQLite file with
+randomly initialized models and all outgoing mail delivered to the sink. With
+--target the journeys run against a deployed server instead; start that server
+with SMTP_HOST/SMTP_PORT pointing at the sink (SMTP_USE_TLS=false) so OTP
+verification can complete.
+
+Usage (from the server directory):
+    python -m loadtest.run --users 8 --duration 60
+    python -m loadtest.run --mix new_user=1,browser=4 --iterations 5
+    python -m loadtest.run --target http://localhost:8000 --smtp-port 8025
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+SERVER_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if SERVER_ROOT not in sys.path:
+    sys.path.insert(0, SERVER_ROOT)
+
+from benchmarks.harness import (  # noqa: E402
+    configure_environment,
+    environment_info,
+    synthetic_image,
+)
+from loadtest.scenarios import (  # noqa: E402
+    DEFAULT_MIX,
+    JOURNEYS,
+    JourneyContext,
+    StepFailed,
+    choose_journey,
+    StepRecorder,
+    VirtualUser,
+)
+from loadtest.smtp_sink import SMTPSink  # noqa: E402
+
+
+async def virtual_user_loop(
+    ctx: JourneyContext,
+    mix: Dict[str, int],
+    deadline: Optional[float],
+    iterations: Optional[int],
+) -> None:
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    completed = 0
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        if iterations is not None and completed >= iterations:
+            return
+
+        name = choose_journey(ctx, random.choices(names, weights=weights)[0])
+        ctx.recorder.journeys[name] += 1
+        try:
+            await JOURNEYS[name](ctx)
+        except StepFailed:
+            ctx.recorder.failed_journeys[name] += 1
+        completed += 1
+        await ctx.pause()
+
+
+async def run_load_test(args, sink: SMTPSink) -> dict:
+    import httpx
+
+    recorder = StepRecorder()
+    accounts: List[VirtualUser] = []
+    image = synthetic_image(args.image_size, args.image_size)
+
+    bench_app = None
+    if args.target:
+        transport = None
+        base_url = args.target.rstrip("/")
+    else:
+        from benchmarks.harness import BenchApp
+
+        database_path = os.path.join(tempfile.mkdtemp(prefix="secondopinion-load-"), "load.db")
+        bench_app = BenchApp(stub_auth=False, database_url=f"sqlite:///{database_path}")
+        transport = httpx.ASGITransport(app=bench_app.app)
+        base_url = "http://loadtest"
+
+    timeout = httpx.Timeout(args.request_timeout)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url=base_url, timeout=timeout, limits=limits
+        ) as client:
+            deadline = time.monotonic() + args.duration if args.duration else None
+            iterations = None if args.duration else args.iterations
+
+            started = time.perf_counter()
+            await asyncio.gather(
+                *(
+                    virtual_user_loop(
+                        JourneyContext(client, sink, recorder, image, accounts, args.think_time),
+                        args.mix,
+                        deadline,
+                        iterations,
+                    )
+                    for _ in range(args.users)
+                )
+            )
+            wall_seconds = time.perf_counter() - started
+    finally:
+        if bench_app is not None:
+            await bench_app.aclose()
+
+    return {
+        "benchmark": "loadtest",
+        "created_at": datetime.utcnow().isoformat(),
+        "environment": environment_info(),
+        "config": {
+            "target": args.target or "in-process",
+            "users": args.users,
+            "duration": args.duration,
+            "iterations": None if args.duration else args.iterations,
+            "mix": args.mix,
+            "think_time": args.think_time,
+            "image_size": args.image_size,
+        },
+        "report": recorder.report(wall_seconds),
+        "smtp": sink.summary(),
+    }
+
+
+def print_report(result: dict) -> None:
+    report = result["report"]
+    print(
+        f"{result['config']['users']} users, {report['wall_seconds']:.1f}s, "
+        f"journeys {report['journeys']}, failed {report['failed_journeys']}"
+    )
+    header = (
+        f"{'step':<14} {'n':>6} {'err':>5} {'err%':>6} {'req/s':>8} "
+        f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for step, stats in sorted(report["steps"].items()):
+        latency = stats["latency_ms"]
+        print(
+            f"{step:<14} {stats['requests']:>6} {stats['errors']:>5} "
+            f"{stats['error_rate'] * 100:>5.1f}% {stats['throughput_rps']:>8.2f} "
+            f"{latency['p50']:>9.2f} {latency['p95']:>9.2f} {latency['p99']:>9.2f} "
+            f"{latency['max']:>9.2f}"
+        )
+        if stats["error_reasons"]:
+            print(f"{'':<14} errors: {stats['error_reasons']}")
+    smtp = result["smtp"]
+    print(f"SMTP sink received {smtp['messages_received']} messages ({smtp['bytes_received']} bytes)")
+
+
+def _parse_mix(value: str) -> Dict[str, int]:
+    mix = {}
+    for item in value.split(","):
+        if not item:
+            continue
+        name, _, weight = item.partition("=")
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(
+                f"unknown journey '{name}'; choose from {', '.join(JOURNEYS)}"
+            )
+        mix[name] = int(weight or 1)
+    if not mix or not any(mix.values()):
+        raise argparse.ArgumentTypeError("the mix needs at least one journey with a positive weight")
+    return mix
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--target", help="base URL of a running server; default runs the app in-process")
+    parser.add_argument("--users", type=int, default=4, help="concurrent virtual users")
+    parser.add_argument(
+        "--duration", type=float, default=0, help="seconds to run; overrides --iterations when set"
+    )
+    parser.add_argument("--iterations", type=int, default=3, help="journeys per virtual user")
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default=dict(DEFAULT_MIX),
+        help="weighted journeys, e.g. new_user=1,returning_user=3,browser=6",
+    )
+    parser.add_argument(
+        "--think-time", type=float, default=0.0, help="max random pause between steps in seconds"
+    )
+    parser.add_argument("--image-size", type=int, default=512, help="synthetic image edge in pixels")
+    parser.add_argument("--request-timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--smtp-host", default="127.0.0.1", help="address the SMTP sink listens on")
+    parser.add_argument("--smtp-port", type=int, default=8025, help="port the SMTP sink listens on")
+    parser.add_argument(
+        "--output", default="bench-results/loadtest.json", help="where to write the JSON report"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    output_path = os.path.abspath(args.output)
+
+    if not args.target:
+        # Route the in-process app's mail to the sink; must happen before app
+        # settings are imported
+        os.environ.update(
+            {
+                "SMTP_HOST": args.smtp_host,
+                "SMTP_PORT": str(args.smtp_port),
+                "SMTP_USER": "loadtest@secondopinion.local",
+                "SMTP_PASSWORD": "loadtest",
+                "SMTP_USE_TLS": "false",
+            }
+        )
+        configure_environment()
+
+    sink = SMTPSink(args.smtp_host, args.smtp_port).start()
+    try:
+        result = asyncio.run(run_load_test(args, sink))
+    finally:
+        sink.stop()
+
+    print_report(result)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""
+User journeys for the load test.
+
+Each journey is a sequence of steps a real client performs. Every step is
+timed and recorded under its own name so the report shows where time and
+errors go (bcrypt in register/login, SMTP in register and share-report,
+inference in upload, queries in history).
+"""
+
+import asyncio
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from benchmarks.harness import summarize_latencies
+
+
+@dataclass
+class VirtualUser:
+    email: str
+    password: str
+    full_name: str
+    token: Optional[str] = None
+    prediction_ids: List[int] = field(default_factory=list)
+
+    @classmethod
+    def new(cls) -> "VirtualUser":
+        suffix = uuid4().hex[:12]
+        return cls(
+            email=f"load-{suffix}@example.com",
+            password=f"Load-{suffix}-pw1!",
+            full_name=f"Load User {suffix[:6]}",
+        )
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+
+class StepFailed(Exception):
+    """A step returned an unexpected response; the journey stops there"""
+
+
+class StepRecorder:
+    """Collects per-step latency, status codes and errors"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.status_codes: Dict[str, Counter] = defaultdict(Counter)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.journeys: Counter = Counter()
+        self.failed_journeys: Counter = Counter()
+
+    async def run(self, step: str, send, expected=(200,)):
+        """Send one request, record it, and raise StepFailed on a bad status"""
+        started = time.perf_counter()
+        try:
+            response = await send()
+        except Exception as e:
+            self.latencies[step].append((time.perf_counter() - started) * 1000)
+            self.status_codes[step]["exception"] += 1
+            self.errors[step][type(e).__name__] += 1
+            raise StepFailed(f"{step}: {e}") from e
+
+        self.latencies[step].append((time.perf_counter() - started) * 1000)
+        self.status_codes[step][str(response.status_code)] += 1
+        if response.status_code not in expected:
+            self.errors[step][f"HTTP {response.status_code}"] += 1
+            raise StepFailed(f"{step}: HTTP {response.status_code}")
+        return response
+
+    def record_error(self, step: str, reason: str) -> None:
+        self.status_codes[step]["error"] += 1
+        self.errors[step][reason] += 1
+
+    def report(self, wall_seconds: float) -> dict:
+        steps = {}
+        for step, latencies in self.latencies.items():
+            total = len(latencies)
+            error_count = sum(self.errors[step].values())
+            steps[step] = {
+                "requests": total,
+                "errors": error_count,
+                "error_rate": round(error_count / total, 4) if total else 0.0,
+                "throughput_rps": round(total / wall_seconds, 3) if wall_seconds else 0.0,
+                "status_codes": dict(self.status_codes[step]),
+                "error_reasons": dict(self.errors[step]),
+                "latency_ms": summarize_latencies(latencies),
+            }
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "journeys": dict(self.journeys),
+            "failed_journeys": dict(self.failed_journeys),
+            "steps": steps,
+        }
+
+
+class JourneyContext:
+    """Everything a journey needs: HTTP client, SMTP sink, recorder, test data"""
+
+    def __init__(
+        self,
+        client,
+        sink,
+        recorder: StepRecorder,
+        image: bytes,
+        accounts: List[VirtualUser],
+        think_time: float,
+    ):
+        self.client = client
+        self.sink = sink
+        self.recorder = recorder
+        self.image = image
+        self.accounts = accounts
+        self.think_time = think_time
+
+    async def pause(self):
+        if self.think_time:
+            await asyncio.sleep(random.uniform(0, self.think_time))
+
+
+# Steps
+
+
+async def register(ctx: JourneyContext, user: VirtualUser) -> None:
+    await ctx.recorder.run(
+        "register",
+        lambda: ctx.client.post(
+            "/auth/register",
+            json={"email": user.email, "full_name": user.full_name, "password": user.password},
+        ),
+    )
+
+
+async def verify_otp(ctx: JourneyContext, user: VirtualUser) -> None:
+    otp_code = await ctx.sink.wait_for_otp(user.email)
+    if otp_code is None:
+        ctx.recorder.record_error("verify_otp", "no OTP email received")
+        raise StepFailed("verify_otp: no OTP email received")
+    response = await ctx.recorder.run(
+        "verify_otp",
+        lambda: ctx.client.post(
+            "/auth/verify-otp", json={"email": user.email, "otp_code": otp_code}
+        ),
+    )
+    user.token = response.json()["access_token"]
+
+
+async def login(ctx: JourneyContext, user: VirtualUser) -> None:
+    response = await ctx.recorder.run(
+        "login",
+        lambda: ctx.client.post(
+            "/auth/login", data={"username": user.email, "password": user.password}
+        ),
+    )
+    user.token = response.json()["access_token"]
+
+
+async def upload(ctx: JourneyContext, user: VirtualUser) -> None:
+    kind = random.choice(["tumor", "chest"])
+    response = await ctx.recorder.run(
+        f"upload_{kind}",
+        lambda: ctx.client.post(
+            f"/upload/{kind}",
+            headers=user.headers,
+            files={"file": (f"{kind}.jpg", ctx.image, "image/jpeg")},
+            data={"patient_name": f"Patient of {user.full_name}", "patient_gender": "Other"},
+        ),
+    )
+    prediction_id = response.json().get("id")
+    if prediction_id:
+        user.prediction_ids.append(prediction_id)
+
+
+async def browse_history(ctx: JourneyContext, user: VirtualUser, pages: int = 1) -> None:
+    for page in range(1, pages + 1):
+        response = await ctx.recorder.run(
+            "history",
+            lambda: ctx.client.get(
+                "/history/predictions/history",
+                headers=user.headers,
+                params={"page": page, "per_page": 10},
+            ),
+        )
+        results = response.json().get("results", [])
+        for result in results:
+            if result["id"] not in user.prediction_ids:
+                user.prediction_ids.append(result["id"])
+        if len(results) < 10:
+            break
+        await ctx.pause()
+
+
+async def share_report(ctx: JourneyContext, user: VirtualUser) -> None:
+    if not user.prediction_ids:
+        return
+    await ctx.recorder.run(
+        "share_report",
+        lambda: ctx.client.post(
+            "/share/share-report",
+            headers=user.headers,
+            json={
+                "prediction_id": user.prediction_ids[-1],
+                "doctor_email": "doctor@example.com",
+                "doctor_name": "Load Test",
+                "notes": "Scripted load test",
+                "include_pdf": True,
+            },
+        ),
+    )
+
+
+# Journeys
+
+
+async def new_user_journey(ctx: JourneyContext) -> None:
+    """Sign up, verify, log in, analyse a scan, look at it and share it"""
+    user = VirtualUser.new()
+    await register(ctx, user)
+    await verify_otp(ctx, user)
+    ctx.accounts.append(user)
+    await ctx.pause()
+    await login(ctx, user)
+    await ctx.pause()
+    await upload(ctx, user)
+    await ctx.pause()
+    await browse_history(ctx, user)
+    await ctx.pause()
+    await share_report(ctx, user)
+
+
+async def returning_user_journey(ctx: JourneyContext) -> None:
+    """Log in, analyse a scan, browse a few pages and sometimes share"""
+    user = random.choice(ctx.accounts)
+    await login(ctx, user)
+    await ctx.pause()
+    await upload(ctx, user)
+    await ctx.pause()
+    await browse_history(ctx, user, pages=random.randint(1, 3))
+    if random.random() < 0.3:
+        await ctx.pause()
+        await share_report(ctx, user)
+
+
+async def browsing_journey(ctx: JourneyContext) -> None:
+    """Log in and page through history without uploading"""
+    user = random.choice(ctx.accounts)
+    await login(ctx, user)
+    await ctx.pause()
+    await browse_history(ctx, user, pages=random.randint(2, 5))
+
+
+JOURNEYS = {
+    "new_user": new_user_journey,
+    "returning_user": returning_user_journey,
+    "browser": browsing_journey,
+}
+
+DEFAULT_MIX = {"new_user": 1, "returning_user": 3, "browser": 6}
+
+# Journeys that log in as an account created by an earlier new_user journey
+ACCOUNT_JOURNEYS = ("returning_user", "browser")
+
+
+def choose_journey(ctx: JourneyContext, name: str) -> str:
+    """The journey to run for a draw of ``name``.
+
+    Until the first account exists, journeys that need one run as
+    new_user instead, and are counted as such.
+    """
+    if name in ACCOUNT_JOURNEYS and not ctx.accounts:
+        return "new_user"
+    return name
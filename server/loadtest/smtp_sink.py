@@ -0,0 +1,98 @@
+"""
+Local SMTP stand-in for load tests.
+
+Accepts every message (including AUTH LOGIN/PLAIN without TLS, as the
+server's SMTP settings require a login), keeps per-recipient counts and
+extracts OTP codes so scripted users can complete verification.
+"""
+
+import asyncio
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from email import message_from_bytes
+from typing import Dict, List, Optional
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+OTP_PATTERN = re.compile(r"code is:\s*(\d{6})")
+
+# aiosmtpd warns about its own deprecated login_data on every AUTH
+logging.getLogger("mail.log").setLevel(logging.ERROR)
+
+
+def _accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+class SMTPSink:
+    """SMTP server running on a background thread that records what it receives"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8025):
+        self.host = host
+        self.port = port
+        self.messages_received = 0
+        self.bytes_received = 0
+        self.messages_by_subject: Dict[str, int] = defaultdict(int)
+        self._otps: Dict[str, List[str]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._controller = Controller(
+            self,
+            hostname=host,
+            port=port,
+            authenticator=_accept_any_login,
+            auth_require_tls=False,
+            # Share reports carry a PDF attachment
+            data_size_limit=50 * 1024 * 1024,
+        )
+
+    def start(self) -> "SMTPSink":
+        self._controller.start()
+        return self
+
+    def stop(self) -> None:
+        self._controller.stop()
+
+    async def handle_DATA(self, server, session, envelope):
+        message = message_from_bytes(envelope.content)
+        text_parts = []
+        for part in message.walk():
+            if part.get_content_type() == "text/plain":
+                payload = part.get_payload(decode=True) or b""
+                text_parts.append(payload.decode("utf-8", errors="replace"))
+        otp_match = OTP_PATTERN.search("\n".join(text_parts))
+
+        with self._lock:
+            self.messages_received += 1
+            self.bytes_received += len(envelope.content)
+            self.messages_by_subject[str(message.get("Subject", ""))] += 1
+            if otp_match:
+                for recipient in envelope.rcpt_tos:
+                    self._otps[recipient.lower()].append(otp_match.group(1))
+        return "250 Message accepted for delivery"
+
+    def latest_otp(self, email: str) -> Optional[str]:
+        with self._lock:
+            codes = self._otps.get(email.lower())
+            return codes[-1] if codes else None
+
+    async def wait_for_otp(self, email: str, timeout: float = 30.0) -> Optional[str]:
+        """Poll until an OTP for ``email`` arrives (emails go out in background tasks)"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            code = self.latest_otp(email)
+            if code:
+                return code
+            await asyncio.sleep(0.05)
+        return None
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "messages_received": self.messages_received,
+                "bytes_received": self.bytes_received,
+                "by_subject": dict(self.messages_by_subject),
+            }
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test the triggers that fill prediction_probabilities
+"""
+import sys
+import os
+
+# Add the server directory to the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.db.analytics import PROBABILITY_TABLE, install_probability_triggers
+from app.db.base import Base
+from app.db.models import PredictionResult
+
+
+def _prediction(probabilities):
+    return PredictionResult(
+        user_id=1,
+        patient_id=1,
+        image_filename="scan.jpg",
+        model_type="tumor",
+        prediction="No Tumor",
+        confidence=0.9,
+        probabilities=probabilities,
+        status="completed",
+    )
+
+
+def _rows(db, prediction_id):
+    return db.execute(
+        text(f"SELECT class_name, rank FROM {PROBABILITY_TABLE} WHERE prediction_id = :id ORDER BY rank"),
+        {"id": prediction_id},
+    ).all()
+
+
+def test_null_probabilities():
+    """A prediction without probabilities saves, and gets no rows"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    install_probability_triggers(engine)
+
+    with Session(engine) as db:
+        empty = _prediction(None)
+        scored = _prediction({"No Tumor": 0.9, "Glioma Tumor": 0.1})
+        db.add_all([empty, scored])
+        db.commit()
+        assert _rows(db, empty.id) == []
+        assert [name for name, _ in _rows(db, scored.id)] == ["No Tumor", "Glioma Tumor"]
+
+        # Clearing the probabilities removes the rows; setting them adds them back
+        scored.probabilities = None
+        db.commit()
+        assert _rows(db, scored.id) == []
+        empty.probabilities = {"No Tumor": 0.2, "Glioma Tumor": 0.8}
+        db.commit()
+        assert [name for name, _ in _rows(db, empty.id)] == ["Glioma Tumor", "No Tumor"]
+
+    # The startup backfill skips the null rows too
+    with engine.begin() as connection:
+        connection.execute(text(f"DELETE FROM {PROBABILITY_TABLE}"))
+    install_probability_triggers(engine, backfill=True)
+    with Session(engine) as db:
+        assert db.execute(text(f"SELECT COUNT(*) FROM {PROBABILITY_TABLE}")).scalar() == 2
+    print("✅ Null probabilities are skipped by the triggers and the backfill")
+    return True
+
+
+if __name__ == "__main__":
+    print("🧪 Testing probability analytics triggers")
+    print("=" * 50)
+
+    try:
+        success = test_null_probabilities()
+    except Exception as e:
+        print(f"❌ {type(e).__name__}: {e}")
+        success = False
+
+    if success:
+        print("\n✅ All tests passed!")
+    else:
+        print("\n❌ Some tests failed. Please check the errors above.")
+        sys.exit(1)